@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+
+from aiohttp import web
+
+from placeomat import metrics, recorder, responses
+from placeomat.config import metrics as metrics_config
+from placeomat.providers import aio, place, providers
+
+logging.getLogger().setLevel(metrics_config.LOG_LEVEL)
+
+routes = web.RouteTableDef()
+
+NDJSON = 'application/x-ndjson'
+
+# routes whose requests are recorded, see placeomat/recorder.py
+RECORDED = ('make_query', 'get_place_details')
+
+
+def _json_response(request, body, status, tagged=False,
+                   extra_headers=None):
+    # written like flask's jsonify, so both servers answer the same
+    status, data, headers = responses.prepare(
+        place.dumps(body), status, request.headers.get('If-None-Match'),
+        request.headers.get('Accept-Encoding'), tagged)
+    headers.update(extra_headers or {})
+    return web.Response(body=data, status=status, headers=headers,
+                        content_type='application/json')
+
+
+@web.middleware
+async def _record(request, handler):
+    start = time.perf_counter()
+    response = await handler(request)
+    if request.match_info.route.handler.__name__ in RECORDED:
+        recorder.get_recorder().request(
+            request.path, dict(request.query),
+            request.headers.get('Accept'), response.status,
+            time.perf_counter() - start)
+    return response
+
+
+async def _stream(request, provider):
+    """ Write each record of the query as a line of JSON as it comes in """
+    response = web.StreamResponse(headers={'Content-Type': NDJSON})
+    await response.prepare(request)
+    async for record in providers.stream_async(provider, dict(request.query)):
+        await response.write(place.dumps(record) + b'\n')
+
+    await response.write_eof()
+    return response
+
+
+@routes.post('/search/batch')
+async def batch_query(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return _json_response(request, {'reason': 'Expected a JSON object'},
+                              400)
+
+    body, status = await providers.batch_async(data.get('queries', None),
+                                               data.get('providers', None))
+    return _json_response(request, body, status)
+
+
+@routes.get('/search')
+@routes.get('/search/{provider}')
+async def make_query(request):
+    provider = request.match_info.get('provider', 'all')
+    if NDJSON in request.headers.get('Accept', ''):
+        return await _stream(request, provider)
+
+    body, status, headers = await providers.query_async(
+        provider, dict(request.query))
+    return _json_response(request, body, status, tagged=True,
+                          extra_headers=headers)
+
+
+@routes.get('/search/{provider}/{place_id}')
+async def get_place_details(request):
+    body, status = await providers.place_id_async(
+        request.match_info['provider'], request.match_info['place_id'])
+    return _json_response(request, body, status, tagged=True)
+
+
+@routes.get('/metrics')
+async def get_metrics(request):
+    return web.Response(body=metrics.render().encode('utf-8'),
+                        headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def _close_sessions(app):
+    await aio.close()
+
+
+def make_app():
+    """
+    Make the asyncio server, which serves the same routes as the Flask one,
+    but can wait on thousands of upstream requests in one process
+
+    :return: the application
+    :rtype: aiohttp.web.Application
+    """
+    providers.load()
+    app = web.Application(
+        middlewares=[_record] if recorder.get_recorder() else [])
+    app.add_routes(routes)
+    app.on_cleanup.append(_close_sessions)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(make_app(), host='0.0.0.0',
+                port=int(os.environ.get('PORT', 5000)))
@@ -1,21 +1,86 @@
 import logging
+import time
 
-from flask import Flask, request, make_response, jsonify
+from flask import Flask, Response, g, request, stream_with_context
 
-from placeomat.providers import providers
+from placeomat import metrics, recorder, responses
+from placeomat.config import metrics as metrics_config
+from placeomat.providers import place, providers
 
 app = Flask(__name__)
-logging.getLogger().setLevel(logging.DEBUG)
+logging.getLogger().setLevel(metrics_config.LOG_LEVEL)
+providers.load()
+
+NDJSON = 'application/x-ndjson'
+
+# routes whose requests are recorded, see placeomat/recorder.py
+RECORDED = ('make_query', 'get_place_details')
+
+
+def _wants_ndjson():
+    """ Check if the client prefers newline delimited JSON over JSON """
+    return request.accept_mimetypes.best_match(
+        ['application/json', NDJSON]) == NDJSON
+
+
+def _json_response(body, status, tagged=False, extra_headers=None):
+    # places are written straight to JSON, the same as jsonify would
+    status, data, headers = responses.prepare(
+        place.dumps(body), status, request.headers.get('If-None-Match'),
+        request.headers.get('Accept-Encoding'), tagged)
+    headers.update(extra_headers or {})
+    return Response(data, status=status, headers=headers,
+                    mimetype='application/json')
+
+
+def _start_timer():
+    g.start = time.perf_counter()
+
+
+def _record(response):
+    if request.endpoint in RECORDED:
+        recorder.get_recorder().request(
+            request.path, request.args.to_dict(),
+            request.headers.get('Accept'), response.status_code,
+            time.perf_counter() - g.start)
+    return response
+
+
+if recorder.get_recorder():
+    app.before_request(_start_timer)
+    app.after_request(_record)
 
 
 @app.route('/search')
 @app.route('/search/<provider>')
 def make_query(provider='all'):
-    body, status = providers.query(provider, request.args.to_dict())
-    return make_response((jsonify(body), status))
+    if _wants_ndjson():
+        records = providers.stream(provider, request.args.to_dict())
+        lines = (place.dumps(r) + b'\n' for r in records)
+        return Response(stream_with_context(lines), mimetype=NDJSON)
+
+    body, status, headers = providers.query(provider,
+                                            request.args.to_dict())
+    return _json_response(body, status, tagged=True, extra_headers=headers)
+
+
+@app.route('/search/batch', methods=['POST'])
+def batch_query():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json_response({'reason': 'Expected a JSON object'}, 400)
+
+    body, status = providers.batch(data.get('queries', None),
+                                   data.get('providers', None))
+    return _json_response(body, status)
 
 
 @app.route('/search/<provider>/<place_id>')
 def get_place_details(provider, place_id):
     body, status = providers.place_id(provider, place_id)
-    return make_response(jsonify(body), status)
+    return _json_response(body, status, tagged=True)
+
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
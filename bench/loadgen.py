@@ -0,0 +1,194 @@
+"""
+Load generator for the service. Drives /search, /search/<provider> and
+/search/<provider>/<place_id> with a configurable mix and concurrency, and
+reports the throughput and latency percentiles of each route.
+
+    python3 bench/loadgen.py --url http://localhost:5000 --duration 30
+
+Use --json to write the report to a file, and --compare to print the
+difference between two such reports, e.g. of two builds.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import aiohttp
+
+ROUTES = ('search', 'provider', 'details')
+
+# locations queries are spread over
+LOCATIONS = ['52.5200,13.4050', '53.5511,9.9937', '48.1351,11.5820',
+             '50.1109,8.6821', '-33.8688,151.2093']
+
+WORDS = ['cafes', 'bars', 'bakeries', 'restaurants', 'museums', 'parks',
+         'bookshops', 'pharmacies', 'cinemas', 'gyms']
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+
+
+def _queries(count, radius):
+    """ Make count distinct queries, so caches see repeats and misses """
+    rnd = random.Random(0)
+    return [{'query': '%s %d' % (rnd.choice(WORDS), i),
+             'location': rnd.choice(LOCATIONS),
+             'radius': str(radius)} for i in range(count)]
+
+
+class Load(object):
+    def __init__(self, args):
+        self.url = args.url.rstrip('/')
+        self.providers = args.providers.split(',')
+        self.queries = _queries(args.queries, args.radius)
+        self.no_cache = args.no_cache
+        self.mix = []
+        for part in args.mix.split(','):
+            route, _, weight = part.partition('=')
+            if route not in ROUTES:
+                raise ValueError('Unknown route %s' % route)
+            self.mix += [route] * int(weight or 1)
+
+        self.place_ids = []
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    def _request(self):
+        """ Pick the route and URL of the next request """
+        route = random.choice(self.mix)
+        if route == 'details' and not self.place_ids:
+            route = 'provider'
+
+        params = dict(random.choice(self.queries))
+        if self.no_cache:
+            params['no_cache'] = '1'
+
+        if route == 'search':
+            return route, self.url + '/search', params
+        elif route == 'provider':
+            provider = random.choice(self.providers)
+            return route, '%s/search/%s' % (self.url, provider), params
+        else:
+            return route, '%s/search/google/%s' % (
+                self.url, random.choice(self.place_ids)), None
+
+    def _learn(self, route, body):
+        """ Keep Google place IDs of search results for details requests """
+        if route == 'details' or len(self.place_ids) > 1000:
+            return
+        results = body.get('results', []) if isinstance(body, dict) else body
+        for result in results:
+            if result.get('Provider', None) == 'Google Maps':
+                self.place_ids.append(result['ID'])
+
+    async def _worker(self, session, until, remaining):
+        while time.monotonic() < until and remaining[0] != 0:
+            remaining[0] -= 1
+            route, url, params = self._request()
+            start = time.monotonic()
+            try:
+                async with session.get(url, params=params) as response:
+                    body = await response.json(content_type=None)
+                    ok = response.status < 500
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                ok, body = False, None
+
+            self.latencies[route].append(time.monotonic() - start)
+            if not ok:
+                self.errors[route] += 1
+            elif body:
+                self._learn(route, body)
+
+    async def run(self, concurrency, duration, requests):
+        until = time.monotonic() + duration
+        remaining = [requests or -1]
+        timeout = aiohttp.ClientTimeout(total=60)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        start = time.monotonic()
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            await asyncio.gather(*[self._worker(session, until, remaining)
+                                   for _ in range(concurrency)])
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        report = {'elapsed': elapsed, 'routes': {}}
+        for route, samples in self.latencies.items():
+            if not samples:
+                continue
+            report['routes'][route] = {
+                'requests': len(samples),
+                'errors': self.errors[route],
+                'rps': len(samples) / elapsed,
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+            }
+        return report
+
+
+def print_report(report, out=sys.stdout):
+    out.write('%-10s %9s %7s %9s %9s %9s %9s\n' % (
+        'route', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for route, r in sorted(report['routes'].items()):
+        out.write('%-10s %9d %7d %9.1f %9.1f %9.1f %9.1f\n' % (
+            route, r['requests'], r['errors'], r['rps'],
+            r['p50'] * 1000, r['p95'] * 1000, r['p99'] * 1000))
+
+
+def print_comparison(base, other, out=sys.stdout):
+    """ Print how other did relative to base, per route """
+    out.write('%-10s %-5s %10s %10s %8s\n' % (
+        'route', 'stat', 'base', 'other', 'change'))
+    for route in sorted(set(base['routes']) & set(other['routes'])):
+        for stat in ('rps', 'p50', 'p95', 'p99'):
+            a, b = base['routes'][route][stat], other['routes'][route][stat]
+            scale = 1 if stat == 'rps' else 1000
+            change = (b - a) / a * 100 if a else 0
+            out.write('%-10s %-5s %10.1f %10.1f %+7.1f%%\n' % (
+                route, stat, a * scale, b * scale, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds to run for')
+    parser.add_argument('--requests', type=int, default=0,
+                        help='stop after this many requests, 0 for no limit')
+    parser.add_argument('--mix', default='search=1,provider=2,details=1',
+                        help='weights of the routes')
+    parser.add_argument('--providers', default='google,yelp')
+    parser.add_argument('--queries', type=int, default=200,
+                        help='number of distinct queries')
+    parser.add_argument('--radius', type=int, default=2000)
+    parser.add_argument('--no-cache', action='store_true',
+                        help='ask the service to skip its caches')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'OTHER'),
+                        help='compare two reports instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as base, open(args.compare[1]) as other:
+            print_comparison(json.load(base), json.load(other))
+        return
+
+    load = Load(args)
+    report = asyncio.run(load.run(args.concurrency, args.duration,
+                                  args.requests))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
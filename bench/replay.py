@@ -0,0 +1,155 @@
+"""
+Replays the requests of a recording against the service, and reports the
+throughput and latency percentiles of each route, like bench/loadgen.py.
+Record traffic by running the service with PLACEOMAT_RECORD=recording/,
+then serve the recorded upstream responses with bench/replay_upstream.py
+while replaying:
+
+    python3 bench/replay.py --url http://localhost:5000 recording/
+
+Requests are sent with the gaps they were recorded with, divided by
+--speed; --speed 0 sends them as fast as --concurrency allows. Use --json
+to write the report to a file, and --compare to print the difference
+between two such reports, e.g. of two builds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import aiohttp
+
+from loadgen import print_comparison, print_report, percentile
+
+# most requests in flight at once when replaying with --speed, so a long
+# recording does not open a connection per request
+MAX_WORKERS = 256
+
+
+def route(path):
+    """ Get the loadgen route of a request path """
+    parts = path.strip('/').split('/')
+    if len(parts) >= 3:
+        return 'details'
+    if len(parts) == 2 and parts[1] != 'all':
+        return 'provider'
+    return 'search'
+
+
+def load(path):
+    """
+    Read the requests of a recording, in the order they were made
+
+    :param str path: directory of the recording
+    :return: requests, with their offset from the first one in seconds
+    :rtype: list
+    """
+    with open(os.path.join(path, 'requests.jsonl'), encoding='utf-8') as f:
+        requests = sorted((json.loads(line) for line in f),
+                          key=lambda r: r['at'])
+    if requests:
+        first = requests[0]['at']
+        for r in requests:
+            r['at'] -= first
+    return requests
+
+
+class Replay(object):
+    def __init__(self, url, requests, speed):
+        self.url = url.rstrip('/')
+        self.requests = requests
+        self.speed = speed
+        self.latencies = {}
+        self.errors = {}
+
+    async def _send(self, session, request):
+        name = route(request['path'])
+        headers = {'Accept': request['accept']} if request['accept'] else {}
+        start = time.monotonic()
+        try:
+            async with session.get(self.url + request['path'],
+                                   params=request['args'],
+                                   headers=headers) as response:
+                await response.read()
+                ok = response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+
+        self.latencies.setdefault(name, []).append(time.monotonic() - start)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def _worker(self, session, queue, start):
+        while queue:
+            request = queue.popleft()
+            if self.speed:
+                delay = start + request['at'] / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._send(session, request)
+
+    async def run(self, concurrency):
+        queue = deque(self.requests)
+        if self.speed:
+            # enough workers that recorded bursts are not held up
+            concurrency = max(concurrency, min(len(queue), MAX_WORKERS))
+
+        timeout = aiohttp.ClientTimeout(total=60)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        start = time.monotonic()
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout) as session:
+            await asyncio.gather(*[self._worker(session, queue, start)
+                                   for _ in range(concurrency)])
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        report = {'elapsed': elapsed, 'routes': {}}
+        for name, samples in self.latencies.items():
+            report['routes'][name] = {
+                'requests': len(samples),
+                'errors': self.errors.get(name, 0),
+                'rps': len(samples) / elapsed,
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+            }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', nargs='?',
+                        help='directory of the recording')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay this many times faster than recorded, '
+                             '0 for as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='requests in flight at once with --speed 0, '
+                             'and at least with --speed')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'OTHER'),
+                        help='compare two reports instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as base, open(args.compare[1]) as other:
+            print_comparison(json.load(base), json.load(other))
+        return
+
+    if not args.recording:
+        parser.error('a recording is required')
+
+    replay = Replay(args.url, load(args.recording), args.speed)
+    report = asyncio.run(replay.run(args.concurrency))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
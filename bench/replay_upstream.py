@@ -0,0 +1,93 @@
+"""
+Serves the upstream responses of a recording in place of the upstream
+APIs, so traffic recorded with PLACEOMAT_RECORD can be replayed against
+any build without a network and without spending quota. Each response is
+served after the latency it was recorded with, times --scale.
+
+    python3 bench/replay_upstream.py --port 8080 recording/
+
+Point the service at it with PLACEOMAT_UPSTREAM=http://localhost:8080, the
+same as the stub upstream servers in bench/stub_upstream.py. Requests are
+matched on their path and parameters (API keys are not recorded, and so
+not matched on); a request which was recorded more than once gets its
+responses in turn.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+
+from aiohttp import web
+
+# upstream request parameters which are not recorded, see
+# placeomat/config/record.py
+REDACT_PARAMS = ('key',)
+
+
+def _key(path, params):
+    return path, tuple(sorted((k, str(v)) for k, v in params.items()
+                              if k not in REDACT_PARAMS))
+
+
+def load(path):
+    """
+    Read the upstream responses of a recording
+
+    :param str path: directory of the recording
+    :return: recorded responses of each request
+    :rtype: dict
+    """
+    responses = {}
+    with open(os.path.join(path, 'upstream.jsonl'), encoding='utf-8') as f:
+        for line in f:
+            r = json.loads(line)
+            responses.setdefault(_key(r['path'], r['params']), []).append(
+                (r['status'], r['body'], r['seconds']))
+
+    return {key: itertools.cycle(recorded)
+            for key, recorded in responses.items()}
+
+
+class Replay(object):
+    def __init__(self, responses, scale):
+        self.responses = responses
+        self.scale = scale
+        self.misses = 0
+
+    async def handle(self, request):
+        recorded = self.responses.get(_key(request.path, request.query))
+        if recorded is None:
+            self.misses += 1
+            logging.warning('Not recorded: %s', request.path_qs)
+            return web.json_response({'error': 'not recorded'}, status=404)
+
+        status, body, seconds = next(recorded)
+        await asyncio.sleep(seconds * self.scale)
+        return web.Response(text=body, status=status,
+                            content_type='application/json')
+
+
+def make_app(args):
+    replay = Replay(load(args.recording), args.scale)
+    app = web.Application()
+    app.router.add_get('/{path:.*}', replay.handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recording', help='directory of the recording')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply recorded latencies by this, e.g. 0 '
+                             'to answer at once')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    web.run_app(make_app(args), port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Local stand-ins for the upstream APIs: Google Places Text Search, Google
+Place Details, and Yelp Fusion business search. The latency, error rate
+and number of results are configurable, so the service can be load tested
+on one machine, without a network and without spending quota.
+
+Point the service at the stubs with
+
+    PLACEOMAT_UPSTREAM=http://localhost:8080
+
+Places are made up, but the same query always gives the same places, so
+caches behave like they would against the real APIs.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import random
+
+from aiohttp import web
+
+# where places are put when a query has no location
+DEFAULT_LOCATION = (52.52, 13.40)
+
+TYPES = ['cafe', 'restaurant', 'bar', 'bakery', 'food', 'point_of_interest']
+
+
+class Latency(object):
+    """
+    Latency distribution of a stub endpoint, parsed from e.g.
+
+        fixed:0.05          always 50ms
+        uniform:0.01,0.2    between 10ms and 200ms
+        lognormal:0.05,0.5  median of 50ms, with a long tail (sigma 0.5)
+    """
+    def __init__(self, spec):
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',') if a]
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError('Unknown latency distribution %s' % kind)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.args[0]
+        elif self.kind == 'uniform':
+            return random.uniform(*self.args)
+        else:
+            median, sigma = self.args
+            return random.lognormvariate(0, sigma) * median
+
+
+def _seed(*parts):
+    return int(hashlib.sha1('|'.join(parts).encode()).hexdigest()[:12], 16)
+
+
+def _places(query, location, count):
+    """ Make up count places for a query around a location """
+    rnd = random.Random(_seed(query, str(location)))
+    lat, lng = location
+    for i in range(count):
+        yield {'id': 'stub-%x' % _seed(query, str(location), str(i)),
+               'name': '%s %d' % (query.title() or 'Place', i),
+               'lat': lat + rnd.uniform(-0.02, 0.02),
+               'lng': lng + rnd.uniform(-0.03, 0.03),
+               'types': rnd.sample(TYPES, 2),
+               'address': '%d Stub Street, Stubville' % (i + 1)}
+
+
+def _location(value):
+    try:
+        lat, lng = [float(v) for v in value.split(',')]
+        return lat, lng
+    except (AttributeError, ValueError):
+        return DEFAULT_LOCATION
+
+
+class Stubs(object):
+    def __init__(self, args):
+        self.search_latency = Latency(args.latency)
+        self.details_latency = Latency(args.details_latency or args.latency)
+        self.error_rate = args.error_rate
+        self.results = args.results
+        self.pages = args.pages
+
+    async def _wait(self, latency):
+        await asyncio.sleep(latency.sample())
+        return random.random() < self.error_rate
+
+    async def google_search(self, request):
+        failed = await self._wait(self.search_latency)
+        if failed:
+            return web.json_response({'status': 'UNKNOWN_ERROR'})
+
+        query = request.query.get('query', '')
+        location = request.query.get('location', '')
+        page = 0
+        token = request.query.get('pagetoken', None)
+        if token:
+            # the token stands for the search and the page it leads to
+            query, location, page = bytes.fromhex(token).decode().split('|')
+            page = int(page)
+
+        places = list(_places(query, _location(location),
+                              self.results * (page + 1)))
+        results = [{
+            'place_id': p['id'],
+            'name': p['name'],
+            'types': p['types'],
+            'geometry': {'location': {'lat': p['lat'], 'lng': p['lng']}},
+            'formatted_address': p['address'],
+        } for p in places[self.results * page:]]
+
+        status = 'OK' if results else 'ZERO_RESULTS'
+        body = {'status': status, 'results': results}
+        if page + 1 < self.pages:
+            body['next_page_token'] = ('%s|%s|%d' % (
+                query, location, page + 1)).encode().hex()
+        return web.json_response(body)
+
+    async def google_details(self, request):
+        failed = await self._wait(self.details_latency)
+        if failed:
+            return web.json_response({'status': 'UNKNOWN_ERROR'})
+
+        place_id = request.query.get('placeid', '')
+        return web.json_response({'status': 'OK', 'result': {
+            'url': 'https://maps.google.com/?cid=%d' % _seed(place_id),
+            'website': 'http://example.com/%s' % place_id,
+        }})
+
+    async def yelp_search(self, request):
+        failed = await self._wait(self.search_latency)
+        if failed:
+            return web.json_response({'error': {'code': 'INTERNAL_ERROR'}},
+                                     status=500)
+
+        query = request.query.get('term', '')
+        location = _location('%s,%s' % (request.query.get('latitude', ''),
+                                        request.query.get('longitude', '')))
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', self.results))
+        total = self.results * self.pages
+        places = list(_places(query, location, total))
+        businesses = [{
+            'id': p['id'],
+            'name': p['name'],
+            'categories': [{'title': t.title()} for t in p['types']],
+            'coordinates': {'latitude': p['lat'], 'longitude': p['lng']},
+            'location': {'display_address': [p['address']]},
+            'url': 'https://www.yelp.com/biz/%s' % p['id'],
+        } for p in places[offset:offset + limit]]
+
+        return web.json_response({'businesses': businesses, 'total': total})
+
+
+def make_app(args):
+    stubs = Stubs(args)
+    app = web.Application()
+    app.router.add_get('/maps/api/place/textsearch/json', stubs.google_search)
+    app.router.add_get('/maps/api/place/details/json', stubs.google_details)
+    app.router.add_get('/v3/businesses/search', stubs.yelp_search)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', default='lognormal:0.05,0.5',
+                        help='latency of the search endpoints, e.g. '
+                             'fixed:0.05, uniform:0.01,0.2, or '
+                             'lognormal:0.05,0.5 (median, sigma)')
+    parser.add_argument('--details-latency', default=None,
+                        help='latency of the details endpoint, defaults to '
+                             'the search latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of requests which fail, 0 to 1')
+    parser.add_argument('--results', type=int, default=20,
+                        help='number of results of a search')
+    parser.add_argument('--pages', type=int, default=1,
+                        help='number of pages of --results a search has')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    web.run_app(make_app(args), port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
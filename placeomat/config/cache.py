@@ -0,0 +1,53 @@
+# seconds a parsed search result is served from the cache, per provider
+TTLS = {'google': 600,
+        'yelp': 300}
+
+# TTL used for a provider that is not listed above
+DEFAULT_TTL = 300
+
+# number of search results kept in the cache, the least recently used
+# result is dropped when the cache is full
+MAX_ENTRIES = 2048
+
+# request parameter which skips the cache lookup for a single request,
+# e.g. /search/google?query=cafes&no_cache=1
+BYPASS_PARAM = 'no_cache'
+
+# search results hit at least HOT_HITS times are refreshed in the
+# background once less than REFRESH_AHEAD of their TTL is left. Until the
+# refresh lands, they are served for up to STALE_TTL seconds after they
+# expired, with their age in the status of the provider.
+REFRESH = True
+HOT_HITS = 3
+REFRESH_AHEAD = 0.2
+STALE_TTL = 60
+REFRESH_WORKERS = 4
+
+# background refreshes per second and burst, per provider, so refreshing
+# cannot use up the quota of the API key
+REFRESH_BUDGETS = {'google': (0.2, 10),
+                   'yelp': (0.5, 10)}
+
+DEFAULT_REFRESH_BUDGET = (0.2, 10)
+
+
+def get_ttl(provider):
+    """
+    Get the cache TTL for the given provider
+
+    :param str provider: provider to get the TTL for
+    :return: TTL in seconds
+    :rtype: float
+    """
+    return TTLS.get(provider, DEFAULT_TTL)
+
+
+def get_refresh_budget(provider):
+    """
+    Get the background refresh budget for the given provider
+
+    :param str provider: provider to get the budget for
+    :return: refreshes per second and burst size
+    :rtype: tuple
+    """
+    return REFRESH_BUDGETS.get(provider, DEFAULT_REFRESH_BUDGET)
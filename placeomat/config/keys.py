@@ -5,6 +5,10 @@ import logging
 KEYS = {'google': 'GMAPS_KEY',
         'yelp': 'YELP_KEY'}
 
+# request parameter the API key is sent in, for providers which do not
+# send it in a header
+PARAMS = {'google': 'key'}
+
 
 class KeyNotFound(Exception):
     pass
@@ -19,3 +23,8 @@ def get_key(key_name):
         raise KeyNotFound('Could not find %s in environment' % key_var) from ke
 
     return key
+
+
+def get_param(key_name):
+    """ Get the request parameter the key of the provider is sent in """
+    return PARAMS.get(key_name, None)
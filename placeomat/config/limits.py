@@ -0,0 +1,127 @@
+# how long, in seconds, each provider gets to answer when we fan a query
+# out to all providers. Google gets longer, since its answer includes the
+# place details lookups.
+DEADLINES = {'google': 10.0,
+             'yelp': 5.0}
+
+# deadline used for a provider that is not listed above
+DEFAULT_DEADLINE = 5.0
+
+# number of threads used to fan out queries across providers
+FAN_OUT_WORKERS = 16
+
+# place details lookups made while building a Google response run on a
+# shared pool of this many threads
+DETAILS_WORKERS = 8
+
+# seconds a single place details lookup may take
+DETAILS_TIMEOUT = 3.0
+
+# seconds we wait for all place details lookups of one response, after
+# which any lookups still queued or running get a placeholder instead
+DETAILS_DEADLINE = 8.0
+
+# connections kept alive per upstream host. Should be at least as large
+# as the number of threads which can talk to one host at the same time.
+POOL_SIZE = 32
+
+# seconds to wait for a connection to an upstream host, and for its answer
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+
+# upstream requests per second, and the size of a burst, allowed for each
+# provider and API key
+RATES = {'google': (50.0, 50),
+         'yelp': (10.0, 10)}
+
+# rate used for a provider that is not listed above
+DEFAULT_RATE = (10.0, 10)
+
+# seconds a request may wait for its turn before it fails
+RATE_QUEUE_TIMEOUT = 10.0
+
+# when a provider says we are over our quota, the rate is multiplied by
+# BACKOFF_FACTOR and requests pause for BACKOFF_PAUSE seconds. Every
+# request which goes through wins back RECOVERY_STEP of the full rate.
+BACKOFF_FACTOR = 0.5
+BACKOFF_PAUSE = 2.0
+RECOVERY_STEP = 0.05
+
+# retries of an upstream request which failed with a connection error, a
+# timeout or a server error. Retry n waits a random time of up to
+# RETRY_BACKOFF * 2 ** n seconds, but no more than RETRY_BACKOFF_MAX.
+RETRIES = 2
+RETRY_BACKOFF = 0.1
+RETRY_BACKOFF_MAX = 1.0
+
+# failed requests in a row after which a provider's circuit opens, and
+# requests to it fail fast. After BREAKER_RESET seconds requests are let
+# through again, and the first one decides if the circuit closes.
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30.0
+
+# send a second, hedged, request when the first one takes longer than the
+# provider's p95 latency over its last LATENCY_WINDOW requests. Hedging
+# starts once LATENCY_MIN_SAMPLES requests have been seen, and never
+# before HEDGE_MIN_DELAY seconds. At most HEDGE_MAX hedged requests are in
+# flight at once, beyond that slow requests are not hedged.
+HEDGE = True
+HEDGE_MIN_DELAY = 0.05
+HEDGE_MAX = 16
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+# a Google next_page_token only works a moment after it is handed out.
+# The next page is asked for NEXT_PAGE_DELAY seconds after the page before,
+# and asked again up to NEXT_PAGE_RETRIES times, NEXT_PAGE_RETRY_DELAY
+# seconds apart, while the token is not valid yet.
+NEXT_PAGE_DELAY = 2.0
+NEXT_PAGE_RETRIES = 3
+NEXT_PAGE_RETRY_DELAY = 0.5
+
+# pages of Yelp searches are fetched at the same time, on a shared pool of
+# this many threads
+PAGE_WORKERS = 16
+
+# most tiles a tiled search may be split into, and the size of the shared
+# pool its tiles are searched on. A tiled search has at most as many tiles
+# in flight as the burst of its provider's rate, see RATES.
+MAX_TILES = 64
+TILE_WORKERS = 32
+
+# the asyncio engine reads and writes the SQLite stores (details store,
+# place index, shared cache) on a pool of this many threads, so it does not
+# block the event loop
+STORAGE_WORKERS = 8
+
+# most queries a batch search may have, and how many searches of batches
+# run at the same time, shared by all batches
+BATCH_MAX_QUERIES = 200
+BATCH_WORKERS = 16
+
+# threads making the attempts of hedged requests: one for each request the
+# pools above can have in flight, and one for each hedge on top
+HEDGE_WORKERS = FAN_OUT_WORKERS + DETAILS_WORKERS + PAGE_WORKERS + \
+    TILE_WORKERS + BATCH_WORKERS + HEDGE_MAX
+
+
+def get_deadline(provider):
+    """
+    Get the fan-out deadline for the given provider
+
+    :param str provider: provider to get the deadline for
+    :return: deadline in seconds
+    :rtype: float
+    """
+    return DEADLINES.get(provider, DEFAULT_DEADLINE)
+
+
+def get_rate(provider):
+    """
+    Get the rate limit for the given provider
+
+    :param str provider: provider to get the rate for
+    :return: requests per second and burst size
+    :rtype: tuple
+    """
+    return RATES.get(provider, DEFAULT_RATE)
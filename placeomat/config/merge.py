@@ -0,0 +1,6 @@
+# request parameter which merges the results of all providers that point
+# at the same place, e.g. /search?query=cafes&location=52.5,13.4&merge=1
+PARAM = 'merge'
+
+# meters between two results, with the same name, for them to be merged
+DISTANCE = 75
@@ -0,0 +1,15 @@
+import os
+
+# upper bounds, in seconds, of the buckets of the latency histograms
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# parsing a response takes well under a millisecond to a few milliseconds
+PARSE_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.05]
+
+# number of results of a search, e.g. a full Places API page is 20
+RESULT_BUCKETS = [0, 1, 5, 10, 20, 50]
+
+# log level of the servers, DEBUG logs every upstream request and is only
+# meant for development
+LOG_LEVEL = os.environ.get('PLACEOMAT_LOG_LEVEL', 'INFO').upper()
@@ -14,6 +14,21 @@ YELP_KEYS = {
     'open': 'open_now',
 }
 
+# request parameter which limits the fields of each place, e.g.
+# fields=ID,Name,Location
+FIELDS_PARAM = 'fields'
+
+# request parameters which fetch more than the first page of results,
+# e.g. pages=3, or as many pages as it takes for max_results=50
+PAGES_PARAM = 'pages'
+MAX_RESULTS_PARAM = 'max_results'
+
+# request parameters which search an area larger than the provider allows
+# in one request, by covering it with tiles the provider does allow, e.g.
+# tile=1&location=52.52,13.40&radius=150000, or bounds=south,west,north,east
+TILE_PARAM = 'tile'
+BOUNDS_PARAM = 'bounds'
+
 KEY_MAPPING = {
     'google': GMAPS_KEYS,
     'yelp': YELP_KEYS
@@ -0,0 +1,8 @@
+# request parameters which order results by their distance from the
+# location of the query, and keep only the closest ones, e.g.
+# /search?query=cafes&location=52.5,13.4&sort=distance&limit=10
+SORT_PARAM = 'sort'
+LIMIT_PARAM = 'limit'
+
+# values of the sort parameter
+SORTS = ('distance',)
@@ -0,0 +1,9 @@
+import os
+
+# directory to record traffic into, for replaying it with bench/replay.py.
+# Recording is off unless PLACEOMAT_RECORD is set.
+RECORD_DIR = os.environ.get('PLACEOMAT_RECORD', '')
+
+# upstream request parameters which are left out of recordings, since
+# they hold API keys
+REDACT_PARAMS = ('key',)
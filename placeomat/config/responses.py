@@ -0,0 +1,10 @@
+# bodies smaller than this many bytes are sent as they are, since
+# compressing them saves less than it costs
+COMPRESS_MIN_SIZE = 1024
+
+# gzip level, 1 (fastest) to 9 (smallest)
+GZIP_LEVEL = 6
+
+# brotli quality, 0 (fastest) to 11 (smallest). Brotli is only offered if
+# the brotli package is installed.
+BROTLI_QUALITY = 4
@@ -0,0 +1,48 @@
+import os
+
+# SQLite file holding the place details we have looked up, so they survive
+# restarts and deploys. Off unless PLACEOMAT_DETAILS_DB is set, like the
+# place index, so a server does not write into whatever directory it
+# happens to be started from.
+DETAILS_PATH = os.environ.get('PLACEOMAT_DETAILS_DB', '')
+
+# seconds stored place details are used before they are looked up again.
+# A place's url and website almost never change, so this can be long.
+DETAILS_TTL = 30 * 24 * 60 * 60
+
+# details older than the TTL are deleted when the store is opened, and then
+# every DETAILS_PURGE_EVERY writes, so the file does not grow forever
+DETAILS_PURGE_EVERY = 1000
+
+# SQLite file holding the places every search has returned, indexed by
+# location, so nearby searches can be answered without going upstream.
+# Off unless PLACEOMAT_INDEX_DB is set, so a server does not write into
+# whatever directory it happens to be started from.
+INDEX_PATH = os.environ.get('PLACEOMAT_INDEX_DB', '')
+
+# an upstream search is trusted to answer searches inside its area as
+# long as the search cache would serve it, see TTLS in config/cache.py.
+# Searches older than that are deleted when the index is opened, and then
+# every INDEX_PURGE_EVERY recorded searches.
+INDEX_PURGE_EVERY = 1000
+
+# number of results a provider returns at most for one search, for the
+# providers which only return places inside the radius of a search. A
+# search which returned fewer than this got every place in its area, so it
+# can answer searches for any smaller area inside it as well. Google and
+# Yelp only take the radius as a hint, and may leave out places inside it,
+# so their searches only answer searches for the same area.
+INDEX_PAGE_SIZES = {}
+
+# geohash precision of the buckets places are indexed by, 6 is ~1km
+INDEX_PRECISION = 6
+
+# SQLite file holding search results, shared by the server processes of a
+# host, so a result one worker fetched is a hit in all of them, and a
+# restarted worker does not start cold. Off unless PLACEOMAT_SHARED_CACHE_DB
+# is set, since a single process has its own cache in memory.
+SHARED_CACHE_PATH = os.environ.get('PLACEOMAT_SHARED_CACHE_DB', '')
+
+# bytes of search results the shared cache holds, the oldest results are
+# dropped once it holds more
+SHARED_CACHE_MAX_BYTES = 256 * 1024 * 1024
@@ -1,7 +1,31 @@
-URLS = {'google': 'https://maps.googleapis.com/maps/api/place/textsearch/json',
-        'yelp': 'https://api.yelp.com/v3/businesses/search'}
+import os
+from urllib.parse import urlparse
 
-MORE_DETAILS = {'google': 'https://maps.googleapis.com/maps/api/place/details/json',
+# send the requests of all providers to this host instead, keeping the
+# path, e.g. PLACEOMAT_UPSTREAM=http://localhost:8080 to use the stub
+# upstream servers in bench/stub_upstream.py
+UPSTREAM = os.environ.get('PLACEOMAT_UPSTREAM', '')
+
+
+def _upstream(url):
+    """
+    Point a provider URL at the UPSTREAM host, if one is set
+
+    :param str url: URL of the provider
+    :return: URL to use
+    :rtype: str
+    """
+    if not (UPSTREAM and url):
+        return url
+    return UPSTREAM.rstrip('/') + urlparse(url).path
+
+
+URLS = {'google': _upstream(
+            'https://maps.googleapis.com/maps/api/place/textsearch/json'),
+        'yelp': _upstream('https://api.yelp.com/v3/businesses/search')}
+
+MORE_DETAILS = {'google': _upstream(
+                    'https://maps.googleapis.com/maps/api/place/details/json'),
                 'yelp': None}
 # assuming Text Search for Google Places API as it allows for keyword as well
 # as location (latlong), Google Places Nearby Search only takes latlong,
@@ -0,0 +1,265 @@
+import math
+
+# numpy scores many points at once, without it they are scored one by one
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# mean radius of the earth, in meters
+EARTH_RADIUS = 6371008.8
+
+# meters per degree of latitude
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """
+    Great circle distance between two points
+
+    :param float lat1: latitude of the first point
+    :param float lng1: longitude of the first point
+    :param float lat2: latitude of the second point
+    :param float lng2: longitude of the second point
+    :return: distance in meters
+    :rtype: float
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+
+    a = math.sin(dphi / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distances(lat, lng, points):
+    """
+    Great circle distances from one point to many, in one vectorized pass
+    if numpy is installed
+
+    :param float lat: latitude of the point
+    :param float lng: longitude of the point
+    :param list points: (latitude, longitude) of the other points
+    :return: distance to each point in meters, a numpy array if numpy is
+    installed
+    :rtype: list
+    """
+    if np is None:
+        return [haversine(lat, lng, p_lat, p_lng) for p_lat, p_lng in points]
+
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    phi1 = math.radians(lat)
+    phi2 = np.radians(points[:, 0])
+    dlmb = np.radians(points[:, 1] - lng)
+
+    a = np.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def parse_location(location):
+    """
+    Parse a 'latitude,longitude' request parameter
+
+    :param str location: the parameter
+    :return: latitude and longitude, or None if it cannot be parsed
+    :rtype: tuple
+    """
+    try:
+        lat, lng = [float(v) for v in location.split(',')]
+    except (AttributeError, ValueError):
+        return None
+
+    return lat, lng
+
+
+class Grid(object):
+    """
+    A spatial hash of points into square cells which are at least cell_size
+    meters wide at every latitude the grid is used for. All points within
+    cell_size of a point are in its cell or one of the 8 cells around it,
+    so finding neighbours does not mean comparing every pair of points.
+    """
+    def __init__(self, cell_size, max_lat=0.0):
+        """
+        :param float cell_size: size of a cell in meters
+        :param float max_lat: largest absolute latitude of the points
+        """
+        self.cell_size = cell_size
+        self.dlat = cell_size / METERS_PER_DEGREE
+        self.dlng = self.dlat / max(math.cos(math.radians(max_lat)), 0.01)
+        self._cells = {}
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.dlat)),
+                int(math.floor(lng / self.dlng)))
+
+    def add(self, lat, lng, item):
+        """ Add an item at the given point """
+        self._cells.setdefault(self._cell(lat, lng), []).append(
+            (lat, lng, item))
+
+    def near(self, lat, lng):
+        """
+        Get the items within cell_size of the given point
+
+        :param float lat: latitude of the point
+        :param float lng: longitude of the point
+        :return: generator of (distance, item)
+        :rtype: generator
+        """
+        row, col = self._cell(lat, lng)
+        for r in (row - 1, row, row + 1):
+            for c in (col - 1, col, col + 1):
+                for other_lat, other_lng, item in self._cells.get((r, c), []):
+                    distance = haversine(lat, lng, other_lat, other_lng)
+                    if distance <= self.cell_size:
+                        yield distance, item
+
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lng, precision=6):
+    """
+    Encode a point as a geohash. Points which are close to each other
+    mostly share a prefix, so a geohash prefix is a bucket of nearby points.
+
+    :param float lat: latitude of the point
+    :param float lng: longitude of the point
+    :param int precision: number of characters
+    :return: geohash
+    :rtype: str
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        ch <<= 1
+        if value >= mid:
+            ch |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+
+    return ''.join(chars)
+
+
+def geohash_size(precision):
+    """
+    Size of a geohash cell
+
+    :param int precision: number of characters
+    :return: height and width of a cell in degrees
+    :rtype: tuple
+    """
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def geohash_cover(lat, lng, radius, max_precision=6, max_cells=32):
+    """
+    Get the geohash prefixes of the cells which cover a circle, at the
+    finest precision which needs no more than max_cells cells.
+
+    :param float lat: latitude of the center
+    :param float lng: longitude of the center
+    :param float radius: radius in meters
+    :param int max_precision: finest precision to use
+    :param int max_cells: most cells to return
+    :return: geohash prefixes
+    :rtype: set
+    """
+    dlat = radius / METERS_PER_DEGREE
+    dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lng - dlng, -180.0), min(lng + dlng, 180.0)
+
+    for precision in range(max_precision, 0, -1):
+        height, width = geohash_size(precision)
+        rows = int(math.floor(north / height) - math.floor(south / height)) + 1
+        cols = int(math.floor(east / width) - math.floor(west / width)) + 1
+        if rows * cols <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    for r in range(rows):
+        for c in range(cols):
+            cell_lat = min((math.floor(south / height) + r + 0.5) * height,
+                           90.0)
+            cell_lng = min((math.floor(west / width) + c + 0.5) * width,
+                           180.0)
+            cells.add(geohash(cell_lat, cell_lng, precision))
+
+    return cells
+
+
+def hex_cover(south, west, north, east, radius):
+    """
+    Get the centers of circles which cover a bounding box, on a hex grid.
+    Rows are 1.5 radius apart, circles in a row sqrt(3) radius apart, and
+    every other row is shifted by half of that, which covers the plane
+    with the fewest circles. The spacing in a row is worked out at the
+    latitude of the box closest to the equator, where a degree of longitude
+    is widest, so it is never too wide.
+
+    :param float south: latitude of the south edge
+    :param float west: longitude of the west edge
+    :param float north: latitude of the north edge
+    :param float east: longitude of the east edge
+    :param float radius: radius of each circle in meters
+    :return: (latitude, longitude) of each center
+    :rtype: list
+    """
+    dlat = 1.5 * radius / METERS_PER_DEGREE
+    equator = 0.0 if south <= 0.0 <= north else min(abs(south), abs(north))
+    dlng = math.sqrt(3) * radius / METERS_PER_DEGREE / \
+        max(math.cos(math.radians(equator)), 0.01)
+
+    rows = int(math.ceil((north - south) / dlat)) + 1
+    centers = []
+    for row in range(rows):
+        lat = min(south + row * dlat, 90.0)
+        lng = west - (dlng / 2 if row % 2 else 0.0)
+        while lng <= east + dlng / 2:
+            centers.append((lat, lng))
+            lng += dlng
+
+    return centers
+
+
+def circle_cover(lat, lng, radius, tile_radius):
+    """
+    Get the centers of circles of tile_radius which cover a larger circle,
+    see hex_cover
+
+    :param float lat: latitude of the center
+    :param float lng: longitude of the center
+    :param float radius: radius in meters
+    :param float tile_radius: radius of each covering circle in meters
+    :return: (latitude, longitude) of each center
+    :rtype: list
+    """
+    if radius <= tile_radius:
+        return [(lat, lng)]
+
+    dlat = radius / METERS_PER_DEGREE
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    dlng = dlat / max(math.cos(math.radians(max(abs(south), abs(north)))),
+                      0.01)
+
+    # the grid covers the box around the circle, only circles which reach
+    # into the circle itself are needed
+    centers = hex_cover(south, lng - dlng, north, lng + dlng, tile_radius)
+    return [(c_lat, c_lng) for (c_lat, c_lng), distance
+            in zip(centers, distances(lat, lng, centers))
+            if distance <= radius + tile_radius]
@@ -1 +1,6 @@
 MAX_RADIUS = 50000
+
+# a search gives 20 results per page, and at most 3 pages
+# https://developers.google.com/places/web-service/search#PlaceSearchPaging
+PAGE_SIZE = 20
+MAX_PAGES = 3
@@ -0,0 +1,237 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from placeomat.config import metrics as metrics_config
+
+# content type of the Prometheus text format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry(object):
+    """ Keeps the metrics of the process, and renders them for /metrics """
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format
+
+        :rtype: str
+        """
+        lines = []
+        for metric in list(self.metrics):
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+class Metric(object):
+    """
+    A metric with a value per combination of label values. Values are
+    updated under a lock of their own, so updates are cheap and safe from
+    any thread. With collect, the values are read from elsewhere, e.g. the
+    counters of the search cache, when the metrics are rendered.
+    """
+    type = None
+
+    def __init__(self, name, help, labels=(), collect=None,
+                 registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def values(self):
+        """
+        Get the value of each combination of label values
+
+        :rtype: dict
+        """
+        if self.collect is not None:
+            return self.collect()
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        return ['%s%s %s' % (self.name, _labels(self.labels, labels),
+                             _number(value))
+                for labels, value in sorted(self.values().items())]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels):
+        self.add(1, *labels)
+
+    def add(self, amount, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels):
+        self.add(-1, *labels)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels):
+        """ Count the block as in progress while it runs """
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=None,
+                 registry=REGISTRY):
+        super(Histogram, self).__init__(name, help, labels,
+                                        registry=registry)
+        self.buckets = sorted(buckets or metrics_config.LATENCY_BUCKETS)
+
+    def observe(self, value, *labels):
+        """
+        Count a value into its bucket
+
+        :param float value: value to count, e.g. seconds
+        :param labels: values of the labels
+        """
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels, None)
+            if counts is None:
+                # a count per bucket, +Inf, then the sum of the values
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """ Observe the seconds the block took """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def values(self):
+        with self._lock:
+            return {labels: list(counts)
+                    for labels, counts in self._values.items()}
+
+    def render(self):
+        lines = []
+        bounds = self.buckets + [float('inf')]
+        for labels, counts in sorted(self.values().items()):
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                lines.append('%s_bucket%s %d' % (
+                    self.name,
+                    _labels(self.labels, labels, 'le="%s"' % _number(bound)),
+                    total))
+            lines.append('%s_sum%s %s' % (
+                self.name, _labels(self.labels, labels), _number(counts[-1])))
+            lines.append('%s_count%s %d' % (
+                self.name, _labels(self.labels, labels), total))
+        return lines
+
+
+def render():
+    """
+    Render the metrics of the process in the Prometheus text format
+
+    :rtype: str
+    """
+    return REGISTRY.render()
+
+
+UPSTREAM_LATENCY = Histogram(
+    'placeomat_upstream_request_seconds',
+    'Seconds an upstream request took, without waiting for the rate limit',
+    ('provider', 'kind'))
+
+UPSTREAM_RESPONSES = Counter(
+    'placeomat_upstream_responses_total',
+    'Upstream responses by HTTP status code, or error if there was none',
+    ('provider', 'kind', 'code'))
+
+UPSTREAM_IN_FLIGHT = Gauge(
+    'placeomat_upstream_requests_in_flight',
+    'Upstream requests waiting on a response',
+    ('provider', 'kind'))
+
+PROVIDER_STATUS = Counter(
+    'placeomat_provider_status_total',
+    'Upstream responses by the status the provider gave in the body',
+    ('provider', 'kind', 'status'))
+
+PARSE_TIME = Histogram(
+    'placeomat_parse_seconds',
+    'Seconds spent decoding search responses and formatting their places',
+    ('provider', 'stage'), buckets=metrics_config.PARSE_BUCKETS)
+
+RESULTS = Histogram(
+    'placeomat_search_results',
+    'Number of results of a search sent upstream',
+    ('provider',), buckets=metrics_config.RESULT_BUCKETS)
+
+LOOKUPS = Counter(
+    'placeomat_local_lookups_total',
+    'Lookups in the place index and the details store',
+    ('store', 'result'))
+
+SEARCHES_IN_FLIGHT = Gauge(
+    'placeomat_searches_in_flight',
+    'Searches sent upstream, after joining identical ones',
+    ('provider',))
+
+REFRESHES = Counter(
+    'placeomat_refreshes_total',
+    'Background refreshes of hot search results, by how they went',
+    ('provider', 'result'))
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from placeomat import metrics, recorder
+from placeomat.config import limits, storage
+from placeomat.providers import ratelimit, refresh, resilience, \
+    singleflight, transport
+from placeomat.providers.provider import Status, ValidationException, \
+    parse_tiles, search_options, tile_queries
+
+# the asyncio engine is an alternative to the sync one, so the sync API
+# keeps working when aiohttp is not installed
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# errors of a failed upstream request; network errors are worth a retry
+if aiohttp:
+    NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+else:
+    NETWORK_ERRORS = (asyncio.TimeoutError,)
+ERRORS = NETWORK_ERRORS + (ratelimit.RateLimited, resilience.CircuitOpen)
+
+# one client session per event loop; its connector keeps up to POOL_SIZE
+# connections alive per upstream host
+_SESSIONS = {}
+
+# SQLite reads and writes block, so they run here, off the event loop
+_STORAGE_EXECUTOR = ThreadPoolExecutor(max_workers=limits.STORAGE_WORKERS)
+
+
+class Response(object):
+    """
+    The parts of a requests.Response which providers use to parse a
+    response, so the parsing code is shared between the sync and the
+    asyncio engine.
+    """
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+def _get_session():
+    """
+    Get the client session of the running event loop, making it if needed
+
+    :return: client session
+    :rtype: aiohttp.ClientSession
+    """
+    if aiohttp is None:
+        raise RuntimeError('The asyncio engine requires aiohttp')
+
+    loop = asyncio.get_event_loop()
+    session = _SESSIONS.get(loop, None)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=limits.POOL_SIZE)
+        session = _SESSIONS[loop] = aiohttp.ClientSession(connector=connector)
+
+    return session
+
+
+async def get(url, params=None, headers=None, timeout=None,
+              scheduler=None, kind=ratelimit.SEARCH, provider=None,
+              retry_if=None):
+    """
+    Make a GET request over the pooled session of the running event loop,
+    see transport.get
+
+    :param str url: URL to request
+    :param dict params: query parameters
+    :param dict headers: extra request headers
+    :param timeout: read timeout in seconds, defaults to READ_TIMEOUT
+    :param Scheduler scheduler: rate limit of the provider and API key
+    :param str kind: kind of request, for the scheduler
+    :param str provider: provider the request goes to
+    :param retry_if: function telling if a response is worth a retry,
+    defaults to server errors
+    :return: response, with its body already read
+    :rtype: Response
+    """
+    if timeout is None:
+        timeout = limits.READ_TIMEOUT
+
+    # aiohttp only takes strings and numbers, requests would turn any
+    # other value into a string, so do the same
+    if params:
+        params = {k: v if isinstance(v, (str, int, float)) and
+                  not isinstance(v, bool) else str(v)
+                  for k, v in params.items()}
+
+    async def attempt():
+        return await _attempt(url, params, headers, timeout, scheduler, kind,
+                              provider)
+
+    if provider is None:
+        await resilience.admit_async(scheduler, kind, url)
+        return await attempt()
+
+    return await resilience.call_async(
+        provider, kind, attempt, retry_if or resilience.server_error,
+        NETWORK_ERRORS, scheduler)
+
+
+async def _attempt(url, params, headers, timeout, scheduler, kind, provider):
+    """
+    Make one attempt of a request, once it has its turn in the scheduler,
+    see get
+    """
+    provider = provider or ''
+    timeouts = aiohttp.ClientTimeout(sock_connect=limits.CONNECT_TIMEOUT,
+                                     sock_read=timeout)
+    start = time.perf_counter()
+    with metrics.UPSTREAM_IN_FLIGHT.track(provider, kind), \
+            metrics.UPSTREAM_LATENCY.time(provider, kind):
+        try:
+            async with _get_session().get(url, params=params, headers=headers,
+                                          timeout=timeouts) as response:
+                res = Response(response.status, await response.read())
+        except NETWORK_ERRORS:
+            metrics.UPSTREAM_RESPONSES.inc(provider, kind, 'error')
+            raise
+
+    metrics.UPSTREAM_RESPONSES.inc(provider, kind, str(res.status_code))
+
+    record = recorder.get_recorder()
+    if record:
+        record.upstream(url, params, res.status_code, res.content,
+                        time.perf_counter() - start)
+
+    if scheduler:
+        if res.status_code == transport.TOO_MANY_REQUESTS:
+            scheduler.backoff()
+        else:
+            scheduler.recover()
+
+    return res
+
+
+async def run_storage(fn, *args):
+    """
+    Run a function which reads or writes the SQLite stores on the storage
+    pool, so the event loop is not blocked while it waits on the disk
+
+    :param fn: function to run
+    :return: what the function returns
+    """
+    return await asyncio.get_event_loop().run_in_executor(
+        _STORAGE_EXECUTOR, fn, *args)
+
+
+def _searches_stored():
+    """ Tell if search results are kept in any SQLite file """
+    return bool(storage.SHARED_CACHE_PATH or storage.INDEX_PATH)
+
+
+async def close():
+    """ Close the client session of the running event loop """
+    session = _SESSIONS.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class AsyncProvider(object):
+    """
+    Mixin which turns a provider into an asyncio one. Building parameters
+    and parsing responses is shared with the sync provider, only making
+    requests and waiting on them is async. Mix it in before the provider:
+
+        class AsyncProvider(aio.AsyncProvider, Provider):
+            pass
+    """
+    # errors of a failed request, see Provider.REQUEST_ERRORS
+    REQUEST_ERRORS = ERRORS
+
+    async def query(self, query_args):
+        """
+        Make a query, and store the response for response to parse
+
+        :param query_args dict: query parameters
+        """
+        logging.debug('Making async query with %s in provider %s',
+                      query_args,
+                      self.name)
+
+        await self._send(self.prepare_params(query_args))
+
+    async def _send(self, params):
+        self._response = await self._request(params)
+
+    async def _request(self, params):
+        return await get(
+            self.api_url, params=params, headers=self.build_query_headers(),
+            scheduler=self.scheduler, provider=self.key_var,
+            retry_if=self.retryable)
+
+    async def response(self, enrich=True):
+        """
+        Parse the response of the query, see Provider.response
+
+        :return: response dictionary
+        :rtype: dict
+        """
+        return super(AsyncProvider, self).response(enrich)
+
+    async def search(self, query_args):
+        """
+        Query the provider and parse its response, going through the search
+        cache and place index, and joining identical searches in flight,
+        see Provider.search
+
+        :param query_args dict: query parameters
+        :return: response dictionary
+        :rtype: dict
+        """
+        tiled = parse_tiles(query_args, self.MAX_RADIUS)
+        if tiled is not None:
+            return await self._search_tiles(query_args, *tiled)
+
+        key, params, res, stored_args = self._lookup_cached(query_args)
+        if stored_args is not None:
+            if _searches_stored():
+                res = await run_storage(self._lookup_stored, key,
+                                        stored_args)
+            else:
+                res = self._lookup_stored(key, stored_args)
+        if res is not None:
+            return res
+
+        return await singleflight.ASYNC_INFLIGHT.do(
+            ('search',) + key, self._search_upstream,
+            key, params, query_args)
+
+    async def _search_tiles(self, query_args, centers, tile_radius, inside):
+        """ Async version of Provider._search_tiles """
+        slots = asyncio.Semaphore(limits.get_rate(self.key_var)[1])
+        errors = {}
+
+        async def tile(i, tile_args):
+            async with slots:
+                try:
+                    return await self.search(tile_args)
+                except ValidationException:
+                    raise
+                except Exception as e:
+                    errors[i] = e
+                    return self._tile_failed(e)
+
+        tasks = [asyncio.ensure_future(tile(i, tile_args))
+                 for i, tile_args in enumerate(tile_queries(
+                     query_args, centers, tile_radius, self.ENRICHED))]
+        try:
+            responses = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return self._combine_tiles(query_args, responses, inside, errors)
+
+    def _refresh(self, key, params, query_args):
+        refresh.REFRESHER.submit_async(self.key_var, key,
+                                       self._refresh_upstream,
+                                       key, params, query_args)
+
+    async def _refresh_upstream(self, key, params, query_args):
+        res = await singleflight.ASYNC_INFLIGHT.do(
+            ('search',) + key, self._search_upstream,
+            key, params, query_args)
+        return res['status'] is Status.VALID
+
+    async def _search_upstream(self, key, params, query_args):
+        with metrics.SEARCHES_IN_FLIGHT.track(self.key_var):
+            res = await self._fetch(params, **search_options(key))
+        if _searches_stored():
+            await run_storage(self._remember, key, query_args, res)
+        else:
+            self._remember(key, query_args, res)
+        return res
+
+    async def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        """ Async version of Provider._fetch """
+        await self._send(params)
+        return self._keep(await self.response(enrich=enrich), max_results)
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+
+from placeomat import metrics
+from placeomat.config import cache as cache_config
+from placeomat.config import keys
+
+
+# fields of a cache entry
+VALUE, EXPIRES, STORED, TTL, HITS, REFRESHING = range(6)
+
+
+class TTLCache(object):
+    """
+    A thread safe cache where every entry expires after its own TTL, and
+    the least recently used entry is dropped once the cache is full.
+    Keeps count of hits and misses, so we can tell if it pays off.
+
+    Entries also count their own hits, so lookup can tell when an entry
+    which is in demand is about to expire and should be refreshed, and
+    serve it stale while the refresh is running.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a value from the cache
+
+        :param key: key of the value
+        :return: the cached value, or None if missing or expired
+        """
+        return self.lookup(key)[0]
+
+    def lookup(self, key, hot_hits=None, ahead=0.0, stale=0.0):
+        """
+        Get a value from the cache, and tell if it should be refreshed: it
+        was hit at least hot_hits times, and less than the ahead share of
+        its TTL is left. An entry being refreshed is served for up to stale
+        seconds after it expired.
+
+        :param key: key of the value
+        :param int hot_hits: hits which make an entry worth refreshing, or
+        None to never refresh
+        :param float ahead: share of the TTL before expiry from which on
+        entries are refreshed
+        :param float stale: seconds an expired entry is served while it is
+        being refreshed
+        :return: the cached value or None, its age in seconds, whether it
+        expired, and whether the caller should refresh it
+        :rtype: tuple
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry[EXPIRES] <= now and not (
+                    entry[REFRESHING] and now < entry[EXPIRES] + stale):
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None, None, False, False
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            entry[HITS] += 1
+
+            refresh = hot_hits is not None and not entry[REFRESHING] and \
+                entry[HITS] >= hot_hits and \
+                now >= entry[EXPIRES] - ahead * entry[TTL]
+            if refresh:
+                entry[REFRESHING] = True
+
+            return entry[VALUE], now - entry[STORED], \
+                entry[EXPIRES] <= now, refresh
+
+    def refresh_failed(self, key):
+        """
+        Forget that an entry is being refreshed, so it expires as usual
+
+        :param key: key of the value
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                entry[REFRESHING] = False
+
+    def set(self, key, value, ttl):
+        """
+        Put a value into the cache
+
+        :param key: key of the value
+        :param value: value to cache
+        :param float ttl: seconds until the value expires
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = [value, now + ttl, now, ttl, 0, False]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Drop all entries and reset the counters """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Get the hit and miss counters of the cache
+
+        :return: hits, misses and number of entries
+        :rtype: dict
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'entries': len(self._entries)}
+
+
+# parsed search results of all providers
+SEARCH_CACHE = TTLCache(cache_config.MAX_ENTRIES)
+
+
+def make_key(provider, params):
+    """
+    Make a cache key from the final parameters sent to a provider. The
+    parameters are sorted, so the order they were given in does not matter,
+    and the parameter holding the API key is left out.
+
+    :param str provider: provider the parameters are sent to
+    :param dict params: final parameters of the query
+    :return: cache key
+    :rtype: tuple
+    """
+    key_param = keys.get_param(provider)
+    return (provider, tuple(sorted(
+        (k, str(v)) for k, v in params.items() if k != key_param)))
+
+
+def _cache_lookups():
+    stats = SEARCH_CACHE.stats()
+    return {('hit',): stats['hits'], ('miss',): stats['misses']}
+
+
+def _cache_entries():
+    return {(): SEARCH_CACHE.stats()['entries']}
+
+
+metrics.Counter('placeomat_search_cache_lookups_total',
+                'Lookups in the search cache', ('result',),
+                collect=_cache_lookups)
+metrics.Gauge('placeomat_search_cache_entries',
+              'Entries in the search cache', collect=_cache_entries)
@@ -1,15 +1,89 @@
+import asyncio
 import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
 
-from placeomat.config import urls
-from placeomat.providers import provider
+from placeomat import metrics
+from placeomat.config import limits, urls
+from placeomat.providers import aio, provider, ratelimit, singleflight, \
+    transport
+from placeomat.providers.place import Place
 from placeomat.gmaps import status as gstatus
 from placeomat.gmaps import validation
+from placeomat.storage import details as details_store
 
 import requests
 from requests.compat import urlencode, urlparse
 
+# placeholder for places whose details could not be looked up
+NO_DETAILS = 'Could not get more details'
+
+# reason of a details lookup whose request failed. The error itself is only
+# logged, its text has the URL of the request, API key and all.
+REQUEST_FAILED = 'Place details request failed'
+
+# shared by all responses, so the number of concurrent details lookups
+# stays bounded no matter how many searches are running
+_DETAILS_EXECUTOR = ThreadPoolExecutor(max_workers=limits.DETAILS_WORKERS)
+
+# the asyncio engine's counterpart of the details pool, one semaphore per
+# event loop
+_DETAILS_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def _details_semaphore():
+    """ Get the semaphore bounding details lookups on the running loop """
+    loop = asyncio.get_event_loop()
+    semaphore = _DETAILS_SEMAPHORES.get(loop, None)
+    if semaphore is None:
+        semaphore = _DETAILS_SEMAPHORES[loop] = \
+            asyncio.Semaphore(limits.DETAILS_WORKERS)
+    return semaphore
+
+
+def _ids(items):
+    return [item['place_id'] for item in items]
+
+
+def _new(items, asked, max_results=None):
+    """
+    Get the place_ids of items whose details were not asked for yet, and
+    count them as asked for. Only the first max_results places count, the
+    rest are cut from the result anyway.
+
+    :param list items: items of a search
+    :param set asked: place_ids whose details were asked for
+    :param int max_results: number of results to keep, or None for all
+    :rtype: list
+    """
+    new = []
+    for place_id in _ids(_unique(items)[:max_results]):
+        if place_id not in asked:
+            asked.add(place_id)
+            new.append(place_id)
+    return new
+
+
+def _unique(items):
+    """ Drop items of a place which was on an earlier page as well """
+    seen = set()
+    unique = []
+    for item in items:
+        if item['place_id'] not in seen:
+            seen.add(item['place_id'])
+            unique.append(item)
+    return unique
+
 
 class Provider(provider.Provider):
+    # filled by a place details request per result
+    ENRICHED = ('More Details',)
+
+    PAGE_SIZE = validation.PAGE_SIZE
+    MAX_PAGES = validation.MAX_PAGES
+    MAX_RADIUS = validation.MAX_RADIUS
+
     def __init__(self):
         self.name = 'Google Maps'
         super(Provider, self).__init__(key_var='google')
@@ -25,7 +99,7 @@ class Provider(provider.Provider):
             # https://developers.google.com/places/web-service/search
             if int(radius) > validation.MAX_RADIUS:
                 raise provider.ValidationException(
-                    'radius was %d, must be less than %d' % (
+                    'radius was %d, must be less than %d, or tile=1' % (
                         int(radius), validation.MAX_RADIUS))
 
         return params
@@ -33,19 +107,91 @@ class Provider(provider.Provider):
     def build_query_headers(self):
         return None
 
+    def retryable(self, response):
+        # the Places API reports server side errors in the body
+        if super(Provider, self).retryable(response):
+            return True
+
+        return gstatus.UNKNOWN_ERROR.encode() in response.content and \
+            response.json().get('status', None) == gstatus.UNKNOWN_ERROR
+
     def place_details(self, place_id):
         """
-        Gets the extra details about a place from the Places API
+        Gets the extra details about a place, from the details store if
+        we have looked the place up before, otherwise from the Places API
+
+        :param str place_id: Places API place_id
+        :return: Places API Response
+        """
+        store = details_store.get_store()
+        if store:
+            stored = store.get(self.key_var, place_id)
+            if stored is not None:
+                return self._make_response(provider.Status.VALID,
+                                           results=stored)
+
+        res = self._fetch_details(place_id)
+        if store and res['status'] is provider.Status.VALID:
+            store.put(self.key_var, place_id, res['results'])
+
+        return res
+
+    def _fetch_details(self, place_id):
+        """
+        Gets the extra details about a place from the Places API, joining
+        a lookup of the same place which is already in flight
 
         :param str place_id: Places API place_id
         :return: Places API Response
         """
+        return singleflight.INFLIGHT.do(
+            ('details', self.key_var, place_id),
+            self._request_details, place_id)
+
+    def _request_details(self, place_id):
+        """
+        Requests the extra details about a place from the Places API
+
+        :param str place_id: Places API place_id
+        :return: Places API Response
+        """
+        url, params = self._details_request(place_id)
+        try:
+            response = transport.get(url, params=params,
+                                     timeout=limits.DETAILS_TIMEOUT,
+                                     scheduler=self.scheduler,
+                                     kind=ratelimit.DETAILS,
+                                     provider=self.key_var,
+                                     retry_if=self.retryable)
+        except requests.RequestException as re:
+            logging.warning('Details of %s failed in provider %s: %s',
+                            place_id, self.name, re)
+            return self._make_response(provider.Status.INVALID,
+                                       reason=REQUEST_FAILED)
+
+        return self._parse_details(response)
+
+    def _details_request(self, place_id):
+        """
+        Build the URL and parameters of a place details request
+
+        :param str place_id: Places API place_id
+        :return: URL and parameters
+        :rtype: tuple
+        """
         url = urls.MORE_DETAILS['google']
         params = {'placeid': place_id, 'key': self.api_key}
         logging.debug('Making request to %s with %s',
                       url, params)
-        response = requests.get(url, params=params)
+        return url, params
+
+    def _parse_details(self, response):
+        """
+        Parse the response of a place details request
 
+        :param response: response of the Places API
+        :return: Places API Response
+        """
         code = response.status_code
         if code not in gstatus.VALID_CODES:
             return self._make_response(
@@ -54,8 +200,13 @@ class Provider(provider.Provider):
 
         res = response.json()
         status_code = res['status']
+        metrics.PROVIDER_STATUS.inc(self.key_var, ratelimit.DETAILS,
+                                    status_code)
 
         if status_code != gstatus.OK:
+            if status_code == gstatus.OVER_LIMIT:
+                self.scheduler.backoff()
+
             return self._make_response(
                 provider.Status.INVALID,
                 reason=gstatus.REASONS[status_code])
@@ -67,14 +218,165 @@ class Provider(provider.Provider):
                     'website': res['result'].get('website', 'None'),
                 })
 
-    def response(self):
+    def more_details(self, place_ids):
+        """
+        Look up the details of many places. Places in the details store are
+        read from it in one query, the rest are looked up in parallel.
+        Lookups which fail, or do not finish within the details deadline,
+        get a placeholder, so one slow lookup does not stall the whole
+        response.
+
+        :param list place_ids: Places API place_ids
+        :return: details, or the placeholder, for each place_id
+        :rtype: dict
+        """
+        store, stored, missing = self._stored_details(place_ids)
+
+        futures = {_DETAILS_EXECUTOR.submit(self._fetch_details, place_id):
+                   place_id for place_id in missing}
+        done, not_done = wait(futures, timeout=limits.DETAILS_DEADLINE)
+
+        details, fetched = self._finish_details(stored, futures, done,
+                                                not_done)
+        if store and fetched:
+            store.put_many(self.key_var, fetched)
+        return details
+
+    def _stored_details(self, place_ids):
+        """
+        Read the details of the places we have stored
+
+        :param list place_ids: Places API place_ids
+        :return: the details store, the stored details, and the set of
+        place_ids which still need a lookup
+        :rtype: tuple
+        """
+        store = details_store.get_store()
+        stored = store.get_many(self.key_var, place_ids) if store else {}
+        missing = set(place_ids) - set(stored)
+        if store:
+            metrics.LOOKUPS.add(len(stored), 'details', 'hit')
+            metrics.LOOKUPS.add(len(missing), 'details', 'miss')
+        return store, stored, missing
+
+    def _finish_details(self, stored, futures, done, not_done):
+        """
+        Collect finished details lookups, and give the rest a placeholder.
+        Works on both futures and asyncio tasks.
+
+        :param dict stored: details read from the store
+        :param dict futures: place_id of each lookup
+        :param set done: lookups which finished
+        :param set not_done: lookups which did not finish in time
+        :return: details, or the placeholder, for each place_id, and the
+        details which were looked up, to store
+        :rtype: tuple
+        """
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            logging.info('%d of %d place details lookups did not finish',
+                         len(not_done), len(futures))
+
+        fetched = {}
+        for future in done:
+            if future.exception():
+                logging.info('Place details lookup for %s failed: %s',
+                             futures[future], future.exception())
+                continue
+
+            res = future.result()
+            if res['status'] is provider.Status.VALID:
+                fetched[futures[future]] = res['results']
+
+        details = dict.fromkeys(futures.values(), NO_DETAILS)
+        details.update(stored)
+        details.update(fetched)
+        return details, fetched
+
+    def response(self, enrich=True):
         """
         Once a query has been made, response can be called to parse the request
         response, and return the appropriately formatted dictionary.
 
+        :param bool enrich: get the place details of each result
         :return: response dictionary
         :rtype: dict
         """
+        failed, items, _ = self._check_response()
+        if failed:
+            return failed
+
+        details = {}
+        if enrich:
+            details = self.more_details([item['place_id'] for item in items])
+        return self._make_places(items, details)
+
+    def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        """
+        Send the search, and follow its next_page_token for up to pages
+        pages. The token of the next page only works a moment after it is
+        handed out, so the place details of each page are looked up while
+        waiting for it.
+        """
+        if pages == 1:
+            return super(Provider, self)._fetch(params, enrich, pages,
+                                                max_results)
+
+        self._send(params)
+        failed, items, token = self._check_response()
+        if failed:
+            return failed
+
+        details, asked = {}, set()
+        for _ in range(pages - 1):
+            if not token:
+                break
+            ready = time.monotonic() + limits.NEXT_PAGE_DELAY
+            if enrich:
+                details.update(self.more_details(
+                    _new(items, asked, max_results)))
+            token = self._next_page(token, ready, items)
+
+        items = _unique(items)[:max_results]
+        if enrich:
+            details.update(self.more_details(_new(items, asked)))
+        return self._make_places(items, details)
+
+    def _next_page(self, token, ready, items):
+        """
+        Get the next page of a search, once its token is ready
+
+        :param str token: next_page_token of the page before
+        :param float ready: time.monotonic() from which on to ask for it
+        :param list items: items so far, the page's items are added
+        :return: token of the page after, or None
+        :rtype: str
+        """
+        for _ in range(limits.NEXT_PAGE_RETRIES + 1):
+            time.sleep(max(0.0, ready - time.monotonic()))
+            self._send(self._page_params(token))
+            failed, page, next_token = self._check_response()
+            if not failed:
+                items.extend(page)
+                return next_token
+            ready = time.monotonic() + limits.NEXT_PAGE_RETRY_DELAY
+
+        logging.info('Gave up on the next page of a %s search', self.name)
+        return None
+
+    def _page_params(self, token):
+        # the token stands for all other parameters of the search
+        return {'pagetoken': token, 'key': self.api_key}
+
+    def _check_response(self):
+        """
+        Check the status of the search response, and get its items
+
+        :return: response dictionary if the search did not succeed, or
+        None, the items of the search, and the token of the next page
+        :rtype: tuple
+        """
         code = self._response.status_code
 
         # so far, we only handle 200. Not sure what else the API
@@ -82,10 +384,13 @@ class Provider(provider.Provider):
         if code not in gstatus.VALID_CODES:
             return self._make_response(
                 provider.Status.INVALID,
-                reason='Got response code %d' % code)
+                reason='Got response code %d' % code), [], None
 
-        res = self._response.json()
+        with metrics.PARSE_TIME.time(self.key_var, 'decode'):
+            res = self._response.json()
         status_code = res['status']
+        metrics.PROVIDER_STATUS.inc(self.key_var, ratelimit.SEARCH,
+                                    status_code)
 
         if status_code != gstatus.OK:
 
@@ -95,45 +400,171 @@ class Provider(provider.Provider):
             if status_code == gstatus.ZERO_RESULTS:
                 return self._make_response(
                     provider.Status.VALID,
-                    reason=gstatus.REASONS[status_code])
+                    reason=gstatus.REASONS[status_code]), [], None
+
+            if status_code == gstatus.OVER_LIMIT:
+                self.scheduler.backoff()
 
             # ideally we would do some metric/tracing here to find out why
             # but for now we can just return that something went wrong
             return self._make_response(
                 provider.Status.INVALID,
-                reason=gstatus.REASONS[status_code])
-        else:  # success case
-            results = []
-            items = res['results']
-            for item in items:
-                # XXX: not sure what the description would be here
-                # Places API does not offer the description of a place
-                # through its API (e.g. "Asian Fusion Restaurant")
-                # so instead, we use the types, which are nouns that
-                # tell a bit about a place
-                #
-                # return the place_id here, so users can then ask
-                # for more details, as well
-               
-                # TODO: handle this better in terms of parsing and
-                # error response
-                more_details_url = 'Could not get more details'
-                details = self.place_details(item['place_id'])
-                if details['status'] is provider.Status.VALID:
-                    more_details_url = details['results']
-
-                data = {
-                    'ID': item['place_id'],
-                    'Provider': self.name,
-                    'Name': item['name'],
-                    'Description': ', '.join(item['types']),
-                    'Location': (item['geometry']['location']['lat'],
-                                 item['geometry']['location']['lng']),
-                    'Address': item['formatted_address'],
-                    'More Details': more_details_url,
-                }
-                results += [data]
+                reason=gstatus.REASONS[status_code]), [], None
 
-            return self._make_response(
-                provider.Status.VALID,
-                results=results)
+        return None, res['results'], res.get('next_page_token', None)
+
+    def _make_places(self, items, details):
+        """
+        Format the items of a successful search
+
+        :param list items: items of the search
+        :param dict details: more details of each place_id
+        :return: response dictionary
+        :rtype: dict
+        """
+        with metrics.PARSE_TIME.time(self.key_var, 'format'):
+            results = self._format_places(items, details)
+
+        return self._make_response(
+            provider.Status.VALID,
+            results=results)
+
+    def _format_places(self, items, details):
+        # XXX: not sure what the description would be here
+        # Places API does not offer the description of a place
+        # through its API (e.g. "Asian Fusion Restaurant")
+        # so instead, we use the types, which are nouns that
+        # tell a bit about a place
+        #
+        # return the place_id here, so users can then ask
+        # for more details, as well
+        name = self.name
+        return [Place(item['place_id'], name, item['name'],
+                      ', '.join(item['types']),
+                      (item['geometry']['location']['lat'],
+                       item['geometry']['location']['lng']),
+                      item['formatted_address'],
+                      details.get(item['place_id'], None))
+                for item in items]
+
+
+class AsyncProvider(aio.AsyncProvider, Provider):
+    """
+    Google Maps provider for the asyncio engine. The place details lookups
+    are bounded by a semaphore instead of a thread pool.
+    """
+
+    async def response(self, enrich=True):
+        failed, items, _ = self._check_response()
+        if failed:
+            return failed
+
+        details = {}
+        if enrich:
+            details = await self.more_details(
+                [item['place_id'] for item in items])
+        return self._make_places(items, details)
+
+    async def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        # details lookups run as tasks, so they overlap the following pages
+        # as well, not only the wait for their tokens
+        if pages == 1:
+            return await super(AsyncProvider, self)._fetch(
+                params, enrich, pages, max_results)
+
+        await self._send(params)
+        failed, items, token = self._check_response()
+        if failed:
+            return failed
+
+        lookups, asked = [], set()
+        for _ in range(pages - 1):
+            if not token:
+                break
+            ready = time.monotonic() + limits.NEXT_PAGE_DELAY
+            if enrich:
+                lookups.append(asyncio.ensure_future(
+                    self.more_details(_new(items, asked, max_results))))
+            token = await self._next_page(token, ready, items)
+
+        items = _unique(items)[:max_results]
+        details = {}
+        if enrich:
+            lookups.append(asyncio.ensure_future(
+                self.more_details(_new(items, asked))))
+            for found in await asyncio.gather(*lookups):
+                details.update(found)
+        return self._make_places(items, details)
+
+    async def _next_page(self, token, ready, items):
+        for _ in range(limits.NEXT_PAGE_RETRIES + 1):
+            await asyncio.sleep(max(0.0, ready - time.monotonic()))
+            await self._send(self._page_params(token))
+            failed, page, next_token = self._check_response()
+            if not failed:
+                items.extend(page)
+                return next_token
+            ready = time.monotonic() + limits.NEXT_PAGE_RETRY_DELAY
+
+        logging.info('Gave up on the next page of a %s search', self.name)
+        return None
+
+    async def place_details(self, place_id):
+        store = details_store.get_store()
+        if store:
+            stored = await aio.run_storage(store.get, self.key_var, place_id)
+            if stored is not None:
+                return self._make_response(provider.Status.VALID,
+                                           results=stored)
+
+        res = await self._fetch_details(place_id)
+        if store and res['status'] is provider.Status.VALID:
+            await aio.run_storage(store.put, self.key_var, place_id,
+                                  res['results'])
+
+        return res
+
+    async def _fetch_details(self, place_id):
+        return await singleflight.ASYNC_INFLIGHT.do(
+            ('details', self.key_var, place_id),
+            self._request_details, place_id)
+
+    async def _request_details(self, place_id):
+        url, params = self._details_request(place_id)
+        try:
+            response = await aio.get(url, params=params,
+                                     timeout=limits.DETAILS_TIMEOUT,
+                                     scheduler=self.scheduler,
+                                     kind=ratelimit.DETAILS,
+                                     provider=self.key_var,
+                                     retry_if=self.retryable)
+        except aio.ERRORS as e:
+            logging.warning('Details of %s failed in provider %s: %r',
+                            place_id, self.name, e)
+            return self._make_response(provider.Status.INVALID,
+                                       reason=REQUEST_FAILED)
+
+        return self._parse_details(response)
+
+    async def more_details(self, place_ids):
+        semaphore = _details_semaphore()
+
+        async def bounded(place_id):
+            async with semaphore:
+                return await self._fetch_details(place_id)
+
+        store, stored, missing = await aio.run_storage(self._stored_details,
+                                                       place_ids)
+
+        tasks = {asyncio.ensure_future(bounded(place_id)): place_id
+                 for place_id in missing}
+        done, not_done = set(), set()
+        if tasks:
+            done, not_done = await asyncio.wait(
+                tasks, timeout=limits.DETAILS_DEADLINE)
+
+        details, fetched = self._finish_details(stored, tasks, done,
+                                                not_done)
+        if store and fetched:
+            await aio.run_storage(store.put_many, self.key_var, fetched)
+        return details
@@ -0,0 +1,85 @@
+import logging
+import re
+import unicodedata
+
+from placeomat import geo
+from placeomat.config import merge as merge_config
+from placeomat.providers.place import Place
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_name(name):
+    """
+    Normalize a place name for comparison: no accents, no punctuation,
+    lower case, and single spaces.
+
+    :param str name: name of the place
+    :return: normalized name
+    :rtype: str
+    """
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = _PUNCTUATION.sub(' ', name.lower())
+    return ' '.join(name.split())
+
+
+def same_name(one, other):
+    """
+    Check if two normalized names are the same place. Providers often add
+    or drop words, e.g. 'starbucks' and 'starbucks coffee', so a name whose
+    words are all part of the other name counts as well.
+
+    :param str one: normalized name
+    :param str other: normalized name
+    :rtype: bool
+    """
+    if one == other:
+        return True
+
+    one, other = set(one.split()), set(other.split())
+    return bool(one and other) and (one <= other or other <= one)
+
+
+def merge(results, distance=merge_config.DISTANCE):
+    """
+    Merge results of different providers which are the same place: close
+    to each other, with the same name. Each merged result is the first
+    result of its cluster, with the IDs of all providers in the cluster.
+    Results are looked up in a spatial grid, so the cost stays close to
+    linear in the number of results.
+
+    :param list results: results of all providers
+    :param float distance: meters within which results may be merged
+    :return: merged results, in the order their first result was given
+    :rtype: list
+    """
+    located = [r for r in results if r.get('Location', None)]
+    max_lat = max([abs(r['Location'][0]) for r in located] or [0])
+    grid = geo.Grid(distance, max_lat)
+
+    merged = []
+    for result in results:
+        name = normalize_name(result.get('Name', None))
+        cluster = None
+
+        if result.get('Location', None):
+            lat, lng = result['Location']
+            candidates = sorted(grid.near(lat, lng), key=lambda c: c[0])
+            for _, (other_name, other) in candidates:
+                if result['Provider'] not in other['IDs'] and \
+                        same_name(name, other_name):
+                    cluster = other
+                    break
+
+        if cluster is None:
+            cluster = Place.from_dict(result)
+            cluster['IDs'] = {result['Provider']: result['ID']}
+            merged.append(cluster)
+            if result.get('Location', None):
+                grid.add(lat, lng, (name, cluster))
+        else:
+            cluster['IDs'][result['Provider']] = result['ID']
+
+    logging.debug('Merged %d results into %d', len(results), len(merged))
+    return merged
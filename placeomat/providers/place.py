@@ -0,0 +1,211 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+# keys of a place in responses, and the attribute holding each one, in the
+# order they are written in. IDs is only set on merged places.
+FIELDS = (('Address', 'address'),
+          ('Description', 'description'),
+          ('ID', 'id'),
+          ('IDs', 'ids'),
+          ('Location', 'location'),
+          ('More Details', 'more_details'),
+          ('Name', 'name'),
+          ('Provider', 'provider'))
+
+_ATTRS = dict(FIELDS)
+
+# JSON of a place, with its keys in sorted order, like jsonify writes them
+_JSON = ''.join(['{', ','.join('%s:%%s' % encode_basestring_ascii(key)
+                               for key, attr in FIELDS if attr != 'ids'), '}'])
+_MERGED_JSON = ''.join(['{', ','.join('%s:%%s' % encode_basestring_ascii(key)
+                                      for key, _ in FIELDS), '}'])
+
+# same output as flask's jsonify: sorted keys, compact, ASCII only
+_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+class Place(object):
+    """
+    A place found by a provider. Places are made for every result of every
+    search, so they keep their fields in slots instead of a dict, and are
+    written to JSON directly, see to_json. Cached searches hand out the
+    same places again, so a place keeps its JSON once written; change a
+    place through place[key] = value, which forgets it.
+
+    Places can still be read and written like the dicts providers used to
+    return, e.g. place['Name'], so code which only needs a few fields does
+    not care which of the two it is given.
+
+    A place made by project only has the fields it was asked for.
+    """
+    __slots__ = [attr for _, attr in FIELDS] + ['fields', '_json']
+
+    def __init__(self, id, provider, name, description=None, location=None,
+                 address=None, more_details=None, ids=None):
+        self.id = id
+        self.provider = provider
+        self.name = name
+        self.description = description
+        self.location = location
+        self.address = address
+        self.more_details = more_details
+        self.ids = ids
+        self.fields = None
+        self._json = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Make a place from its dict, e.g. one read back from JSON
+
+        :param dict data: the place, with the keys of FIELDS
+        :rtype: Place
+        """
+        location = data.get('Location', None)
+        return cls(data.get('ID', None), data.get('Provider', None),
+                   data.get('Name', None), data.get('Description', None),
+                   tuple(location) if location else location,
+                   data.get('Address', None), data.get('More Details', None),
+                   data.get('IDs', None))
+
+    def keys(self):
+        return [key for key, attr in FIELDS if key in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, key):
+        return key in _ATTRS and (key != 'IDs' or self.ids is not None) and \
+            (self.fields is None or key in self.fields)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, _ATTRS[key])
+
+    def __setitem__(self, key, value):
+        setattr(self, _ATTRS[key], value)
+        self._json = None
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, (Place, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Place(%r)' % self.to_dict()
+
+    def project(self, fields):
+        """
+        Copy the place with only some of its fields
+
+        :param fields: keys of the fields to keep
+        :rtype: Place
+        """
+        copy = Place(self.id, self.provider, self.name, self.description,
+                     self.location, self.address, self.more_details,
+                     self.ids)
+        copy.fields = frozenset(fields)
+        return copy
+
+    def to_json(self):
+        """
+        Write the place as JSON, without making a dict of it first
+
+        :rtype: str
+        """
+        if self._json is not None:
+            return self._json
+
+        if self.fields is not None:
+            self._json = '{%s}' % ','.join([
+                encode_basestring_ascii(key) + ':' + _encode(self[key])
+                for key in self.keys()])
+            return self._json
+
+        values = (_encode(self.address), _encode(self.description),
+                  _encode(self.id), _encode(self.location),
+                  _encode(self.more_details), _encode(self.name),
+                  _encode(self.provider))
+        if self.ids is None:
+            self._json = _JSON % values
+        else:
+            self._json = _MERGED_JSON % (
+                values[:3] + (encode(self.ids),) + values[3:])
+        return self._json
+
+
+def project(results, fields):
+    """
+    Cut results down to some of their fields
+
+    :param list results: places, or dicts of them
+    :param fields: keys of the fields to keep, or None for all
+    :rtype: list
+    """
+    if fields is None:
+        return results
+    return [r.project(fields) if isinstance(r, Place) else
+            {k: v for k, v in r.items() if k in fields} for r in results]
+
+
+def _encode(value):
+    # strings, coordinates and flat dicts of strings make up most of a
+    # place, so skip the encoder for them
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if type(value) is tuple and len(value) == 2 and \
+            type(value[0]) is float and type(value[1]) is float:
+        return '[%r,%r]' % value
+    if type(value) is dict:
+        try:
+            return '{%s}' % ','.join([
+                encode_basestring_ascii(k) + ':' + encode_basestring_ascii(v)
+                for k, v in sorted(value.items())])
+        except TypeError:
+            # not all strings
+            pass
+    return encode(value)
+
+
+def encode(value):
+    """
+    Write a value to JSON, places directly, everything else the same way
+    as flask's jsonify would
+
+    :param value: value to write, e.g. a list of places
+    :rtype: str
+    """
+    if isinstance(value, Place):
+        return value.to_json()
+    if isinstance(value, dict):
+        return '{' + ','.join(
+            encode_basestring_ascii(str(k)) + ':' + encode(v)
+            for k, v in sorted(value.items())) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(encode(v) for v in value) + ']'
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    return _ENCODER.encode(value)
+
+
+def dumps(body):
+    """
+    Write a response body to JSON, see encode
+
+    :param body: response body, e.g. a list of places
+    :return: JSON
+    :rtype: bytes
+    """
+    return encode(body).encode('ascii')
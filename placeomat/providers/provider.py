@@ -1,21 +1,298 @@
+import contextvars
+import itertools
 import logging
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from enum import Enum
 from abc import ABCMeta, abstractmethod
 
-from placeomat.config import keys, urls, query
+import requests
+
+from placeomat import geo, metrics
+from placeomat.config import cache as cache_config
+from placeomat.config import rank as rank_config
+from placeomat.config import keys, limits, urls, query
+from placeomat.providers import cache, place, ratelimit, refresh, \
+    resilience, singleflight, transport
+from placeomat.storage import places as place_index
+from placeomat.storage import shared
+
+
+# tiles of tiled searches are searched on this pool, shared by all searches
+_TILE_EXECUTOR = ThreadPoolExecutor(max_workers=limits.TILE_WORKERS)
+
+# reasons given to clients when a provider fails. The error itself is only
+# logged, its text can have the API key in it.
+REQUEST_FAILED = 'Provider request failed'
+PROVIDER_FAILED = 'Provider failed'
+UNAVAILABLE = 'Provider is unavailable, try again later'
+
+# errors which mean we hold back requests to a provider for now, rather
+# than a request to it failing
+HELD_BACK = (ratelimit.RateLimited, resilience.CircuitOpen)
 
 
 class Status(Enum):
     """ Simple enum for cleaner status handling (e.g. without magic strings)"""
     INVALID = 1
     VALID = 2
+    TIMEOUT = 3
 
 
 class ValidationException(Exception):
     pass
 
 
+def flag(value):
+    """
+    Interpret a request parameter as an on/off switch, e.g. no_cache=1
+
+    :param str value: value of the parameter, or None if not given
+    :return: whether the switch is on
+    :rtype: bool
+    """
+    if value is None:
+        return False
+    return str(value).strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def compile_map(mapping):
+    """
+    Compile a parameter map into the plan map_args follows: the keys each
+    parameter is mapped to, already split. Parameters mapped to nothing are
+    left out, so they stay unmapped.
+
+    :param dict mapping: map of the provider, see config.query
+    :return: tuple of keys for each mapped parameter
+    :rtype: dict
+    """
+    return {k: tuple(key.strip() for key in v.split(','))
+            for k, v in mapping.items() if v}
+
+
+def parse_fields(value):
+    """
+    Parse the fields parameter, e.g. fields=ID,Name,Location. Field names
+    are not case sensitive.
+
+    :param str value: value of the parameter, or None if not given
+    :return: names of the fields, or None for all fields
+    :rtype: frozenset
+    :raises ValidationException: if a field does not exist
+    """
+    if value is None or not str(value).strip():
+        return None
+
+    names = {key.lower(): key for key, _ in place.FIELDS}
+    fields = set()
+    for name in str(value).split(','):
+        name = name.strip().lower()
+        if name not in names:
+            raise ValidationException(
+                'Unknown field %s, choices are %s' % (
+                    name, ', '.join(key for key, _ in place.FIELDS)))
+        fields.add(names[name])
+
+    return frozenset(fields)
+
+
+def parse_ranking(query_args):
+    """
+    Parse the sort and limit parameters of a query
+
+    :param dict query_args: query parameters
+    :return: location to rank results by, or None to keep their order, and
+    the number of results to keep, or None for all
+    :rtype: tuple
+    :raises ValidationException: if a parameter is invalid
+    """
+    sort = query_args.get(rank_config.SORT_PARAM, None)
+    limit = query_args.get(rank_config.LIMIT_PARAM, None)
+
+    location = None
+    if sort:
+        if sort not in rank_config.SORTS:
+            raise ValidationException(
+                'Unknown sort %s, choices are %s' % (
+                    sort, ', '.join(rank_config.SORTS)))
+        location = geo.parse_location(query_args.get('location', None))
+        if location is None:
+            raise ValidationException('sort=%s needs a location' % sort)
+
+    if limit is not None and limit != '':
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            limit = 0
+        if limit < 1:
+            raise ValidationException('limit must be a positive number')
+    else:
+        limit = None
+
+    return location, limit
+
+
+def parse_count(query_args, param):
+    """
+    Parse a parameter which counts something, e.g. pages=3
+
+    :param dict query_args: query parameters
+    :param str param: name of the parameter
+    :return: the count, or None if not given
+    :rtype: int
+    :raises ValidationException: if it is not a positive number
+    """
+    value = query_args.get(param, None)
+    if value is None or value == '':
+        return None
+
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = 0
+    if value < 1:
+        raise ValidationException('%s must be a positive number' % param)
+
+    return value
+
+
+def parse_pages(query_args, page_size, max_pages):
+    """
+    Parse the pages and max_results parameters of a query
+
+    :param dict query_args: query parameters
+    :param int page_size: results per page of the provider
+    :param int max_pages: most pages the provider can give
+    :return: number of pages to fetch, and number of results to keep, or
+    None for all
+    :rtype: tuple
+    :raises ValidationException: if a parameter is invalid
+    """
+    pages = parse_count(query_args, query.PAGES_PARAM)
+    max_results = parse_count(query_args, query.MAX_RESULTS_PARAM)
+    if pages is None:
+        pages = 1 if max_results is None else -(-max_results // page_size)
+
+    if pages > max_pages:
+        raise ValidationException('pages was %d, must be at most %d' % (
+            pages, max_pages))
+
+    return pages, max_results
+
+
+def parse_tiles(query_args, tile_radius):
+    """
+    Parse the tile and bounds parameters of a query, and cover the area
+    they ask for with tiles no larger than the provider allows
+
+    :param dict query_args: query parameters
+    :param int tile_radius: largest radius the provider allows, or None if
+    it cannot be tiled
+    :return: None if the search is not tiled, else the (latitude,
+    longitude) center of each tile, the radius of the tiles, and a function
+    telling which of a list of points are in the area
+    :rtype: tuple
+    :raises ValidationException: if a parameter is invalid
+    """
+    bounds = query_args.get(query.BOUNDS_PARAM, None)
+    if not bounds and not flag(query_args.get(query.TILE_PARAM, None)):
+        return None
+
+    if not tile_radius:
+        raise ValidationException('Tiled searches are not supported')
+
+    if bounds:
+        try:
+            south, west, north, east = [float(v)
+                                        for v in str(bounds).split(',')]
+        except ValueError:
+            south = west = north = east = None
+        if south is None or not (-90.0 <= south < north <= 90.0 and
+                                 -180.0 <= west < east <= 180.0):
+            raise ValidationException(
+                'bounds must be south,west,north,east in degrees')
+
+        centers = geo.hex_cover(south, west, north, east, tile_radius)
+
+        def inside(points):
+            return [south <= lat <= north and west <= lng <= east
+                    for lat, lng in points]
+    else:
+        location = geo.parse_location(query_args.get('location', None))
+        try:
+            radius = float(query_args.get('radius', None))
+        except (TypeError, ValueError):
+            radius = 0
+        if location is None or radius <= 0:
+            raise ValidationException(
+                'A tiled search needs a location and radius, or bounds')
+
+        lat, lng = location
+        tile_radius = min(tile_radius, int(radius))
+        centers = geo.circle_cover(lat, lng, radius, tile_radius)
+
+        def inside(points):
+            return [distance <= radius
+                    for distance in geo.distances(lat, lng, points)]
+
+    if len(centers) > limits.MAX_TILES:
+        raise ValidationException(
+            'The area needs %d tiles, must be at most %d' % (
+                len(centers), limits.MAX_TILES))
+
+    # the tiles are cut down together, see tile_queries
+    parse_count(query_args, query.MAX_RESULTS_PARAM)
+
+    return centers, tile_radius, inside
+
+
+def tile_queries(query_args, centers, tile_radius, enriched=()):
+    """
+    Make the query of each tile of a tiled search. The tiles keep the
+    other parameters of the query, but rank and cut their results down
+    together, so they do not sort, limit or cap the results of each tile.
+
+    Enriched fields cost a request per result, which adds up over many
+    tiles, so the tiles only fill them if the query asks for them by name.
+
+    :param dict query_args: query parameters of the tiled search
+    :param list centers: (latitude, longitude) center of each tile
+    :param int tile_radius: radius of the tiles
+    :param tuple enriched: fields the provider fills with extra requests
+    :return: query parameters of each tile
+    :rtype: list
+    """
+    tiled = (query.TILE_PARAM, query.BOUNDS_PARAM, query.MAX_RESULTS_PARAM,
+             rank_config.SORT_PARAM, rank_config.LIMIT_PARAM)
+    base = {k: v for k, v in query_args.items() if k not in tiled}
+    if enriched and parse_fields(query_args.get(query.FIELDS_PARAM)) is None:
+        base[query.FIELDS_PARAM] = ','.join(
+            key for key, _ in place.FIELDS if key not in enriched)
+
+    return [dict(base, location='%.6f,%.6f' % center,
+                 radius=str(tile_radius))
+            for center in centers]
+
+
+# options of a search which change its result, but are not sent upstream
+# as they are. They are kept at the end of its cache key, as (name, value)
+# pairs named after the arguments of Provider._fetch, and only if they are
+# not the default.
+ENRICH = 'enrich'
+PAGES = 'pages'
+MAX_RESULTS = 'max_results'
+
+
+def search_options(key):
+    """
+    Get the options of a search from its cache key
+
+    :param tuple key: cache key of the search
+    :return: options which are not the default
+    :rtype: dict
+    """
+    return dict(key[2:])
+
+
 # abstract class for providers
 class Provider(object):
     """
@@ -28,14 +305,54 @@ class Provider(object):
     less robust. For this implementation, provider simplicity was taken into
     consideration. A more complex approach may be needed in the future.
 
+    Providers are long lived, one instance serves every request, see
+    registry. The response of a request is kept per thread and per asyncio
+    task, so searches running at the same time do not see each other's.
+
     This class is an Abstract Base Class.
     """
     __metaclass__ = ABCMeta
 
+    # fields which cost extra requests to fill, and are only filled when
+    # the fields parameter asks for them
+    ENRICHED = ()
+
+    # results per page, and most pages a search can walk, see _fetch
+    PAGE_SIZE = 20
+    MAX_PAGES = 1
+
+    # largest radius of one search, which tiled searches split larger
+    # areas into, or None if the provider has no such limit
+    MAX_RADIUS = None
+
+    # errors of a failed request to the provider
+    REQUEST_ERRORS = (requests.RequestException,)
+
     def __init__(self, key_var):
+        self.key_var = key_var
         self.api_url = urls.get_url(key_var)
         self.api_key = keys.get_key(key_var)
         self.map = query.get_map(key_var)
+        self.scheduler = ratelimit.get_scheduler(key_var, self.api_key)
+        self._responses = contextvars.ContextVar('response', default=None)
+
+    @property
+    def map(self):
+        return self._map
+
+    @map.setter
+    def map(self, mapping):
+        # split the mapped keys once, instead of on every request
+        self._map = mapping
+        self._plan = compile_map(mapping)
+
+    @property
+    def _response(self):
+        return self._responses.get()
+
+    @_response.setter
+    def _response(self, response):
+        self._responses.set(response)
 
     @abstractmethod
     def build_query_headers():
@@ -122,40 +439,48 @@ class Provider(object):
         # args that stay the same (fail to map)
         default_args = {}
 
+        plan = self._plan
         for k, v in kwargs.items():
-            mapped_key = self.map.get(k, None)
+            keys_to_map = plan.get(k, None)
 
             # everything _not_ covered here remains unmapped as default_args
-            if mapped_key:
-                # check if we have a one-to-many for keys
-                keys_to_map = mapped_key.split(',')
-
+            if keys_to_map is None:
+                default_args[k] = v
+            elif len(keys_to_map) == 1:
+                mapped_args[keys_to_map[0]] = v.strip()
+            else:
                 # only split values if we also successfully split keys
                 # e.g. we want to support single keys with multiple values
                 # like location = 'lat,long'
                 #
                 # but also lat,long = 'latval,longval' to turn into
                 # lat=latval, long=longval
-                if len(keys_to_map) > 1:
-                    values_to_map = v.split(',')
-                else:
-                    # note the [], which allows the below logic to work
-                    # for single values as well as multiple ones
-                    values_to_map = [v]
-
-                for i, key in enumerate(keys_to_map):
-                    logging.debug('Mapping key "%s" to "%s"', k, key)
-                    mapped_args[key] = values_to_map[i].strip()
-            else:
-                default_args[k] = v
-
-        logging.debug("Generated mapped args: %s", mapped_args)
-        logging.debug("Remaining args: %s", default_args)
+                for key, value in zip(keys_to_map, v.split(',')):
+                    mapped_args[key] = value.strip()
 
         # combine the dicts together (python3 syntax)
         args = {**mapped_args, **default_args}
         return args
 
+    def prepare_params(self, query_args):
+        """
+        Build the final parameters sent to the provider from the query
+        parameters: mapped, with the provider's extra parameters, and
+        validated.
+
+        :param query_args dict: query parameters
+        :return: parameters of the provider request
+        :rtype: dict
+        """
+        base_params = self.build_query_params(**query_args)
+        extra_params = self.extra_query_params()
+
+        # python 3.4 magic to combine two dicts
+        # will merge values if duplicate keys exist
+        params = {**base_params, **extra_params}
+
+        return self.validate_params(params)
+
     def query(self, query_args):
         """
         Make a query! Providers do not need to implement this,
@@ -176,27 +501,408 @@ class Provider(object):
                       query_args,
                       self.name)
 
-        base_params = self.build_query_params(**query_args)
-        extra_params = self.extra_query_params()
+        self._send(self.prepare_params(query_args))
 
-        # python 3.4 magic to combine two dicts
-        # will merge values if duplicate keys exist
-        params = {**base_params, **extra_params}
+    def _send(self, params):
+        """
+        Send the request with the final parameters, and store the
+        providers' response object.
+
+        :param params dict: parameters of the provider request
+        """
+        self._response = self._request(params)
+
+    def _request(self, params):
+        """
+        Send a request to the provider
 
-        params = self.validate_params(params)
+        :param params dict: parameters of the provider request
+        :return: response of the provider
+        """
         headers = self.build_query_headers()
 
-        self._response = requests.get(
-            self.api_url, params=params, headers=headers)
+        return transport.get(
+            self.api_url, params=params, headers=headers,
+            scheduler=self.scheduler, provider=self.key_var,
+            retry_if=self.retryable)
+
+    def retryable(self, response):
+        """
+        Tell if a response of the provider is a failure worth a retry.
+        Providers which report errors in the body of a successful response
+        can extend this.
+
+        :param response: response of the provider
+        :return: whether to retry the request
+        :rtype: bool
+        """
+        return response.status_code >= 500
+
+    def search(self, query_args):
+        """
+        Query the provider and parse its response, going through the search
+        cache. The cache key is the final parameters of the request, without
+        the API key, so equivalent queries share an entry. Only valid
+        responses are cached. On a cache miss, a search for an area which
+        recent searches already covered is answered from the place index.
+        Otherwise, identical searches which are already in flight are joined
+        instead of sent again.
+
+        The cache and index lookups can be skipped with the cache bypass
+        parameter, the fresh response then replaces the cached one.
+
+        Enriched fields are only filled if the fields parameter asks for
+        them. Places are not cut down to the fields here, the caller does
+        that once results are merged.
+
+        A search over an area larger than the provider allows can be tiled,
+        see _search_tiles.
+
+        :param query_args dict: query parameters
+        :return: response dictionary
+        :rtype: dict
+        """
+        tiled = parse_tiles(query_args, self.MAX_RADIUS)
+        if tiled is not None:
+            return self._search_tiles(query_args, *tiled)
+
+        key, params, res = self._lookup(query_args)
+        if res is not None:
+            return res
+
+        return singleflight.INFLIGHT.do(('search',) + key,
+                                        self._search_upstream,
+                                        key, params, query_args)
+
+    def _search_tiles(self, query_args, centers, tile_radius, inside):
+        """
+        Search an area as many tiles at the same time, each one a search of
+        its own which goes through the caches like any other. At most a
+        burst of the provider's rate is in flight, so a sweep does not
+        queue up more requests than the rate limit lets through at once.
+
+        :param query_args dict: query parameters
+        :param centers list: (latitude, longitude) center of each tile
+        :param tile_radius int: radius of the tiles
+        :param inside: function telling which points are in the area
+        :return: response dictionary
+        :rtype: dict
+        """
+        queries = iter(enumerate(tile_queries(query_args, centers,
+                                              tile_radius, self.ENRICHED)))
+        burst = limits.get_rate(self.key_var)[1]
+        running = {}
+        responses = [None] * len(centers)
+        errors = {}
+
+        def submit(tiles):
+            for i, tile in tiles:
+                running[_TILE_EXECUTOR.submit(self.search, tile)] = i
+
+        submit(itertools.islice(queries, burst))
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    try:
+                        responses[i] = future.result()
+                    except ValidationException:
+                        raise
+                    except Exception as e:
+                        errors[i] = e
+                        responses[i] = self._tile_failed(e)
+                submit(itertools.islice(queries, len(done)))
+        finally:
+            for future in running:
+                future.cancel()
+
+        return self._combine_tiles(query_args, responses, inside, errors)
+
+    def _tile_failed(self, error):
+        """
+        Turn the failure of one tile into an INVALID response. Like a
+        provider failing in query_all, the error is only logged, and the
+        response gets a fixed reason.
+
+        :param Exception error: the error the tile failed with
+        :return: response dictionary
+        :rtype: dict
+        """
+        if isinstance(error, self.REQUEST_ERRORS):
+            logging.warning('Tile of a tiled search failed in provider %s: '
+                            '%r', self.name, error)
+            reason = UNAVAILABLE if isinstance(error, HELD_BACK) \
+                else REQUEST_FAILED
+        else:
+            logging.error('Tile of a tiled search failed in provider %s',
+                          self.name, exc_info=error)
+            reason = PROVIDER_FAILED
+        return self._make_response(Status.INVALID, reason=reason)
+
+    def _combine_tiles(self, query_args, responses, inside, errors):
+        """
+        Combine the responses of the tiles of a search, in the order of the
+        tiles. A place found by more than one tile is kept once, and places
+        outside the area, which the tiles at its edge overlap, are dropped.
+
+        If every tile failed, and one of them because of a failed request,
+        that error is raised, so the search fails the same way a search of
+        a single tile would.
+
+        :param query_args dict: query parameters of the tiled search
+        :param responses list: response of each tile
+        :param inside: function telling which points are in the area
+        :param dict errors: error of each tile which raised one, by index
+        :return: response dictionary, VALID if any tile was
+        :rtype: dict
+        """
+        failed = [res for res in responses
+                  if res['status'] is not Status.VALID]
+        if len(failed) == len(responses):
+            for i in sorted(errors):
+                if isinstance(errors[i], self.REQUEST_ERRORS):
+                    raise errors[i]
+            return failed[0]
+
+        results, seen = [], set()
+        for res in responses:
+            if res['status'] is not Status.VALID:
+                continue
+            for result in res['results']:
+                if result['ID'] not in seen:
+                    seen.add(result['ID'])
+                    results.append(result)
+
+        located = [i for i, result in enumerate(results)
+                   if result.get('Location', None)]
+        points = [tuple(results[i]['Location']) for i in located]
+        outside = {i for i, keep in zip(located, inside(points)) if not keep}
+        results = [result for i, result in enumerate(results)
+                   if i not in outside]
+
+        reason = None
+        if failed:
+            reason = '%d of %d tiles failed: %s' % (
+                len(failed), len(responses), failed[0]['reason'])
+
+        max_results = parse_count(query_args, query.MAX_RESULTS_PARAM)
+        return self._keep(self._make_response(Status.VALID, results=results,
+                                              reason=reason), max_results)
+
+    def _lookup(self, query_args):
+        """
+        Build the final parameters of a search and look them up in the
+        search cache, the cache shared with the other server processes,
+        and then the place index, unless the request asks to bypass them.
+
+        :param query_args dict: query parameters
+        :return: cache key, parameters of the provider request, and the
+        local response dictionary or None
+        :rtype: tuple
+        """
+        key, params, res, stored_args = self._lookup_cached(query_args)
+        if stored_args is not None:
+            res = self._lookup_stored(key, stored_args)
+
+        return key, params, res
+
+    def _lookup_cached(self, query_args):
+        """
+        Build the final parameters of a search and look them up in the
+        search cache, see _lookup
+
+        :param query_args dict: query parameters
+        :return: cache key, parameters of the provider request, the cached
+        response dictionary or None, and the query parameters to look the
+        search up with in the SQLite stores, or None if it should not be
+        :rtype: tuple
+        """
+        query_args = dict(query_args)
+        bypass = flag(query_args.pop(cache_config.BYPASS_PARAM, None))
+        fields = parse_fields(query_args.pop(query.FIELDS_PARAM, None))
+
+        # ranking happens once the results of all providers are in
+        parse_ranking(query_args)
+        query_args.pop(rank_config.SORT_PARAM, None)
+        query_args.pop(rank_config.LIMIT_PARAM, None)
+
+        pages, max_results = parse_pages(query_args, self.PAGE_SIZE,
+                                         self.MAX_PAGES)
+        query_args.pop(query.PAGES_PARAM, None)
+        query_args.pop(query.MAX_RESULTS_PARAM, None)
+
+        params = self.prepare_params(query_args)
+        key = cache.make_key(self.key_var, params)
+        if pages != 1:
+            key += ((PAGES, pages),)
+        if max_results is not None:
+            key += ((MAX_RESULTS, max_results),)
+        if not self._enrich(fields):
+            key += ((ENRICH, False),)
+
+        if bypass:
+            return key, params, None, None
+
+        res, age, stale, refresh_due = cache.SEARCH_CACHE.lookup(
+            key, cache_config.HOT_HITS if cache_config.REFRESH else None,
+            cache_config.REFRESH_AHEAD, cache_config.STALE_TTL)
+        if refresh_due:
+            self._refresh(key, params, query_args)
+
+        if res is None:
+            return key, params, None, query_args
+
+        logging.debug('Cache hit for %s in provider %s',
+                      query_args, self.name)
+        if stale:
+            # the cached response is shared, mark a copy
+            res = dict(res, age=int(age))
+
+        return key, params, res, None
+
+    def _lookup_stored(self, key, query_args):
+        """
+        Look a search up in the cache shared with the other server
+        processes, and then the place index. Both are SQLite files.
+
+        :param key tuple: cache key of the request
+        :param query_args dict: query parameters, see _lookup_cached
+        :return: response dictionary, or None
+        :rtype: dict
+        """
+        res = self._shared_lookup(key)
+
+        # the index answers with the places of one page
+        options = search_options(key)
+        if res is None and options.get(PAGES, 1) == 1:
+            places = place_index.lookup(self.key_var, query_args)
+            if places is not None:
+                logging.debug('Place index hit for %s in provider %s',
+                              query_args, self.name)
+                res = self._keep(self._make_response(
+                    Status.VALID, results=places),
+                    options.get(MAX_RESULTS, None))
+            metrics.LOOKUPS.inc('index', 'miss' if places is None
+                                else 'hit')
+
+        return res
+
+    def _shared_lookup(self, key):
+        """
+        Look a search up in the shared cache, and keep a hit in the search
+        cache of this process until it expires
+
+        :param key tuple: cache key of the request
+        :return: response dictionary, or None
+        :rtype: dict
+        """
+        if shared.get_cache() is None:
+            return None
+
+        found = shared.lookup(key)
+        metrics.LOOKUPS.inc('shared', 'miss' if found is None else 'hit')
+        if found is None:
+            return None
+
+        places, reason, ttl = found
+        res = self._make_response(Status.VALID, results=places, reason=reason)
+        cache.SEARCH_CACHE.set(key, res, ttl)
+        return res
+
+    def _search_upstream(self, key, params, query_args):
+        """
+        Send the request, parse the response and remember it if valid
+
+        :param key tuple: cache key of the request
+        :param params dict: parameters of the provider request
+        :param query_args dict: query parameters
+        :return: response dictionary
+        :rtype: dict
+        """
+        with metrics.SEARCHES_IN_FLIGHT.track(self.key_var):
+            res = self._fetch(params, **search_options(key))
+        self._remember(key, query_args, res)
+        return res
+
+    def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        """
+        Send the search and parse its response. Providers which can walk
+        more than one page of results extend this.
+
+        :param params dict: parameters of the provider request
+        :param enrich bool: fill the enriched fields
+        :param pages int: number of pages to fetch
+        :param max_results int: number of results to keep, or None for all
+        :return: response dictionary
+        :rtype: dict
+        """
+        self._send(params)
+        return self._keep(self.response(enrich=enrich), max_results)
+
+    def _keep(self, res, max_results):
+        """ Cut the results of a response down to max_results """
+        if max_results is not None and res['results']:
+            res['results'] = res['results'][:max_results]
+        return res
+
+    def _enrich(self, fields):
+        """
+        Tell if a search has to fill the enriched fields
+
+        :param frozenset fields: fields asked for, or None for all
+        :rtype: bool
+        """
+        return fields is None or bool(fields.intersection(self.ENRICHED))
+
+    def _refresh(self, key, params, query_args):
+        """
+        Refresh a hot search result in the background, see refresh
+
+        :param key tuple: cache key of the request
+        :param params dict: parameters of the provider request
+        :param query_args dict: query parameters
+        """
+        refresh.REFRESHER.submit(self.key_var, key, self._refresh_upstream,
+                                 key, params, query_args)
+
+    def _refresh_upstream(self, key, params, query_args):
+        res = singleflight.INFLIGHT.do(('search',) + key,
+                                       self._search_upstream,
+                                       key, params, query_args)
+        return res['status'] is Status.VALID
+
+    def _remember(self, key, query_args, res):
+        """
+        Put a valid response into the search caches and the place index
+
+        :param key tuple: cache key of the request
+        :param query_args dict: query parameters
+        :param res dict: response dictionary
+        """
+        if res['status'] is not Status.VALID:
+            return
+
+        metrics.RESULTS.observe(len(res['results']), self.key_var)
+        ttl = cache_config.get_ttl(self.key_var)
+        cache.SEARCH_CACHE.set(key, res, ttl)
+        shared.remember(key, res['results'], res['reason'], ttl)
+
+        # the index answers any search, so it only takes complete places
+        # of plain, single page searches
+        if not search_options(key):
+            place_index.record(self.key_var, query_args, res['results'])
 
     @abstractmethod
-    def response(self):
+    def response(self, enrich=True):
         """
         The response method in a provider will take the self.response
         and format a dictionary with the fields:
 
         ID, Provider, Name, Description, Location, Address, Details URI
 
+        Fields in ENRICHED are left empty unless enrich is set.
+
         :return: a list of places, each place being a dictionary
         :rtype: list
         """
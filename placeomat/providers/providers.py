@@ -1,8 +1,20 @@
+import asyncio
 import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from placeomat.providers import gmaps
+import requests
+
+from placeomat.config import limits
+from placeomat.config import merge as merge_config
+from placeomat.config import query as query_config
+from placeomat.providers import aio, gmaps, merge, place, rank, \
+    registry
 from placeomat.providers import yelp
-from placeomat.providers.provider import Status, ValidationException
+from placeomat.providers.provider import Status, ValidationException, flag, \
+    parse_fields, parse_ranking, REQUEST_FAILED, PROVIDER_FAILED, \
+    UNAVAILABLE, HELD_BACK
 
 # register each provider here, in order to get nice client side validation
 # as well as the ability to query each provider
@@ -11,6 +23,22 @@ PROVIDERS = {
     'yelp': yelp.Provider,
 }
 
+# the same providers, for the asyncio engine
+ASYNC_PROVIDERS = {
+    'google': gmaps.AsyncProvider,
+    'yelp': yelp.AsyncProvider,
+}
+
+# shared across requests, so a provider which blows its deadline keeps
+# running in the background instead of holding up the response
+_EXECUTOR = ThreadPoolExecutor(max_workers=limits.FAN_OUT_WORKERS)
+
+# runs the searches of batch queries, so one large batch cannot take over
+# the fan-out executor
+_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=limits.BATCH_WORKERS)
+
+# the asyncio engine's counterpart, one semaphore per event loop
+_BATCH_SEMAPHORES = weakref.WeakKeyDictionary()
 
 def parse_response(response):
     """
@@ -60,89 +88,741 @@ def query(provider_str, query):
     :param str provider_str: the provider to query, or 'all'. The provider will be validated against available providers
     :param dict query: the query to send to the provider
 
-    :return: result of the query or reason for failure, and HTTP Status Code
+    :return: result of the query or reason for failure, HTTP Status Code,
+    and extra headers of the response
     :rtype: tuple
     """
     if provider_str == 'all':
-        try:
-            res = query_all(query)
-        except ValidationException as ve:
-            return _get_response_message(400, reason=str(ve))
-
-        return res, 200
+        return query_all(query) + ({},)
     else:
         provider = _validate_provider(provider_str)
         if not provider:
-            reason = '%s not a valid provider, choices are %s' % (
-                provider_str,
-                ', '.join(PROVIDERS.keys()))
-            return _get_response_message(400, reason=reason)
+            return _invalid_provider(provider_str) + ({},)
 
         try:
-            provider.query(query)
+            response = provider.search(query)
         except ValidationException as ve:
-            return _get_response_message(400, reason=str(ve))
+            return _get_response_message(400, reason=str(ve)) + ({},)
+        except requests.RequestException as e:
+            return _request_failed(provider_str, e) + ({},)
 
-        status, result, reason = parse_response(provider.response())
-        logging.debug("Got status %s (%s), %d results",
-                      status, reason, len(result))
-        if status == Status.VALID:
-            if len(result):
-                return result, 200
-            else:  # no results found!
-                logging.info("Provider %s got empty results", provider.name)
-                return _get_response_message(reason=reason)
-        else:
-            logging.info("Provider %s got bad request: %s",
-                         provider, reason)
-            return _get_response_message(400, reason=reason)
+        body, status = _query_response(provider, response,
+                                       _requested_fields(query),
+                                       _requested_ranking(query))
+        return body, status, _age_header(response)
+
+
+def _age_header(response):
+    """
+    Get the Age header of a single provider's response. The result of a
+    single provider is a bare list, so a result served from the cache
+    while it is being refreshed says so in the header instead of in a
+    status block, like query_all does.
+
+    :param dict response: response dictionary of the provider
+    :return: headers of the response
+    :rtype: dict
+    """
+    if 'age' not in response:
+        return {}
+    return {'Age': '%d' % response['age']}
+
+
+def _request_failed(provider_str, error):
+    """
+    Answer a query to a single provider whose request failed: 503 if we
+    hold back requests to the provider for now, 502 otherwise. The error is
+    only logged, see REQUEST_FAILED.
+
+    :param str provider_str: the provider
+    :param Exception error: the error of the request
+    :return: reason for failure, and HTTP Status Code
+    :rtype: tuple
+    """
+    logging.warning('Provider %s request failed: %r', provider_str, error)
+    if isinstance(error, HELD_BACK):
+        return _get_response_message(503, reason=UNAVAILABLE)
+    return _get_response_message(502, reason=REQUEST_FAILED)
+
+
+def _requested_fields(query):
+    """
+    Get the fields a query asks for. An invalid fields parameter is left
+    for the providers to report, like any other invalid parameter.
+
+    :param dict query: query params
+    :return: keys of the fields, or None for all
+    :rtype: frozenset
+    """
+    try:
+        return parse_fields(query.get(query_config.FIELDS_PARAM, None))
+    except ValidationException:
+        return None
+
+
+def _requested_ranking(query):
+    """
+    Get the ranking a query asks for, see parse_ranking. Like the fields,
+    invalid parameters are left for the providers to report.
+
+    :param dict query: query params
+    :return: location to rank by and number of results to keep
+    :rtype: tuple
+    """
+    try:
+        return parse_ranking(query)
+    except ValidationException:
+        return None, None
+
+
+def _invalid_provider(provider_str):
+    """
+    Build the response for a provider which does not exist
+
+    :param str provider_str: the provider which was asked for
+    :return: dict with reason, HTTP Status Code
+    :rtype: tuple
+    """
+    reason = '%s not a valid provider, choices are %s' % (
+        provider_str,
+        ', '.join(_available(PROVIDERS)))
+    return _get_response_message(400, reason=reason)
+
+
+def _query_response(provider, response, fields=None, ranking=(None, None)):
+    """
+    Turn the response of a single provider into the result of a query
+
+    :param Provider provider: the provider which was queried
+    :param dict response: response dictionary of the provider
+    :param fields: fields to keep of each place, or None for all
+    :param tuple ranking: location to rank by and number of results to keep
+    :return: result of the query or reason for failure, and HTTP Status Code
+    :rtype: tuple
+    """
+    status, result, reason = parse_response(response)
+    logging.debug("Got status %s (%s), %d results",
+                  status, reason, len(result))
+    if status == Status.VALID:
+        if len(result):
+            result = rank.rank(result, *ranking)
+            return place.project(result, fields), 200
+        else:  # no results found!
+            logging.info("Provider %s got empty results", provider.name)
+            return _get_response_message(reason=reason)
+    else:
+        logging.info("Provider %s got bad request: %s",
+                     provider, reason)
+        return _get_response_message(400, reason=reason)
+
+
+def place_id(provider_str, place_id):
+    """
+    Get the details of a single place from a provider.
+
+    :param str provider_str: the provider the place ID belongs to
+    :param str place_id: ID of the place at the provider
+
+    :return: details of the place or reason for failure, and HTTP Status Code
+    :rtype: tuple
+    """
+    provider = _validate_provider(provider_str)
+    if not provider:
+        return _invalid_provider(provider_str)
+
+    if not hasattr(provider, 'place_details'):
+        return _no_place_details(provider_str)
+
+    return _place_id_response(provider, provider.place_details(place_id))
 
 
-def _validate_provider(provider):
+def _no_place_details(provider_str):
+    reason = '%s does not support place details' % provider_str
+    return _get_response_message(400, reason=reason)
+
+
+def _place_id_response(provider, response):
+    """
+    Turn the place details response of a provider into the result
+
+    :param Provider provider: the provider which was asked
+    :param dict response: response dictionary of the provider
+    :return: details of the place or reason for failure, and HTTP Status Code
+    :rtype: tuple
     """
-    Method to ensure the provider passed in exists. If it exists, the provider will be instantiated.
+    status, result, reason = parse_response(response)
+    if status == Status.VALID:
+        return result, 200
+    else:
+        logging.info("Provider %s got bad place details request: %s",
+                     provider.name, reason)
+        return _get_response_message(400, reason=reason)
+
+
+def _validate_provider(provider, providers=PROVIDERS):
+    """
+    Method to ensure the provider passed in exists. If it exists, its long lived instance is returned.
 
     :param str provider: provider to check
-    :return: Provider
+    :param dict providers: registered providers, defaults to the sync ones
+    :return: Provider, or None if it does not exist or has no API key
     :rtype: Provider
     """
-    if PROVIDERS.get(provider, None):
-        return PROVIDERS[provider]()
+    if providers.get(provider, None):
+        return registry.REGISTRY.get(providers[provider])
     else:
         return None
 
 
+def _available(providers=PROVIDERS):
+    """
+    Get the names of the providers which can be queried
+
+    :param dict providers: registered providers, defaults to the sync ones
+    :rtype: list
+    """
+    return registry.REGISTRY.load(providers)
+
+
+def load():
+    """
+    Make the providers up front, so the first requests do not have to,
+    and log which ones are available
+
+    :return: names of the available providers
+    :rtype: list
+    """
+    names = _available(PROVIDERS)
+    _available(ASYNC_PROVIDERS)
+    logging.info('Available providers: %s', ', '.join(names) or 'none')
+    return names
+
+
+def _provider_failed(reason, status=Status.INVALID):
+    """
+    Build an internal response for a provider which could not produce one
+    itself, e.g. because it raised or ran out of time.
+
+    :param str reason: reason for the failure
+    :param Status status: status to report, defaults to INVALID
+    :return: response dictionary
+    :rtype: dict
+    """
+    return {'status': status, 'results': [], 'reason': reason}
+
+
+def _run_provider(provider_str, query):
+    """
+    Query a single provider and parse its response. Runs on the fan-out
+    executor, so any failure is turned into an INVALID response instead
+    of being raised.
+
+    :param str provider_str: name of the provider to query
+    :param dict query: query params to send to the provider
+    :return: response dictionary
+    :rtype: dict
+    """
+    try:
+        return _validate_provider(provider_str).search(query)
+    except ValidationException as ve:
+        return _provider_failed(str(ve))
+    except requests.RequestException as e:
+        # the error has the URL of the request, API key and all, so it is
+        # only logged
+        logging.warning('Provider %s request failed: %s', provider_str, e)
+        return _provider_failed(REQUEST_FAILED)
+    except Exception:
+        logging.exception('Provider %s failed', provider_str)
+        return _provider_failed(PROVIDER_FAILED)
+
+
+def _fan_out(query):
+    """
+    Query all providers concurrently. Each provider gets its own deadline
+    from the limits config; a provider which misses it is reported as
+    TIMEOUT and left to finish in the background.
+
+    :param dict query: query params to send to each provider
+    :return: generator of (provider name, response dictionary) in the order
+    the providers complete
+    :rtype: generator
+    """
+    start = time.monotonic()
+    futures = {_EXECUTOR.submit(_run_provider, name, query): name
+               for name in _available(PROVIDERS)}
+    pending = set(futures)
+
+    while pending:
+        elapsed = time.monotonic() - start
+        expired = [f for f in pending
+                   if limits.get_deadline(futures[f]) <= elapsed]
+        for future in expired:
+            pending.discard(future)
+            future.cancel()
+            name = futures[future]
+            logging.info('Provider %s missed its deadline of %.1fs',
+                         name, limits.get_deadline(name))
+            yield name, _provider_failed(
+                'Provider did not respond in time', Status.TIMEOUT)
+
+        if not pending:
+            break
+
+        timeout = min(limits.get_deadline(futures[f])
+                      for f in pending) - elapsed
+        done, pending = wait(pending, timeout=timeout,
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            yield futures[future], future.result()
+
+
 def query_all(query):
     """
-    Convenience method to query all providers. This method can build a list of results for multiple providers.
+    Convenience method to query all providers. The providers are queried
+    concurrently, and their results are merged as they complete. A provider
+    which fails or times out does not throw away the results of the others;
+    each provider gets an entry in the status block of the response instead.
+
+    With the merge parameter, results of different providers which are the
+    same place are merged into one. With the sort and limit parameters,
+    results are ordered by their distance from the location of the query,
+    and only the closest are kept. With the fields parameter, places only
+    have the fields asked for.
 
     :param dict query: query params to send to each provider
-    :return: result of the query or reason for failure, and HTTP Status Code
+    :return: results and per-provider statuses, and HTTP Status Code
     :rtype: tuple
 
     """
-    results = []
-    statuses = []
-    for provider in PROVIDERS.values():
-        p = provider()
-        p.query(query)
-        status, result, reason = parse_response(p.response())
-        statuses.append(status)
+    query = dict(query)
+    merged = flag(query.pop(merge_config.PARAM, None))
+    return _collect(_fan_out(query), merged, _requested_fields(query),
+                    _requested_ranking(query))
+
+
+def _collect(responses, merged=False, fields=None, ranking=(None, None)):
+    """
+    Combine the responses of many providers into the result of a query
+
+    :param responses: iterable of (provider name, response dictionary)
+    :param bool merged: merge results which are the same place
+    :param fields: fields to keep of each place, or None for all
+    :param tuple ranking: location to rank by and number of results to keep
+    :return: results and per-provider statuses, and HTTP Status Code
+    :rtype: tuple
+    """
+    statuses = {}
+    results = list(_provider_results(responses, statuses))
+
+    if merged:
+        results = merge.merge(results)
+    results = rank.rank(results, *ranking)
+
+    # after merging, which needs the names and locations
+    body = {'results': place.project(results, fields), 'providers': statuses}
+    return body, _status_code(statuses)
+
+
+def _provider_results(responses, statuses):
+    """
+    Yield the results of each provider as its response comes in, and keep
+    the status of each provider.
+
+    :param responses: iterable of (provider name, response dictionary)
+    :param dict statuses: gets the status block of each provider
+    :return: generator of results
+    :rtype: generator
+    """
+    for name, response in responses:
+        status, result, reason = parse_response(response)
+        statuses[name] = {'status': status.name,
+                          'reason': reason,
+                          'count': len(result)}
+        if 'age' in response:
+            # served from the cache while it is being refreshed
+            statuses[name]['age'] = response['age']
 
         if status == Status.VALID:
-            results += result
-        elif status == Status.INVALID:
-            logging.info("Provider %s got invalid status: %s",
-                         p.name, reason)
-            return _get_response_message(400, reason=reason)
-
-    if len(results):
-        return results, 200
+            yield from result
+        else:
+            logging.info("Provider %s got %s status: %s",
+                         name, status.name, reason)
+
+
+def _status_code(statuses):
+    """
+    Get the HTTP Status Code of a query from the status of each provider
+
+    :param dict statuses: status block of each provider
+    :return: 200 if any provider answered, 504 if all of them ran out of
+    time, 400 otherwise
+    :rtype: int
+    """
+    states = [s['status'] for s in statuses.values()]
+
+    if Status.VALID.name in states:
+        return 200
+    elif states and all([s == Status.TIMEOUT.name for s in states]):
+        return 504
     else:
-        if all([s == Status.VALID for s in statuses]):
-            logging.info("Provider %s got empty results", p.name)
-            return _get_response_message(reason=reason)
+        return 400
+
+
+def _summary(statuses, reason=None):
+    """
+    Build the record which ends a streamed query
+
+    :param dict statuses: status block of each provider
+    :param str reason: reason the query failed as a whole, if any
+    :return: summary record
+    :rtype: dict
+    """
+    return {'summary': {'providers': statuses,
+                        'status': _status_code(statuses),
+                        'reason': reason}}
+
+
+def stream(provider_str, query):
+    """
+    Like query, but yields each result as soon as its provider has parsed
+    it, instead of waiting for all providers. The last record is a summary
+    with the status of each provider, and the HTTP Status Code the query
+    would have had. Results are not merged or ranked, since that needs all
+    of them.
+
+    :param str provider_str: the provider to query, or 'all'
+    :param dict query: the query to send to the providers
+    :return: generator of results, followed by the summary record
+    :rtype: generator
+    """
+    query = dict(query)
+    query.pop(merge_config.PARAM, None)
+
+    if provider_str == 'all':
+        responses = _fan_out(query)
+    elif _validate_provider(provider_str):
+        responses = [(provider_str, _run_provider(provider_str, query))]
+    else:
+        body, _ = _invalid_provider(provider_str)
+        yield _summary({}, body['reason'])
+        return
+
+    fields = _requested_fields(query)
+    statuses = {}
+    for result in _provider_results(responses, statuses):
+        yield place.project([result], fields)[0]
+    yield _summary(statuses)
+
+
+def batch(queries, provider_names=None):
+    """
+    Run many queries at once. Each query is answered like query would
+    answer it, for one provider, or for several like query_all. Identical
+    searches of the same provider are only run once per batch, and all
+    searches run concurrently on the batch executor. Unlike query_all,
+    searches are not cut off at the provider deadline, since a batch would
+    rather wait for complete results.
+
+    :param list queries: query params of each query
+    :param list provider_names: providers to query, defaults to all
+    :return: status code and body of each query, in the order given, and
+    HTTP Status Code
+    :rtype: tuple
+    """
+    failed = _check_batch(queries, provider_names)
+    if failed:
+        return failed
+
+    names = provider_names or _available(PROVIDERS)
+    plans, searches = _plan_batch(queries, names)
+
+    futures = {key: _BATCH_EXECUTOR.submit(_run_provider, name, query)
+               for key, (name, query) in searches.items()}
+    responses = {key: future.result() for key, future in futures.items()}
+
+    return _batch_body(plans, responses, _single(provider_names))
+
+
+def _single(provider_names):
+    """
+    Tell if a batch answers its queries like a search of one provider. That
+    is when it names exactly one provider; without names it is answered
+    like a search of all providers, however many of them can be queried.
+
+    :param list provider_names: providers the batch names, or None
+    :rtype: bool
+    """
+    return provider_names is not None and len(provider_names) == 1
+
+
+def _check_batch(queries, provider_names, providers=PROVIDERS):
+    """
+    Check the queries and providers of a batch
+
+    :return: reason and HTTP Status Code if the batch is invalid, or None
+    :rtype: tuple
+    """
+    if not isinstance(queries, list) or \
+            not all(isinstance(q, dict) for q in queries):
+        return _get_response_message(
+            400, reason='queries must be a list of objects')
+
+    if len(queries) > limits.BATCH_MAX_QUERIES:
+        return _get_response_message(
+            400, reason='a batch may have at most %d queries' %
+            limits.BATCH_MAX_QUERIES)
+
+    if provider_names is not None:
+        if not isinstance(provider_names, list) or not provider_names:
+            return _get_response_message(
+                400, reason='providers must be a list of providers')
+
+        for name in provider_names:
+            if not isinstance(name, str) or \
+                    not _validate_provider(name, providers):
+                return _invalid_provider(name)
+
+    return None
+
+
+def _plan_batch(queries, names):
+    """
+    Turn the queries of a batch into searches, one per provider and
+    distinct query
+
+    :param list queries: query params of each query
+    :param list names: providers to query
+    :return: the merge flag, fields, ranking and search keys of each query,
+    and the provider and query params of each search
+    :rtype: tuple
+    """
+    plans, searches = [], {}
+    for query in queries:
+        # the same as query string params would be
+        query = {str(k): str(v) for k, v in query.items()}
+        merged = flag(query.pop(merge_config.PARAM, None))
+        fields = _requested_fields(query)
+        ranking = _requested_ranking(query)
+
+        canonical = tuple(sorted(query.items()))
+        keys = []
+        for name in names:
+            key = (name, canonical)
+            searches.setdefault(key, (name, query))
+            keys.append(key)
+        plans.append((merged, fields, ranking, keys))
+
+    return plans, searches
+
+
+def _batch_body(plans, responses, single):
+    """
+    Build the result of a batch from the responses of its searches
+
+    :param list plans: merge flag, fields, ranking and search keys of each
+    query
+    :param dict responses: response dictionary of each search
+    :param bool single: answer like a search of one provider, see _single
+    :return: status code and body of each query, and HTTP Status Code
+    :rtype: tuple
+    """
+    results = []
+    for merged, fields, ranking, keys in plans:
+        if single:
+            name = keys[0][0]
+            body, status = _query_response(_validate_provider(name),
+                                           responses[keys[0]], fields,
+                                           ranking)
         else:
-            logging.info("Provider %s got bad request: %s",
-                         p.name, reason)
-            return _get_response_message(400, reason=reason)
+            body, status = _collect(
+                [(key[0], responses[key]) for key in keys], merged, fields,
+                ranking)
+        results.append({'status': status, 'body': body})
+
+    return {'results': results}, 200
+
+
+# the asyncio engine. Same semantics as the sync functions above, but
+# waiting on providers does not pin a thread.
+async def query_async(provider_str, query):
+    """
+    Async version of query
+
+    :param str provider_str: the provider to query, or 'all'
+    :param dict query: the query to send to the provider
+
+    :return: result of the query or reason for failure, HTTP Status Code,
+    and extra headers of the response
+    :rtype: tuple
+    """
+    if provider_str == 'all':
+        return await query_all_async(query) + ({},)
+
+    provider = _validate_provider(provider_str, ASYNC_PROVIDERS)
+    if not provider:
+        return _invalid_provider(provider_str) + ({},)
+
+    try:
+        response = await provider.search(query)
+    except ValidationException as ve:
+        return _get_response_message(400, reason=str(ve)) + ({},)
+    except aio.ERRORS as e:
+        return _request_failed(provider_str, e) + ({},)
+
+    body, status = _query_response(provider, response,
+                                   _requested_fields(query),
+                                   _requested_ranking(query))
+    return body, status, _age_header(response)
+
+
+async def place_id_async(provider_str, place_id):
+    """
+    Async version of place_id
+
+    :param str provider_str: the provider the place ID belongs to
+    :param str place_id: ID of the place at the provider
+
+    :return: details of the place or reason for failure, and HTTP Status Code
+    :rtype: tuple
+    """
+    provider = _validate_provider(provider_str, ASYNC_PROVIDERS)
+    if not provider:
+        return _invalid_provider(provider_str)
+
+    if not hasattr(provider, 'place_details'):
+        return _no_place_details(provider_str)
+
+    response = await provider.place_details(place_id)
+    return _place_id_response(provider, response)
+
+
+async def _run_provider_async(provider_str, query, timed=True):
+    """
+    Async version of _run_provider, which also applies the deadline of the
+    provider, unless timed is off.
+
+    :param str provider_str: name of the provider to query
+    :param dict query: query params to send to the provider
+    :param bool timed: cut the search off at the provider deadline
+    :return: provider name and response dictionary
+    :rtype: tuple
+    """
+    deadline = limits.get_deadline(provider_str)
+    try:
+        p = _validate_provider(provider_str, ASYNC_PROVIDERS)
+        search = p.search(query)
+        if timed:
+            search = asyncio.wait_for(search, deadline)
+        response = await search
+    except asyncio.TimeoutError:
+        logging.info('Provider %s missed its deadline of %.1fs',
+                     provider_str, deadline)
+        response = _provider_failed(
+            'Provider did not respond in time', Status.TIMEOUT)
+    except ValidationException as ve:
+        response = _provider_failed(str(ve))
+    except aio.ERRORS as e:
+        # same as _run_provider, the error may have the API key in it
+        logging.warning('Provider %s request failed: %s', provider_str, e)
+        response = _provider_failed(REQUEST_FAILED)
+    except Exception:
+        logging.exception('Provider %s failed', provider_str)
+        response = _provider_failed(PROVIDER_FAILED)
+
+    return provider_str, response
+
+
+async def query_all_async(query):
+    """
+    Async version of query_all
+
+    :param dict query: query params to send to each provider
+    :return: results and per-provider statuses, and HTTP Status Code
+    :rtype: tuple
+    """
+    query = dict(query)
+    merged = flag(query.pop(merge_config.PARAM, None))
+
+    responses = []
+    for done in asyncio.as_completed(
+            [_run_provider_async(name, query)
+             for name in _available(ASYNC_PROVIDERS)]):
+        responses.append(await done)
+
+    return _collect(responses, merged, _requested_fields(query),
+                    _requested_ranking(query))
+
+
+async def stream_async(provider_str, query):
+    """
+    Async version of stream
+
+    :param str provider_str: the provider to query, or 'all'
+    :param dict query: the query to send to the providers
+    :return: async generator of results, followed by the summary record
+    :rtype: async generator
+    """
+    query = dict(query)
+    query.pop(merge_config.PARAM, None)
+
+    if provider_str == 'all':
+        names = _available(ASYNC_PROVIDERS)
+    elif _validate_provider(provider_str, ASYNC_PROVIDERS):
+        names = [provider_str]
+    else:
+        body, _ = _invalid_provider(provider_str)
+        yield _summary({}, body['reason'])
+        return
+
+    fields = _requested_fields(query)
+    statuses = {}
+    for done in asyncio.as_completed(
+            [_run_provider_async(name, query) for name in names]):
+        for result in _provider_results([await done], statuses):
+            yield place.project([result], fields)[0]
+
+    yield _summary(statuses)
+
+
+async def batch_async(queries, provider_names=None):
+    """
+    Async version of batch. Like there, searches are not cut off at the
+    provider deadline.
+
+    :param list queries: query params of each query
+    :param list provider_names: providers to query, defaults to all
+    :return: status code and body of each query, in the order given, and
+    HTTP Status Code
+    :rtype: tuple
+    """
+    failed = _check_batch(queries, provider_names, ASYNC_PROVIDERS)
+    if failed:
+        return failed
+
+    names = provider_names or _available(ASYNC_PROVIDERS)
+    plans, searches = _plan_batch(queries, names)
+
+    semaphore = _batch_semaphore()
+
+    async def bounded(name, query):
+        async with semaphore:
+            _, response = await _run_provider_async(name, query,
+                                                    timed=False)
+            return response
+
+    keys = list(searches)
+    responses = await asyncio.gather(
+        *[bounded(*searches[key]) for key in keys])
+
+    return _batch_body(plans, dict(zip(keys, responses)),
+                       _single(provider_names))
+
+
+def _batch_semaphore():
+    """ Get the semaphore bounding batch searches on the running loop """
+    loop = asyncio.get_event_loop()
+    semaphore = _BATCH_SEMAPHORES.get(loop, None)
+    if semaphore is None:
+        semaphore = _BATCH_SEMAPHORES[loop] = \
+            asyncio.Semaphore(limits.BATCH_WORKERS)
+    return semaphore
@@ -0,0 +1,57 @@
+import heapq
+
+from placeomat import geo
+
+
+def rank(results, location=None, limit=None):
+    """
+    Order results by their distance from a location, closest first, and
+    keep the first limit of them. Only the closest limit results are put
+    in order, instead of sorting all of them. Results without a location
+    go after those with one.
+
+    :param list results: results of all providers
+    :param tuple location: latitude and longitude to rank by, or None to
+    keep the order of the results
+    :param int limit: number of results to keep, or None for all
+    :return: ranked results
+    :rtype: list
+    """
+    if location is None:
+        return results if limit is None else results[:limit]
+
+    located, unlocated = [], []
+    for i, result in enumerate(results):
+        (located if result.get('Location', None) else unlocated).append(i)
+
+    k = len(located) if limit is None else min(limit, len(located))
+    distances = geo.distances(location[0], location[1],
+                              [results[i]['Location'] for i in located])
+    order = [located[i] for i in _closest(distances, k)]
+
+    if limit is not None:
+        unlocated = unlocated[:limit - k]
+    return [results[i] for i in order + unlocated]
+
+
+def _closest(distances, k):
+    """
+    Get the indexes of the k smallest distances, smallest first
+
+    :param distances: list or numpy array of distances
+    :param int k: number of indexes to get
+    :rtype: list
+    """
+    if k <= 0:
+        return []
+
+    np = geo.np
+    if np is None:
+        return heapq.nsmallest(k, range(len(distances)),
+                               key=distances.__getitem__)
+
+    if k < len(distances):
+        closest = np.argpartition(distances, k - 1)[:k]
+    else:
+        closest = np.arange(len(distances))
+    return closest[np.argsort(distances[closest], kind='stable')].tolist()
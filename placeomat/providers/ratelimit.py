@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+from placeomat.config import limits
+
+# kinds of upstream requests, which take turns when both are waiting
+SEARCH = 'search'
+DETAILS = 'details'
+
+
+class RateLimited(requests.RequestException):
+    """ Raised when a request waited too long for its turn """
+    pass
+
+
+class Scheduler(object):
+    """
+    Token bucket for the requests of one provider and API key. Requests
+    which find the bucket empty queue up, and the queues of the different
+    kinds of requests (search, details) take turns, so a burst of details
+    lookups does not starve searches or the other way around.
+
+    When the provider says we are over our quota, the rate is cut and
+    requests pause for a while. Every request which goes through after
+    that wins back a bit of the rate, until it is back to the full rate.
+    """
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queues = {}
+        self._kinds = []
+        self._turn = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _next(self):
+        """ Get the ticket whose turn it is, going round the kinds """
+        for i in range(len(self._kinds)):
+            kind = self._kinds[(self._turn + i) % len(self._kinds)]
+            if self._queues[kind]:
+                return kind, self._queues[kind][0]
+
+        return None, None
+
+    def acquire(self, kind=SEARCH, timeout=None):
+        """
+        Wait for the turn of a request, and take a token for it
+
+        :param str kind: kind of the request
+        :param float timeout: seconds to wait at most, or None to wait on
+        :return: whether the request got a token in time
+        :rtype: bool
+        """
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            if kind not in self._queues:
+                self._queues[kind] = deque()
+                self._kinds.append(kind)
+            self._queues[kind].append(ticket)
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                next_kind, next_ticket = self._next()
+                wait = None
+                if next_ticket is ticket:
+                    if self._tokens >= 1 and now >= self._paused_until:
+                        self._tokens -= 1
+                        self._queues[kind].popleft()
+                        self._turn = self._kinds.index(kind) + 1
+                        self._cond.notify_all()
+                        return True
+
+                    wait = max((1 - self._tokens) / self.rate,
+                               self._paused_until - now)
+
+                if deadline is not None:
+                    if now >= deadline:
+                        self._queues[kind].remove(ticket)
+                        self._cond.notify_all()
+                        return False
+                    if wait is None or wait > deadline - now:
+                        wait = deadline - now
+
+                self._cond.wait(wait)
+
+    def reserve(self, timeout=None):
+        """
+        Take a token for a request without waiting for it. The token can be
+        one which only comes in later, the request then has to wait the
+        delay this returns before it is sent. This is for the asyncio
+        engine, which sleeps through the delay instead of holding a thread.
+        Reservations do not queue by kind, they are served in the order
+        they are made.
+
+        :param float timeout: seconds to wait at most, or None to wait on
+        :return: seconds to wait before sending the request, or None if it
+        would have to wait longer than timeout, then no token is taken
+        :rtype: float
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(0.0, (1 - self._tokens) / self.rate,
+                        self._paused_until - now)
+            if timeout is not None and delay > timeout:
+                return None
+
+            # tokens go below zero, so later requests wait their turn
+            self._tokens -= 1
+            return delay
+
+    def backoff(self):
+        """ Slow down after the provider said we are over our quota """
+        with self._cond:
+            self.rate = max(self.rate * limits.BACKOFF_FACTOR,
+                            self.max_rate * 0.01)
+            self._tokens = 0.0
+            self._paused_until = time.monotonic() + limits.BACKOFF_PAUSE
+            logging.warning('Over quota, backing off to %.2f requests/s',
+                            self.rate)
+
+    def recover(self):
+        """ Win back some of the rate after a request went through """
+        if self.rate < self.max_rate:
+            with self._cond:
+                self.rate = min(self.max_rate, self.rate +
+                                self.max_rate * limits.RECOVERY_STEP)
+
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(provider, api_key):
+    """
+    Get the scheduler of a provider and API key, making it if needed
+
+    :param str provider: provider the requests go to
+    :param str api_key: API key the requests are made with
+    :return: the scheduler
+    :rtype: Scheduler
+    """
+    key = (provider, api_key)
+    scheduler = _SCHEDULERS.get(key, None)
+    if scheduler is None:
+        with _SCHEDULERS_LOCK:
+            scheduler = _SCHEDULERS.get(key, None)
+            if scheduler is None:
+                scheduler = _SCHEDULERS[key] = Scheduler(
+                    *limits.get_rate(provider))
+
+    return scheduler
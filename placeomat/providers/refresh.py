@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from placeomat import metrics
+from placeomat.config import cache as cache_config
+from placeomat.providers import cache, ratelimit
+
+# kind of request the refresh budget is taken for
+REFRESH = 'refresh'
+
+
+class Refresher(object):
+    """
+    Refreshes hot search results in the background, see TTLCache.lookup.
+    Each provider has a budget of refreshes, a token bucket, and refreshes
+    over budget are dropped, so the entry simply expires.
+    """
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._budgets = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def _budget(self, provider):
+        with self._lock:
+            if provider not in self._budgets:
+                self._budgets[provider] = ratelimit.Scheduler(
+                    *cache_config.get_refresh_budget(provider))
+            return self._budgets[provider]
+
+    def _allowed(self, provider, key):
+        if self._budget(provider).acquire(REFRESH, timeout=0):
+            return True
+
+        logging.debug('No refresh budget left for %s', key)
+        metrics.REFRESHES.inc(provider, 'over_budget')
+        cache.SEARCH_CACHE.refresh_failed(key)
+        return False
+
+    def submit(self, provider, key, fn, *args):
+        """
+        Refresh a search result on the worker pool, if within budget
+
+        :param str provider: provider of the search
+        :param tuple key: cache key of the search
+        :param fn: function searching upstream and caching the result,
+        which tells if the result was valid
+        :param args: arguments of fn
+        :return: whether the refresh was started
+        :rtype: bool
+        """
+        if not self._allowed(provider, key):
+            return False
+
+        self._executor.submit(self._run, provider, key, fn, *args)
+        return True
+
+    def submit_async(self, provider, key, fn, *args):
+        """
+        Refresh a search result in a task of the running event loop, see
+        submit
+
+        :param fn: coroutine function searching upstream and caching the
+        result, which tells if the result was valid
+        """
+        if not self._allowed(provider, key):
+            return False
+
+        # keep a reference, the loop only keeps a weak one
+        task = asyncio.ensure_future(self._run_async(provider, key, fn, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def _run(self, provider, key, fn, *args):
+        try:
+            self._done(provider, key, fn(*args))
+        except Exception:
+            logging.exception('Refreshing %s failed', key)
+            self._done(provider, key, False)
+
+    async def _run_async(self, provider, key, fn, *args):
+        try:
+            self._done(provider, key, await fn(*args))
+        except Exception:
+            logging.exception('Refreshing %s failed', key)
+            self._done(provider, key, False)
+
+    def _done(self, provider, key, valid):
+        # a valid result replaced the entry already, a failed one lets the
+        # stale entry expire
+        if valid:
+            metrics.REFRESHES.inc(provider, 'done')
+        else:
+            metrics.REFRESHES.inc(provider, 'failed')
+            cache.SEARCH_CACHE.refresh_failed(key)
+
+
+REFRESHER = Refresher(cache_config.REFRESH_WORKERS)
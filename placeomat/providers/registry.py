@@ -0,0 +1,64 @@
+import logging
+import threading
+
+from placeomat.config import keys
+
+# marks a provider which could not be made, e.g. because its API key is
+# missing, so we do not try again on every request
+_MISSING = object()
+
+
+class Registry(object):
+    """
+    Keeps one long lived instance of each provider class. Making a provider
+    reads its API key and parameter map, which only has to happen once, so
+    every request shares the same instance. Providers whose API key is
+    missing are left out, instead of failing each request that uses them.
+    """
+    def __init__(self):
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_class):
+        """
+        Get the instance of a provider class, making it on first use
+
+        :param provider_class: class of the provider
+        :return: the provider, or None if it could not be made
+        """
+        instance = self._instances.get(provider_class, None)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(provider_class, None)
+                if instance is None:
+                    instance = self._instances[provider_class] = \
+                        self._make(provider_class)
+
+        return None if instance is _MISSING else instance
+
+    def _make(self, provider_class):
+        try:
+            return provider_class()
+        except keys.KeyNotFound as e:
+            logging.warning('Leaving out provider %s.%s: %s',
+                            provider_class.__module__,
+                            provider_class.__name__, e)
+            return _MISSING
+
+    def load(self, providers):
+        """
+        Make the providers up front, e.g. when a server starts
+
+        :param dict providers: provider classes by name
+        :return: names of the providers which are available
+        :rtype: list
+        """
+        return [name for name, provider_class in providers.items()
+                if self.get(provider_class) is not None]
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+
+
+REGISTRY = Registry()
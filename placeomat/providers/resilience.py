@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from placeomat.config import limits
+from placeomat.providers import ratelimit
+
+
+class CircuitOpen(requests.RequestException):
+    """ Raised instead of making a request to an unhealthy provider """
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests to a provider fast after too many of them failed in a
+    row. Once the circuit has been open for a while, requests are let
+    through again, and the first one to finish decides if the circuit
+    closes, or opens again.
+    """
+    def __init__(self, failures, reset):
+        self.max_failures = failures
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check if a request may be made
+
+        :rtype: bool
+        """
+        opened_at = self.opened_at
+        return opened_at is None or \
+            time.monotonic() >= opened_at + self.reset
+
+    def success(self):
+        """ Record a request which went through """
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info('Circuit closed again')
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        """ Record a request which failed """
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or \
+                    self.failures >= self.max_failures:
+                logging.warning('Circuit opened after %d failures',
+                                self.failures)
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker(object):
+    """ Keeps the latency of the last requests, to know their p95 """
+    def __init__(self, window, min_samples):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def add(self, latency):
+        self._samples.append(latency)
+
+    def p95(self):
+        """
+        Get the 95th percentile of the latencies seen
+
+        :return: latency in seconds, or None if not enough were seen
+        :rtype: float
+        """
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+_BREAKERS = {}
+_LATENCIES = {}
+_LOCK = threading.Lock()
+
+# runs the attempts of hedged requests, so the caller can stop waiting for
+# a slow attempt and start a second one
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=limits.HEDGE_WORKERS)
+
+# hedges in flight, so a busy process does not double its requests
+_HEDGE_SLOTS = threading.BoundedSemaphore(limits.HEDGE_MAX)
+
+
+def get_breaker(provider):
+    """
+    Get the circuit breaker of a provider
+
+    :param str provider: the provider
+    :rtype: CircuitBreaker
+    """
+    with _LOCK:
+        if provider not in _BREAKERS:
+            _BREAKERS[provider] = CircuitBreaker(limits.BREAKER_FAILURES,
+                                                 limits.BREAKER_RESET)
+        return _BREAKERS[provider]
+
+
+def get_latency(provider, kind):
+    """
+    Get the latency tracker of a kind of request to a provider
+
+    :param str provider: the provider
+    :param str kind: kind of request
+    :rtype: LatencyTracker
+    """
+    with _LOCK:
+        key = (provider, kind)
+        if key not in _LATENCIES:
+            _LATENCIES[key] = LatencyTracker(limits.LATENCY_WINDOW,
+                                             limits.LATENCY_MIN_SAMPLES)
+        return _LATENCIES[key]
+
+
+def server_error(response):
+    """ Default check for responses worth a retry """
+    return response.status_code >= 500
+
+
+def retry_delay(retry):
+    """
+    Seconds to wait before a retry, with full jitter so retries of many
+    requests do not hit the provider at the same time
+
+    :param int retry: number of the retry, starting at 1
+    :rtype: float
+    """
+    return random.uniform(0, min(limits.RETRY_BACKOFF_MAX,
+                                 limits.RETRY_BACKOFF * 2 ** retry))
+
+
+def _hedge_delay(latency):
+    if not limits.HEDGE:
+        return None
+
+    p95 = latency.p95()
+    return None if p95 is None else max(p95, limits.HEDGE_MIN_DELAY)
+
+
+def admit(scheduler, kind, target):
+    """
+    Wait for the turn of a request in the scheduler of its provider
+
+    :param Scheduler scheduler: rate limit of the provider, or None
+    :param str kind: kind of request
+    :param str target: provider or URL the request goes to, for the error
+    :raises RateLimited: if the request waited too long
+    """
+    if scheduler and not scheduler.acquire(kind, limits.RATE_QUEUE_TIMEOUT):
+        raise ratelimit.RateLimited(
+            'Waited too long for a %s request to %s' % (kind, target))
+
+
+async def admit_async(scheduler, kind, target):
+    """ Async version of admit, which sleeps instead of blocking """
+    if scheduler:
+        delay = scheduler.reserve(limits.RATE_QUEUE_TIMEOUT)
+        if delay is None:
+            raise ratelimit.RateLimited(
+                'Waited too long for a %s request to %s' % (kind, target))
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def _timed(attempt, latency):
+    start = time.monotonic()
+    response = attempt()
+    latency.add(time.monotonic() - start)
+    return response
+
+
+def _hedged(attempt, latency, scheduler=None, kind=None):
+    """
+    Make an attempt, and a second one if the first takes longer than the
+    p95 latency. The first attempt to succeed wins. The attempt has its
+    turn in the scheduler already, the second one is only made if there is
+    a token for it right away, so hedging never waits on the rate limit.
+
+    The delay counts from when the first attempt starts, not from when it
+    is queued in the hedge pool, and the second one is only made if one of
+    the HEDGE_MAX hedge slots is free, so a busy process hedges less, not
+    more.
+    """
+    delay = _hedge_delay(latency)
+    if delay is None:
+        return _timed(attempt, latency)
+
+    started = threading.Event()
+
+    def first_attempt():
+        started.set()
+        return _timed(attempt, latency)
+
+    first = _HEDGE_EXECUTOR.submit(first_attempt)
+    started.wait()
+    done, _ = wait([first], timeout=delay)
+    if done or not _HEDGE_SLOTS.acquire(blocking=False):
+        return first.result()
+    if scheduler and not scheduler.acquire(kind, 0):
+        _HEDGE_SLOTS.release()
+        return first.result()
+
+    logging.debug('Hedging request after %.3fs', delay)
+    second = _HEDGE_EXECUTOR.submit(_timed, attempt, latency)
+    second.add_done_callback(lambda _: _HEDGE_SLOTS.release())
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None or not pending:
+                return future.result()
+
+
+def call(provider, kind, attempt, retry_if=server_error, scheduler=None):
+    """
+    Make an idempotent request to a provider through its circuit breaker,
+    hedging slow attempts and retrying failed ones with jitter. Each
+    attempt waits for its turn in the scheduler first, and only the request
+    itself counts towards the latency hedging goes by.
+
+    :param str provider: the provider
+    :param str kind: kind of request
+    :param attempt: function making one attempt of the request
+    :param retry_if: function telling if a response is worth a retry
+    :param Scheduler scheduler: rate limit of the provider and API key
+    :return: the response of the last attempt
+    :rtype: requests.Response
+    """
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        raise CircuitOpen('Circuit open for %s' % provider)
+
+    latency = get_latency(provider, kind)
+    response, error = None, None
+    for retry in range(limits.RETRIES + 1):
+        if retry:
+            time.sleep(retry_delay(retry))
+
+        try:
+            admit(scheduler, kind, provider)
+            response, error = _hedged(attempt, latency, scheduler,
+                                      kind), None
+        except ratelimit.RateLimited:
+            raise
+        except requests.RequestException as e:
+            response, error = None, e
+        else:
+            if not retry_if(response):
+                breaker.success()
+                return response
+
+        logging.info('%s request to %s failed (%s), %d retries left',
+                     kind, provider, error or response.status_code,
+                     limits.RETRIES - retry)
+
+    breaker.failure()
+    if error is not None:
+        raise error
+    return response
+
+
+async def _timed_async(attempt, latency):
+    start = time.monotonic()
+    response = await attempt()
+    latency.add(time.monotonic() - start)
+    return response
+
+
+async def _hedged_async(attempt, latency, scheduler=None, kind=None):
+    """ Async version of _hedged """
+    delay = _hedge_delay(latency)
+    if delay is None:
+        return await _timed_async(attempt, latency)
+
+    first = asyncio.ensure_future(_timed_async(attempt, latency))
+    done, _ = await asyncio.wait([first], timeout=delay)
+    if done or not _HEDGE_SLOTS.acquire(blocking=False):
+        return await first
+    if scheduler and scheduler.reserve(0) is None:
+        _HEDGE_SLOTS.release()
+        return await first
+
+    logging.debug('Hedging request after %.3fs', delay)
+    second = asyncio.ensure_future(_timed_async(attempt, latency))
+    second.add_done_callback(lambda _: _HEDGE_SLOTS.release())
+    pending = {first, second}
+    while pending:
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None or not pending:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+
+
+async def call_async(provider, kind, attempt, retry_if, errors,
+                     scheduler=None):
+    """
+    Async version of call
+
+    :param str provider: the provider
+    :param str kind: kind of request
+    :param attempt: coroutine function making one attempt of the request
+    :param retry_if: function telling if a response is worth a retry
+    :param tuple errors: exceptions of a failed attempt
+    :param Scheduler scheduler: rate limit of the provider and API key
+    :return: the response of the last attempt
+    """
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        raise CircuitOpen('Circuit open for %s' % provider)
+
+    latency = get_latency(provider, kind)
+    response, error = None, None
+    for retry in range(limits.RETRIES + 1):
+        if retry:
+            await asyncio.sleep(retry_delay(retry))
+
+        try:
+            await admit_async(scheduler, kind, provider)
+            response, error = await _hedged_async(attempt, latency,
+                                                  scheduler, kind), None
+        except ratelimit.RateLimited:
+            raise
+        except errors as e:
+            response, error = None, e
+        else:
+            if not retry_if(response):
+                breaker.success()
+                return response
+
+        logging.info('%s request to %s failed (%r), %d retries left',
+                     kind, provider, error or response.status_code,
+                     limits.RETRIES - retry)
+
+    breaker.failure()
+    if error is not None:
+        raise error
+    return response
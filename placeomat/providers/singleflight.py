@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+
+class Group(object):
+    """
+    Coalesces identical calls which are in flight at the same time. The
+    first caller for a key makes the call, and everyone else asking for the
+    same key while it runs waits for, and shares, its result (or exception).
+    Once the call is done the key is forgotten, so this is not a cache.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call fn, unless a call for the same key is already in flight, in
+        which case wait for that one instead.
+
+        :param key: hashable key identifying the call
+        :param fn: function to call
+        :return: result of the call
+        """
+        with self._lock:
+            call = self._calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            logging.debug('Joining in-flight call for %s', key)
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        """
+        Get the number of calls currently in flight
+
+        :return: number of calls
+        :rtype: int
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncGroup(object):
+    """
+    Like Group, for coroutines running on one event loop. The shared call
+    runs as its own task, so a caller which gets cancelled (e.g. because
+    it ran out of time) does not cancel the call for everyone else.
+    """
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Await fn, unless a call for the same key is already in flight, in
+        which case await that one instead.
+
+        :param key: hashable key identifying the call
+        :param fn: coroutine function to call
+        :return: result of the call
+        """
+        task = self._calls.get(key, None)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(
+                fn(*args, **kwargs))
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            logging.debug('Joining in-flight call for %s', key)
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key, None) is task:
+            del self._calls[key]
+
+    def in_flight(self):
+        """
+        Get the number of calls currently in flight
+
+        :return: number of calls
+        :rtype: int
+        """
+        return len(self._calls)
+
+
+# upstream calls of all providers, keys start with the endpoint
+# ('search' or 'details') followed by the provider and its parameters
+INFLIGHT = Group()
+ASYNC_INFLIGHT = AsyncGroup()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from placeomat.providers import aio, cache, providers, resilience, yelp
+from placeomat.providers.provider import Status
+
+BUSINESSES = {'businesses': [{
+    'id': 'cafe',
+    'name': 'Cafe',
+    'categories': [{'title': 'Coffee'}],
+    'coordinates': {'latitude': 52.5, 'longitude': 13.4},
+    'location': {'display_address': ['Street 1', 'Berlin']},
+    'url': 'https://yelp.com/cafe',
+}]}
+
+
+class TestAsyncProvider(unittest.TestCase):
+    @patch('placeomat.providers.provider.keys')
+    def setUp(self, mock_keys):
+        cache.SEARCH_CACHE.clear()
+        # keep searches out of the place index file, if one is configured
+        self.index_path = patch('placeomat.config.storage.INDEX_PATH', '')
+        self.index_path.start()
+        self.provider = yelp.AsyncProvider()
+
+    def tearDown(self):
+        self.index_path.stop()
+        cache.SEARCH_CACHE.clear()
+
+    def test_search(self):
+        """ Test an async search is parsed like a sync one, and cached """
+        response = aio.Response(200, json.dumps(BUSINESSES).encode())
+        query = {'query': 'cafes', 'location': '52.5,13.4'}
+        with patch('placeomat.providers.aio.get',
+                   new=AsyncMock(return_value=response)) as get:
+            first = asyncio.run(self.provider.search(query))
+            second = asyncio.run(self.provider.search(query))
+
+        get.assert_called_once()
+        self.assertIs(first, second)
+        self.assertEqual(Status.VALID, first['status'])
+        self.assertEqual('Street 1 Berlin', first['results'][0]['Address'])
+
+    def test_pages(self):
+        """ Test pages are fetched at once, and repeated places dropped """
+        def page(url, params=None, **kwargs):
+            # the second page repeats the place of the first
+            business = dict(BUSINESSES['businesses'][0],
+                            id='cafe%d' % min(params['offset'], 50))
+            return aio.Response(200, json.dumps(
+                {'businesses': [business]}).encode())
+
+        query = {'query': 'cafes', 'location': '52.5,13.4', 'pages': '3'}
+        with patch('placeomat.providers.aio.get',
+                   new=AsyncMock(side_effect=page)) as get:
+            res = asyncio.run(self.provider.search(query))
+
+        self.assertEqual([0, 50, 100], [c.kwargs['params']['offset']
+                                        for c in get.call_args_list])
+        self.assertEqual(['cafe0', 'cafe50'],
+                         [r['ID'] for r in res['results']])
+
+    def test_search_tiles(self):
+        """ Test a large circle is searched as tiles, and places kept once """
+        def tile(url, params=None, **kwargs):
+            business = dict(BUSINESSES['businesses'][0], id='tile%s,%s' % (
+                params['latitude'], params['longitude']))
+            return aio.Response(200, json.dumps(
+                {'businesses': [business, BUSINESSES['businesses'][0]]}
+            ).encode())
+
+        query = {'query': 'cafes', 'location': '52.5,13.4',
+                 'radius': '100000', 'tile': '1'}
+        with patch('placeomat.providers.aio.get',
+                   new=AsyncMock(side_effect=tile)) as get:
+            res = asyncio.run(self.provider.search(query))
+
+        self.assertLess(1, get.call_count)
+        self.assertEqual({40000}, {int(c.kwargs['params']['radius'])
+                                   for c in get.call_args_list})
+        self.assertEqual(get.call_count + 1, len(res['results']))
+        self.assertEqual(['cafe'], [r['ID'] for r in res['results']
+                                    if not r['ID'].startswith('tile')])
+
+    def _query_tiles(self, error):
+        query = {'query': 'cafes', 'location': '52.5,13.4',
+                 'radius': '60000', 'tile': '1'}
+        with patch('placeomat.providers.aio.get',
+                   new=AsyncMock(side_effect=error)), \
+                patch.object(providers.registry.REGISTRY, 'get',
+                             return_value=self.provider):
+            return asyncio.run(providers.query_async('yelp', query))
+
+    def test_all_tiles_failed(self):
+        """ Test a sweep whose tiles all failed is a 502, without the key """
+        body, code, _ = self._query_tiles(aio.aiohttp.ClientConnectionError(
+            'Failed: https://api.yelp.com/v3/search?key=SECRET'))
+
+        self.assertEqual(502, code)
+        self.assertEqual(providers.REQUEST_FAILED, body['reason'])
+        self.assertNotIn('SECRET', str(body))
+
+    def test_all_tiles_held_back(self):
+        """ Test a sweep held back by an open circuit is a 503 """
+        body, code, _ = self._query_tiles(
+            resilience.CircuitOpen('Circuit open for yelp'))
+
+        self.assertEqual(503, code)
+        self.assertEqual(providers.UNAVAILABLE, body['reason'])
+
+
+def _fake_provider(delay, results):
+    class FakeProvider(object):
+        name = 'fake'
+
+        async def search(self, query_args):
+            await asyncio.sleep(delay)
+            return {'status': Status.VALID, 'results': results,
+                    'reason': None}
+
+    return FakeProvider
+
+
+class TestQueryAllAsync(unittest.TestCase):
+    def test_deadline(self):
+        """ Test a provider missing its deadline gives a partial result """
+        fakes = {'fast': _fake_provider(0, [{'ID': 1}]),
+                 'slow': _fake_provider(1, [{'ID': 2}])}
+        with patch.dict(providers.ASYNC_PROVIDERS, fakes, clear=True), \
+                patch.dict(providers.limits.DEADLINES,
+                           {'fast': 1, 'slow': 0.1}):
+            body, code = asyncio.run(providers.query_all_async({}))
+
+        self.assertEqual(200, code)
+        self.assertEqual([{'ID': 1}], body['results'])
+        self.assertEqual('TIMEOUT', body['providers']['slow']['status'])
+
+    def test_batch_waits(self):
+        """ Test a batch is not cut off at the deadline, like a sync one """
+        fakes = {'slow': _fake_provider(0.2, [{'ID': 2}])}
+        with patch.dict(providers.ASYNC_PROVIDERS, fakes, clear=True), \
+                patch.dict(providers.limits.DEADLINES, {'slow': 0.05}):
+            body, code = asyncio.run(providers.batch_async([{}], ['slow']))
+
+        self.assertEqual(200, code)
+        self.assertEqual({'status': 200, 'body': [{'ID': 2}]},
+                         body['results'][0])
@@ -0,0 +1,141 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from placeomat.providers import cache, provider, refresh
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.TTLCache(max_entries=2)
+
+    def test_hit_miss(self):
+        """ Test hits and misses are counted """
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1, ttl=60)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'entries': 1},
+                         self.cache.stats())
+
+    def test_expired(self):
+        """ Test an expired entry is a miss """
+        self.cache.set('a', 1, ttl=0)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_lru(self):
+        """ Test the least recently used entry is dropped when full """
+        self.cache.set('a', 1, ttl=60)
+        self.cache.set('b', 2, ttl=60)
+        self.cache.get('a')
+        self.cache.set('c', 3, ttl=60)
+
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_refresh_hot(self):
+        """ Test only hot entries close to expiry are refreshed, once """
+        self.cache.set('a', 1, ttl=0.1)
+        self.assertFalse(self.cache.lookup('a', 2, ahead=0.5)[3])
+        self.assertFalse(self.cache.lookup('a', 2, ahead=0)[3])
+        self.assertTrue(self.cache.lookup('a', 2, ahead=1)[3])
+        self.assertFalse(self.cache.lookup('a', 2, ahead=1)[3])
+
+    def test_stale(self):
+        """ Test an entry is served stale only while it is refreshed """
+        self.cache.set('a', 1, ttl=0.05)
+        self.cache.lookup('a', 1, ahead=1, stale=60)
+        time.sleep(0.06)
+
+        value, age, stale, refresh = self.cache.lookup('a', 1, 1, stale=60)
+        self.assertEqual((1, True, False), (value, stale, refresh))
+        self.assertGreater(age, 0.05)
+
+        self.cache.refresh_failed('a')
+        self.assertIsNone(self.cache.lookup('a', 1, 1, stale=60)[0])
+
+    def test_key_canonical(self):
+        """ Test keys ignore parameter order and the API key """
+        one = cache.make_key('google', {'query': 'cafes', 'radius': '5',
+                                        'key': 'secret'})
+        two = cache.make_key('google', {'radius': '5', 'query': 'cafes'})
+
+        self.assertEqual(one, two)
+        self.assertNotIn('secret', str(one))
+
+        # a value which happens to be the key is still part of the search
+        three = cache.make_key('google', {'query': 'secret', 'key': 'secret'})
+        self.assertEqual(('google', (('query', 'secret'),)), three)
+
+
+class TestProviderSearch(unittest.TestCase):
+    @patch('placeomat.providers.provider.urls')
+    @patch('placeomat.providers.provider.keys')
+    @patch('placeomat.providers.provider.query')
+    def setUp(self, mock_urls, mock_keys, mock_query):
+        cache.SEARCH_CACHE.clear()
+        self.provider = provider.Provider(key_var='mocked')
+        self.provider.name = 'TestProvider'
+        self.provider.map = {'query': 'term'}
+        self.provider.extra_query_params = lambda: {}
+        self.provider.validate_params = lambda params: params
+        self.provider._send = MagicMock()
+        self.provider.response = MagicMock(return_value={
+            'status': provider.Status.VALID, 'results': [], 'reason': None})
+
+    def tearDown(self):
+        cache.SEARCH_CACHE.clear()
+
+    def test_cached(self):
+        """ Test a repeated search is served from the cache """
+        self.provider.search({'query': 'cafes'})
+        self.provider.search({'query': 'cafes'})
+
+        self.assertEqual(1, self.provider._send.call_count)
+
+    def test_bypass(self):
+        """ Test the bypass parameter skips the cache """
+        self.provider.search({'query': 'cafes'})
+        self.provider.search({'query': 'cafes', 'no_cache': '1'})
+
+        self.assertEqual(2, self.provider._send.call_count)
+        self.provider._send.assert_called_with({'term': 'cafes'})
+
+    def test_index_max_results(self):
+        """ Test a place index hit keeps at most max_results places """
+        places = [{'ID': str(i)} for i in range(5)]
+        with patch('placeomat.providers.provider.place_index.lookup',
+                   return_value=places):
+            res = self.provider.search({'query': 'cafes',
+                                        'max_results': '2'})
+
+        self.provider._send.assert_not_called()
+        self.assertEqual(['0', '1'], [p['ID'] for p in res['results']])
+
+    @patch('placeomat.providers.provider.cache_config.HOT_HITS', 1)
+    @patch('placeomat.providers.provider.cache_config.REFRESH_AHEAD', 1)
+    def test_refresh(self):
+        """ Test a hot search is refreshed in the background """
+        self.provider.search({'query': 'cafes'})
+        with patch.object(refresh.REFRESHER, '_executor') as executor:
+            self.provider.search({'query': 'cafes'})
+            self.provider.search({'query': 'cafes'})
+
+        executor.submit.assert_called_once()
+        fn, args = executor.submit.call_args[0][3], \
+            executor.submit.call_args[0][4:]
+        self.assertTrue(fn(*args))
+        self.assertEqual(2, self.provider._send.call_count)
+
+    @patch('placeomat.providers.provider.cache_config.HOT_HITS', 1)
+    @patch('placeomat.providers.provider.cache_config.REFRESH_AHEAD', 1)
+    def test_refresh_budget(self):
+        """ Test refreshes over budget are dropped """
+        self.provider.search({'query': 'cafes'})
+        budget = MagicMock()
+        budget.acquire.return_value = False
+        with patch.object(refresh.REFRESHER, '_budget',
+                          return_value=budget), \
+                patch.object(refresh.REFRESHER, '_executor') as executor:
+            self.provider.search({'query': 'cafes'})
+
+        executor.submit.assert_not_called()
@@ -0,0 +1,164 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from placeomat.providers import gmaps
+from placeomat.providers.provider import Status
+
+
+class TestMoreDetails(unittest.TestCase):
+    @patch('placeomat.providers.provider.keys')
+    def setUp(self, mock_keys):
+        self.provider = gmaps.Provider()
+
+    def _place_details(self, place_id):
+        if place_id == 'slow':
+            time.sleep(0.5)
+        elif place_id == 'broken':
+            raise KeyError('url')
+        elif place_id == 'invalid':
+            return {'status': Status.INVALID, 'results': [], 'reason': 'no'}
+
+        return {'status': Status.VALID,
+                'results': {'url': place_id, 'website': 'None'},
+                'reason': None}
+
+    @patch('placeomat.providers.gmaps.details_store.get_store',
+           return_value=None)
+    @patch('placeomat.providers.gmaps.limits.DETAILS_DEADLINE', 0.1)
+    def test_placeholders(self, mock_store):
+        """ Test failed or slow lookups get a placeholder """
+        ids = ['good', 'slow', 'broken', 'invalid']
+        with patch.object(self.provider, '_fetch_details',
+                          side_effect=self._place_details):
+            start = time.monotonic()
+            details = self.provider.more_details(ids)
+
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual({'url': 'good', 'website': 'None'}, details['good'])
+        for place_id in ids[1:]:
+            self.assertEqual(gmaps.NO_DETAILS, details[place_id])
+
+    def test_store(self):
+        """ Test stored details are used and fetched details are stored """
+        store = MagicMock()
+        store.get_many.return_value = {'stored': {'url': 'stored'}}
+        with patch('placeomat.providers.gmaps.details_store.get_store',
+                   return_value=store), \
+                patch.object(self.provider, '_fetch_details',
+                             side_effect=self._place_details) as fetch:
+            details = self.provider.more_details(['stored', 'good'])
+
+        fetch.assert_called_once_with('good')
+        store.put_many.assert_called_once_with(
+            'google', {'good': {'url': 'good', 'website': 'None'}})
+        self.assertEqual({'url': 'stored'}, details['stored'])
+
+    def test_request_error_hidden(self):
+        """ Test the error of a failed lookup, and its key, are not shown """
+        error = requests.ConnectionError('Failed: /details?key=SECRET')
+        with patch('placeomat.providers.gmaps.transport.get',
+                   side_effect=error):
+            res = self.provider._request_details('place')
+
+        self.assertEqual(Status.INVALID, res['status'])
+        self.assertEqual(gmaps.REQUEST_FAILED, res['reason'])
+
+    def test_semaphore_per_loop(self):
+        """ Test each event loop gets its own details semaphore """
+        async def get():
+            return gmaps._details_semaphore()
+
+        first, second = asyncio.run(get()), asyncio.run(get())
+        self.assertIsNot(first, second)
+
+
+class TestFields(unittest.TestCase):
+    @patch('placeomat.providers.provider.keys')
+    def setUp(self, mock_keys):
+        self.provider = gmaps.Provider()
+        self.items = [{'place_id': 'g1', 'name': 'Cafe', 'types': ['cafe'],
+                       'geometry': {'location': {'lat': 52.5, 'lng': 13.4}},
+                       'formatted_address': 'Berlin'}]
+
+    def test_lean(self):
+        """ Test details are only fetched if a field needs them """
+        with patch.object(self.provider, '_check_response',
+                          return_value=(None, self.items, None)), \
+                patch.object(self.provider, 'more_details',
+                             return_value={'g1': {'url': 'u'}}) as details:
+            lean = self.provider.response(enrich=False)
+            full = self.provider.response()
+
+        details.assert_called_once_with(['g1'])
+        self.assertIsNone(lean['results'][0]['More Details'])
+        self.assertEqual({'url': 'u'}, full['results'][0]['More Details'])
+
+        self.assertFalse(self.provider._enrich(frozenset(['ID', 'Name'])))
+        self.assertTrue(self.provider._enrich(frozenset(['More Details'])))
+        self.assertTrue(self.provider._enrich(None))
+
+
+class TestPages(unittest.TestCase):
+    @patch('placeomat.providers.provider.keys')
+    def setUp(self, mock_keys):
+        self.provider = gmaps.Provider()
+        self.sent = []
+
+    def _item(self, place_id):
+        return {'place_id': place_id, 'name': place_id, 'types': [],
+                'geometry': {'location': {'lat': 52.5, 'lng': 13.4}},
+                'formatted_address': 'Berlin'}
+
+    def _pages(self):
+        # the token of page 2 is not valid the first time it is used
+        yield None, [self._item('a'), self._item('b')], 'two'
+        yield {'status': Status.INVALID}, [], None
+        yield None, [self._item('b'), self._item('c')], 'three'
+        yield None, [self._item('d')], None
+
+    @patch('placeomat.providers.gmaps.limits.NEXT_PAGE_DELAY', 0)
+    @patch('placeomat.providers.gmaps.limits.NEXT_PAGE_RETRY_DELAY', 0)
+    def test_pages(self):
+        """ Test tokens are followed, and details looked up as pages come """
+        pages = self._pages()
+        lookups = []
+        with patch.object(self.provider, '_send',
+                          side_effect=self.sent.append), \
+                patch.object(self.provider, '_check_response',
+                             side_effect=lambda: next(pages)), \
+                patch.object(self.provider, 'more_details',
+                             side_effect=lambda ids: lookups.append(
+                                 (len(self.sent), ids)) or {}):
+            res = self.provider._fetch({'query': 'cafes'}, pages=3,
+                                       max_results=3)
+
+        self.assertEqual(['a', 'b', 'c'], [r['ID'] for r in res['results']])
+        self.assertEqual([{'query': 'cafes'},
+                          {'pagetoken': 'two', 'key': self.provider.api_key},
+                          {'pagetoken': 'two', 'key': self.provider.api_key},
+                          {'pagetoken': 'three',
+                           'key': self.provider.api_key}], self.sent)
+        # page 1 is looked up before page 2 is fetched
+        self.assertEqual([(1, ['a', 'b']), (3, ['c']), (4, [])], lookups)
+
+    @patch('placeomat.providers.gmaps.limits.NEXT_PAGE_DELAY', 0)
+    @patch('placeomat.providers.gmaps.limits.NEXT_PAGE_RETRY_DELAY', 0)
+    def test_pages_max_results(self):
+        """ Test places beyond max_results are not looked up """
+        pages = self._pages()
+        looked_up = []
+        with patch.object(self.provider, '_send'), \
+                patch.object(self.provider, '_check_response',
+                             side_effect=lambda: next(pages)), \
+                patch.object(self.provider, 'more_details',
+                             side_effect=lambda ids: looked_up.extend(
+                                 ids) or {}):
+            res = self.provider._fetch({'query': 'cafes'}, pages=3,
+                                       max_results=1)
+
+        self.assertEqual(['a'], [r['ID'] for r in res['results']])
+        self.assertEqual(['a'], looked_up)
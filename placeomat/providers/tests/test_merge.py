@@ -0,0 +1,40 @@
+import unittest
+
+from placeomat.providers import merge
+
+
+def _place(provider, place_id, name, location):
+    return {'ID': place_id, 'Provider': provider, 'Name': name,
+            'Location': location}
+
+
+class TestMerge(unittest.TestCase):
+    def test_normalize(self):
+        """ Test names are compared without case, accents or punctuation """
+        self.assertEqual('cafe einstein',
+                         merge.normalize_name('Café  Einstein!'))
+
+    def test_merged(self):
+        """ Test the same place of two providers is merged """
+        results = [_place('Google Maps', 'g1', 'Starbucks',
+                          (52.52000, 13.40000)),
+                   _place('Yelp', 'y1', 'Starbucks Coffee',
+                          (52.52020, 13.40010))]
+
+        merged = merge.merge(results)
+
+        self.assertEqual(1, len(merged))
+        self.assertEqual({'Google Maps': 'g1', 'Yelp': 'y1'},
+                         merged[0]['IDs'])
+
+    def test_not_merged(self):
+        """ Test far away, differently named, or same provider places """
+        results = [_place('Google Maps', 'g1', 'Starbucks', (52.52, 13.40)),
+                   _place('Yelp', 'y1', 'Starbucks', (52.53, 13.40)),
+                   _place('Yelp', 'y2', 'Einstein', (52.52, 13.40)),
+                   _place('Google Maps', 'g2', 'Starbucks', (52.52, 13.40))]
+
+        merged = merge.merge(results)
+
+        self.assertEqual(['g1', 'y1', 'y2', 'g2'],
+                         [m['ID'] for m in merged])
@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from placeomat.providers import merge
+from placeomat.providers.place import Place, dumps, project
+
+
+def _place(**kwargs):
+    args = dict(id='g1', provider='Google Maps', name='Café "Einstein"',
+                description='cafe, food', location=(52.5, 13.4),
+                address='Unter den Linden 42\nBerlin',
+                more_details={'url': 'https://example.com', 'website': None})
+    args.update(kwargs)
+    return Place(**args)
+
+
+class TestPlace(unittest.TestCase):
+    def test_dict_access(self):
+        """ Test places can be used like the dicts they replace """
+        place = _place()
+        self.assertEqual('g1', place['ID'])
+        self.assertEqual((52.5, 13.4), place.get('Location'))
+        self.assertNotIn('IDs', place)
+        self.assertIsNone(place.get('IDs'))
+        with self.assertRaises(KeyError):
+            place['IDs']
+
+        place['IDs'] = {'Google Maps': 'g1'}
+        self.assertIn('IDs', place)
+        self.assertEqual(place, Place.from_dict(json.loads(dumps(place))))
+
+    def test_json(self):
+        """ Test places are written the same as jsonify writes a dict """
+        for place in [_place(), _place(location=(52, 13.4), ids={'Y': 'y'}),
+                      _place(description=None, more_details='Could not')]:
+            expected = json.dumps(place.to_dict(), sort_keys=True,
+                                  separators=(',', ':'))
+            self.assertEqual(expected, place.to_json())
+
+        body = {'results': [_place()], 'providers': {'google': {
+            'status': 'VALID', 'reason': None, 'count': 1}}}
+        self.assertEqual(
+            json.dumps({'results': [_place().to_dict()],
+                        'providers': body['providers']},
+                       sort_keys=True, separators=(',', ':')).encode(),
+            dumps(body))
+
+    def test_merge(self):
+        """ Test merging keeps places """
+        merged = merge.merge([_place(),
+                              _place(id='y1', provider='Yelp',
+                                     location=(52.5001, 13.4001))])
+
+        self.assertIsInstance(merged[0], Place)
+        self.assertEqual({'Google Maps': 'g1', 'Yelp': 'y1'},
+                         merged[0]['IDs'])
+
+    def test_project(self):
+        """ Test projected places only have the fields asked for """
+        place, fake = project(
+            [_place(ids={'Y': 'y'}), {'ID': 'f', 'Name': 'F'}],
+            {'ID', 'IDs', 'Location'})
+
+        self.assertEqual(['ID', 'IDs', 'Location'], place.keys())
+        self.assertNotIn('Name', place)
+        self.assertEqual('{"ID":"g1","IDs":{"Y":"y"},"Location":[52.5,13.4]}',
+                         place.to_json())
+        self.assertEqual({'ID': 'f'}, fake)
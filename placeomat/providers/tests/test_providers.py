@@ -1,7 +1,12 @@
 import unittest
 from unittest.mock import patch
 
-from placeomat.providers import provider
+import requests
+
+from placeomat.providers import cache, provider, providers, resilience, yelp
+
+# a failed request names its URL, API key and all
+SECRET_URL = 'https://api.yelp.com/v3/businesses/search?key=SECRET'
 
 
 class TestProviderMap(unittest.TestCase):
@@ -62,3 +67,155 @@ class TestProviderMap(unittest.TestCase):
         exp = self.multiple_mapped
 
         self.assertEqual(exp, res)
+
+    def test_compiled_map(self):
+        """ Test mapped keys are split once, and stripped """
+        self.assertEqual({'one-to-one': ('singlekey',),
+                          'one-to-many': ('key1', 'key2'),
+                          'one-to-many2': ('key1', 'key2')},
+                         self.provider._plan)
+
+
+class TestFields(unittest.TestCase):
+    def test_parse_fields(self):
+        """ Test field names are matched regardless of case """
+        self.assertIsNone(provider.parse_fields(None))
+        self.assertIsNone(provider.parse_fields(''))
+        self.assertEqual(frozenset(['ID', 'More Details']),
+                         provider.parse_fields('id, more details'))
+        with self.assertRaises(provider.ValidationException):
+            provider.parse_fields('ID,Rating')
+
+    def test_parse_ranking(self):
+        """ Test sort needs a location, and limit a positive number """
+        self.assertEqual((None, None), provider.parse_ranking({}))
+        self.assertEqual(((52.5, 13.4), 5), provider.parse_ranking(
+            {'sort': 'distance', 'location': '52.5,13.4', 'limit': '5'}))
+        for query_args in ({'sort': 'distance'}, {'sort': 'rating'},
+                           {'limit': '0'}, {'limit': 'ten'}):
+            with self.assertRaises(provider.ValidationException):
+                provider.parse_ranking(query_args)
+
+    def test_parse_pages(self):
+        """ Test max_results is turned into pages """
+        self.assertEqual((1, None), provider.parse_pages({}, 20, 3))
+        self.assertEqual((2, 25), provider.parse_pages(
+            {'max_results': '25'}, 20, 3))
+        self.assertEqual((3, None),
+                         provider.parse_pages({'pages': '3'}, 20, 3))
+        for query_args in ({'pages': '4'}, {'max_results': '61'},
+                           {'pages': '0'}, {'max_results': 'many'}):
+            with self.assertRaises(provider.ValidationException):
+                provider.parse_pages(query_args, 20, 3)
+
+    def test_parse_tiles(self):
+        """ Test tiles are only made when asked for, and not too many """
+        self.assertIsNone(provider.parse_tiles({'radius': '90000'}, 40000))
+        centers, radius, inside = provider.parse_tiles(
+            {'tile': '1', 'location': '52.5,13.4', 'radius': '90000'}, 40000)
+        self.assertEqual(40000, radius)
+        self.assertEqual([True, False], inside([(52.5, 14.5), (52.5, 15)]))
+
+        _, radius, _ = provider.parse_tiles(
+            {'tile': '1', 'location': '52.5,13.4', 'radius': '900'}, 40000)
+        self.assertEqual(900, radius)
+
+        for query_args in ({'tile': '1', 'location': '52.5,13.4'},
+                           {'bounds': '53,13,52,14'},
+                           {'bounds': '40,0,60,30'}):
+            with self.assertRaises(provider.ValidationException):
+                provider.parse_tiles(query_args, 40000)
+        with self.assertRaises(provider.ValidationException):
+            provider.parse_tiles({'bounds': '52,13,53,14'}, None)
+
+
+class TestTiles(unittest.TestCase):
+    @patch('placeomat.providers.provider.keys')
+    def setUp(self, mock_keys):
+        cache.SEARCH_CACHE.clear()
+        self.provider = yelp.Provider()
+
+    def tearDown(self):
+        cache.SEARCH_CACHE.clear()
+
+    def _search(self, query_args):
+        # every tile finds a place of its own, one place all tiles find,
+        # and one far outside the area
+        if query_args['location'].startswith('51.9'):
+            raise requests.ConnectionError('Failed: %s' % SECRET_URL)
+        lat, lng = [float(v) for v in query_args['location'].split(',')]
+        return self.provider._make_response(provider.Status.VALID, results=[
+            {'ID': query_args['location'], 'Location': (lat, lng)},
+            {'ID': 'everywhere', 'Location': (52, 13.5)},
+            {'ID': 'far', 'Location': (0, 0)}])
+
+    def test_search_tiles(self):
+        """ Test tiles are searched, and their places kept once """
+        query_args = {'query': 'cafes', 'bounds': '51.9,13,52.5,17',
+                      'max_results': '4', 'limit': '2'}
+        with patch.object(self.provider, 'search',
+                          side_effect=self._search) as search:
+            res = self.provider._search_tiles(
+                query_args, *provider.parse_tiles(query_args, 40000))
+
+        tiles = [c.args[0] for c in search.call_args_list]
+        self.assertEqual(['40000'] * len(tiles),
+                         [t['radius'] for t in tiles])
+        self.assertFalse(any('limit' in t or 'bounds' in t for t in tiles))
+        self.assertEqual(provider.Status.VALID, res['status'])
+        self.assertIn('tiles failed', res['reason'])
+        self.assertIn(provider.REQUEST_FAILED, res['reason'])
+        self.assertNotIn('SECRET', res['reason'])
+        ids = [r['ID'] for r in res['results']]
+        self.assertEqual(4, len(ids))
+        self.assertEqual(1, ids.count('everywhere'))
+        self.assertNotIn('far', ids)
+        for r in res['results']:
+            self.assertTrue(51.9 <= r['Location'][0] <= 52.5 and
+                            13 <= r['Location'][1] <= 17)
+
+    def _query(self, error):
+        query_args = {'query': 'cafes', 'location': '52.5,13.4',
+                      'radius': '60000', 'tile': '1'}
+        with patch('placeomat.providers.provider.transport.get',
+                   side_effect=error), \
+                patch.object(providers.registry.REGISTRY, 'get',
+                             return_value=self.provider), \
+                patch('placeomat.config.storage.INDEX_PATH', ''), \
+                patch('placeomat.config.storage.SHARED_CACHE_PATH', ''):
+            return providers.query('yelp', query_args)
+
+    def test_all_tiles_failed(self):
+        """ Test a sweep whose tiles all failed is a 502, without the key """
+        body, code, _ = self._query(
+            requests.ConnectionError('Failed: %s' % SECRET_URL))
+
+        self.assertEqual(502, code)
+        self.assertEqual(providers.REQUEST_FAILED, body['reason'])
+        self.assertNotIn('SECRET', str(body))
+        self.assertNotIn('api.yelp.com', str(body))
+
+    def test_all_tiles_held_back(self):
+        """ Test a sweep held back by an open circuit is a 503 """
+        body, code, _ = self._query(
+            resilience.CircuitOpen('Circuit open for yelp'))
+
+        self.assertEqual(503, code)
+        self.assertEqual(providers.UNAVAILABLE, body['reason'])
+
+    def test_tile_fields(self):
+        """ Test tiles only fill enriched fields if they are asked for """
+        centers = [(52.5, 13.4)]
+        enriched = ('More Details',)
+        lean, = provider.tile_queries({'query': 'cafes'}, centers, 40000,
+                                      enriched)
+        self.assertNotIn('More Details', lean['fields'].split(','))
+        self.assertIn('Name', lean['fields'].split(','))
+
+        asked, = provider.tile_queries(
+            {'query': 'cafes', 'fields': 'ID,More Details'}, centers, 40000,
+            enriched)
+        self.assertEqual('ID,More Details', asked['fields'])
+
+        plain, = provider.tile_queries({'query': 'cafes'}, centers, 40000)
+        self.assertNotIn('fields', plain)
@@ -0,0 +1,212 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from placeomat.providers import providers, resilience
+from placeomat.providers.provider import Status, ValidationException
+
+
+def _fake_provider(name, delay=0, results=None, error=None, age=None):
+    """ Build a provider class which answers after delay seconds """
+    class FakeProvider(object):
+        def __init__(self):
+            self.name = name
+
+        def search(self, query_args):
+            time.sleep(delay)
+            if error:
+                raise error
+
+            response = {'status': Status.VALID,
+                        'results': results or [],
+                        'reason': None}
+            if age is not None:
+                response['age'] = age
+            return response
+
+    return FakeProvider
+
+
+class TestQueryAll(unittest.TestCase):
+    def _query_all(self, fakes, deadlines):
+        with patch.dict(providers.PROVIDERS, fakes, clear=True), \
+                patch.dict(providers.limits.DEADLINES, deadlines):
+            return providers.query_all({'query': 'cafes'})
+
+    def test_merges_results(self):
+        """ Test results of all providers are merged """
+        body, code = self._query_all(
+            {'one': _fake_provider('one', results=[{'ID': 1}]),
+             'two': _fake_provider('two', delay=0.05, results=[{'ID': 2}])},
+            {'one': 1, 'two': 1})
+
+        self.assertEqual(200, code)
+        self.assertEqual([{'ID': 1}, {'ID': 2}], body['results'])
+        self.assertEqual('VALID', body['providers']['two']['status'])
+
+    def test_fields(self):
+        """ Test results only have the fields asked for """
+        fakes = {'one': _fake_provider('one', results=[{'ID': 1, 'Name': 'a'}])}
+        with patch.dict(providers.PROVIDERS, fakes, clear=True):
+            body, code = providers.query_all({'query': 'cafes',
+                                              'fields': 'name'})
+
+        self.assertEqual([{'Name': 'a'}], body['results'])
+
+    def test_sort(self):
+        """ Test the closest results of all providers are kept """
+        fakes = {'one': _fake_provider('one', results=[
+                     {'ID': 1, 'Location': (52.6, 13.4)}]),
+                 'two': _fake_provider('two', results=[
+                     {'ID': 2, 'Location': (52.5, 13.4)}])}
+        with patch.dict(providers.PROVIDERS, fakes, clear=True):
+            body, code = providers.query_all(
+                {'query': 'cafes', 'location': '52.5,13.4',
+                 'sort': 'distance', 'limit': '1'})
+
+        self.assertEqual([2], [r['ID'] for r in body['results']])
+
+    def test_slow_provider_partial(self):
+        """ Test a provider missing its deadline gives a partial result """
+        start = time.monotonic()
+        body, code = self._query_all(
+            {'fast': _fake_provider('fast', results=[{'ID': 1}]),
+             'slow': _fake_provider('slow', delay=1, results=[{'ID': 2}])},
+            {'fast': 1, 'slow': 0.1})
+
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(200, code)
+        self.assertEqual([{'ID': 1}], body['results'])
+        self.assertEqual('TIMEOUT', body['providers']['slow']['status'])
+
+    def test_failed_provider_partial(self):
+        """ Test a provider failing validation gives a partial result """
+        body, code = self._query_all(
+            {'good': _fake_provider('good', results=[{'ID': 1}]),
+             'bad': _fake_provider('bad', error=ValidationException('no'))},
+            {'good': 1, 'bad': 1})
+
+        self.assertEqual(200, code)
+        self.assertEqual([{'ID': 1}], body['results'])
+        self.assertEqual({'status': 'INVALID', 'reason': 'no', 'count': 0},
+                         body['providers']['bad'])
+
+    def test_request_error_hidden(self):
+        """ Test the error of a failed request is not shown to clients """
+        error = requests.ConnectionError('Failed: /search?key=SECRET')
+        body, code = self._query_all(
+            {'bad': _fake_provider('bad', error=error)}, {'bad': 1})
+
+        self.assertEqual(400, code)
+        self.assertEqual(providers.REQUEST_FAILED,
+                         body['providers']['bad']['reason'])
+
+    def test_single_provider_held_back(self):
+        """ Test an open circuit is a 503 when querying one provider """
+        fakes = {'bad': _fake_provider(
+            'bad', error=resilience.CircuitOpen('Circuit open for bad'))}
+        with patch.dict(providers.PROVIDERS, fakes, clear=True):
+            body, code, headers = providers.query('bad', {'query': 'cafes'})
+
+        self.assertEqual(503, code)
+        self.assertEqual(providers.UNAVAILABLE, body['reason'])
+
+    def test_single_provider_age(self):
+        """ Test a stale result of one provider has an Age header """
+        places = [{'name': 'Cafe', 'location': {'lat': 1, 'lng': 2}}]
+        fakes = {'old': _fake_provider('old', results=places, age=42),
+                 'new': _fake_provider('new', results=places)}
+        with patch.dict(providers.PROVIDERS, fakes, clear=True):
+            _, code, headers = providers.query('old', {'query': 'cafes'})
+            _, _, fresh_headers = providers.query('new', {'query': 'cafes'})
+
+        self.assertEqual(200, code)
+        self.assertEqual({'Age': '42'}, headers)
+        self.assertEqual({}, fresh_headers)
+
+    def test_all_failed(self):
+        """ Test all providers failing is a bad request """
+        body, code = self._query_all(
+            {'bad': _fake_provider('bad', error=ValidationException('no'))},
+            {'bad': 1})
+
+        self.assertEqual(400, code)
+        self.assertEqual([], body['results'])
+
+
+class TestStream(unittest.TestCase):
+    def test_stream(self):
+        """ Test results come before the summary, in provider order """
+        fakes = {'fast': _fake_provider('fast', results=[{'ID': 1}]),
+                 'slow': _fake_provider('slow', delay=0.05,
+                                        results=[{'ID': 2}, {'ID': 3}])}
+        with patch.dict(providers.PROVIDERS, fakes, clear=True):
+            records = list(providers.stream('all', {'query': 'cafes'}))
+
+        self.assertEqual([{'ID': 1}, {'ID': 2}, {'ID': 3}], records[:3])
+        self.assertEqual(200, records[3]['summary']['status'])
+        self.assertEqual(2, records[3]['summary']['providers']['slow']['count'])
+
+    def test_stream_invalid_provider(self):
+        """ Test an invalid provider only gives a summary """
+        records = list(providers.stream('nope', {}))
+
+        self.assertEqual(1, len(records))
+        self.assertEqual(400, records[0]['summary']['status'])
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.one = _fake_provider('one', results=[{'ID': 1}])
+        self.two = _fake_provider('two', delay=0.05, results=[{'ID': 2}])
+
+    def _batch(self, queries, names=None):
+        with patch.dict(providers.PROVIDERS,
+                        {'one': self.one, 'two': self.two}, clear=True):
+            return providers.batch(queries, names)
+
+    def test_order(self):
+        """ Test queries are answered in order, like single queries """
+        body, code = self._batch([{'query': 'bars'}, {'query': 'cafes'}],
+                                 ['two', 'one'])
+
+        self.assertEqual(200, code)
+        self.assertEqual([200, 200], [r['status'] for r in body['results']])
+        self.assertEqual([{'ID': 2}, {'ID': 1}],
+                         body['results'][0]['body']['results'])
+
+        body, code = self._batch([{'query': 'bars'}], ['one'])
+        self.assertEqual({'status': 200, 'body': [{'ID': 1}]},
+                         body['results'][0])
+
+    def test_shape(self):
+        """ Test the shape of a batch does not depend on the API keys set """
+        with patch.dict(providers.PROVIDERS, {'one': self.one}, clear=True):
+            body, _ = providers.batch([{'query': 'bars'}])
+
+        self.assertEqual([{'ID': 1}],
+                         body['results'][0]['body']['results'])
+        self.assertIn('one', body['results'][0]['body']['providers'])
+
+    def test_dedupe(self):
+        """ Test identical searches in a batch are only run once """
+        with patch.object(self.one, 'search',
+                          return_value={'status': Status.VALID,
+                                        'results': [{'ID': 1}],
+                                        'reason': None},
+                          autospec=True) as search:
+            body, _ = self._batch([{'query': 'bars', 'radius': 5},
+                                   {'radius': '5', 'query': 'bars'},
+                                   {'query': 'cafes'}], ['one'])
+
+        self.assertEqual(2, search.call_count)
+        self.assertEqual(3, len(body['results']))
+
+    def test_invalid(self):
+        """ Test a bad batch is rejected as a whole """
+        self.assertEqual(400, self._batch({'query': 'bars'})[1])
+        self.assertEqual(400, self._batch([{'query': 'bars'}], ['nope'])[1])
+        with patch.object(providers.limits, 'BATCH_MAX_QUERIES', 1):
+            self.assertEqual(400, self._batch([{}, {}])[1])
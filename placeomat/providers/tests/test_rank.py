@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+
+from placeomat import geo
+from placeomat.providers import rank
+
+BERLIN = (52.52, 13.405)
+
+
+def _results():
+    # about 0, 3, 1, and 30 km from Berlin, and one without a location
+    return [{'ID': 'c', 'Location': (52.52, 13.405)},
+            {'ID': 'f', 'Location': (52.547, 13.405)},
+            {'ID': 'n', 'Location': None},
+            {'ID': 'm', 'Location': (52.529, 13.405)},
+            {'ID': 'p', 'Location': (52.79, 13.405)}]
+
+
+class TestRank(unittest.TestCase):
+    def _ids(self, results):
+        return [r['ID'] for r in results]
+
+    def _check(self):
+        self.assertEqual(['c', 'm', 'f', 'p', 'n'],
+                         self._ids(rank.rank(_results(), BERLIN)))
+        self.assertEqual(['c', 'm'],
+                         self._ids(rank.rank(_results(), BERLIN, 2)))
+        self.assertEqual(['c', 'm', 'f', 'p', 'n'],
+                         self._ids(rank.rank(_results(), BERLIN, 10)))
+        self.assertEqual(['c', 'f'],
+                         self._ids(rank.rank(_results(), None, 2)))
+
+    def test_rank(self):
+        """ Test results are ranked by distance, closest first """
+        self._check()
+
+    def test_rank_without_numpy(self):
+        """ Test ranking gives the same order without numpy """
+        with patch.object(geo, 'np', None):
+            self._check()
+
+    def test_distances(self):
+        """ Test distances match the haversine of each point """
+        points = [r['Location'] for r in _results() if r['Location']]
+        for expected, distance in zip(
+                [geo.haversine(BERLIN[0], BERLIN[1], *p) for p in points],
+                geo.distances(BERLIN[0], BERLIN[1], points)):
+            self.assertAlmostEqual(expected, distance, places=3)
+
+    def test_circle_cover(self):
+        """ Test every point of a circle is within a tile of the cover """
+        centers = geo.circle_cover(BERLIN[0], BERLIN[1], 150000, 40000)
+        self.assertEqual([BERLIN], geo.circle_cover(BERLIN[0], BERLIN[1],
+                                                    30000, 40000))
+        for lat in range(-13, 14):
+            for lng in range(-22, 23):
+                point = (BERLIN[0] + lat * 0.1, BERLIN[1] + lng * 0.1)
+                if geo.haversine(BERLIN[0], BERLIN[1], *point) > 150000:
+                    continue
+                self.assertLessEqual(
+                    min(geo.distances(point[0], point[1], centers)), 40000)
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from placeomat.providers import ratelimit
+
+
+class TestScheduler(unittest.TestCase):
+    def test_burst_then_rate(self):
+        """ Test a burst goes through at once, then requests are paced """
+        scheduler = ratelimit.Scheduler(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            self.assertTrue(scheduler.acquire())
+
+        # two tokens at 20/s after the burst take ~0.1s
+        self.assertGreater(time.monotonic() - start, 0.08)
+
+    def test_timeout(self):
+        """ Test a request which waits too long does not get a token """
+        scheduler = ratelimit.Scheduler(rate=1, burst=1)
+        scheduler.acquire()
+
+        self.assertFalse(scheduler.acquire(timeout=0.05))
+
+    def test_reserve(self):
+        """ Test reservations wait their turn without blocking """
+        scheduler = ratelimit.Scheduler(rate=10, burst=2)
+        start = time.monotonic()
+        delays = [scheduler.reserve() for _ in range(4)]
+
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual([0.0, 0.0], delays[:2])
+        self.assertAlmostEqual(0.1, delays[2], places=2)
+        self.assertAlmostEqual(0.2, delays[3], places=2)
+        self.assertIsNone(scheduler.reserve(timeout=0.1))
+
+    def test_fair(self):
+        """ Test queued kinds of requests take turns """
+        scheduler = ratelimit.Scheduler(rate=50, burst=1)
+        scheduler.acquire()
+        order = []
+
+        def request(kind):
+            scheduler.acquire(kind)
+            order.append(kind)
+
+        threads = []
+        for kind in [ratelimit.DETAILS] * 4 + [ratelimit.SEARCH] * 2:
+            threads.append(threading.Thread(target=request, args=(kind,)))
+            threads[-1].start()
+            time.sleep(0.001)
+        for t in threads:
+            t.join()
+
+        self.assertEqual(['details', 'search', 'details', 'search',
+                          'details', 'details'], order)
+
+    @patch('placeomat.providers.ratelimit.limits.BACKOFF_PAUSE', 0.1)
+    def test_backoff(self):
+        """ Test backing off pauses and slows down, recovering slowly """
+        scheduler = ratelimit.Scheduler(rate=100, burst=10)
+        scheduler.backoff()
+        self.assertEqual(50, scheduler.rate)
+
+        start = time.monotonic()
+        scheduler.acquire()
+        self.assertGreater(time.monotonic() - start, 0.09)
+
+        scheduler.recover()
+        self.assertEqual(55, scheduler.rate)
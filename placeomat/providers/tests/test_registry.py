@@ -0,0 +1,45 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from placeomat.config import keys
+from placeomat.providers import providers, registry, yelp
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = registry.Registry()
+
+    @patch('placeomat.providers.provider.keys')
+    def test_one_instance(self, mock_keys):
+        """ Test every request gets the same provider instance """
+        self.assertIs(self.registry.get(yelp.Provider),
+                      self.registry.get(yelp.Provider))
+
+    def test_missing_key(self):
+        """ Test providers without an API key are left out """
+        with patch('placeomat.providers.provider.keys.get_key',
+                   side_effect=keys.KeyNotFound('YELP_KEY')):
+            self.assertEqual([], self.registry.load({'yelp': yelp.Provider}))
+
+        with patch.object(providers.registry, 'REGISTRY', self.registry):
+            body, code, headers = providers.query('yelp', {'query': 'cafes'})
+        self.assertEqual(400, code)
+
+    @patch('placeomat.providers.provider.keys')
+    def test_response_per_thread(self, mock_keys):
+        """ Test threads sharing a provider do not see each other's response """
+        provider = self.registry.get(yelp.Provider)
+        provider._response = 'main'
+        seen = []
+
+        def other():
+            seen.append(provider._response)
+            provider._response = 'other'
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+        self.assertEqual([None], seen)
+        self.assertEqual('main', provider._response)
@@ -0,0 +1,128 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from placeomat.providers import ratelimit, resilience
+
+
+def _response(code):
+    response = MagicMock()
+    response.status_code = code
+    return response
+
+
+@patch('placeomat.providers.resilience.limits.RETRY_BACKOFF', 0)
+class TestCall(unittest.TestCase):
+    def setUp(self):
+        resilience._BREAKERS.clear()
+        resilience._LATENCIES.clear()
+
+    def tearDown(self):
+        resilience._BREAKERS.clear()
+        resilience._LATENCIES.clear()
+
+    def test_retry(self):
+        """ Test server errors and connection errors are retried """
+        attempt = MagicMock(side_effect=[
+            _response(503), requests.ConnectionError(), _response(200)])
+
+        response = resilience.call('test', 'search', attempt)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, attempt.call_count)
+
+    def test_retries_bounded(self):
+        """ Test the last response is returned once retries run out """
+        attempt = MagicMock(return_value=_response(500))
+
+        response = resilience.call('test', 'search', attempt)
+
+        self.assertEqual(500, response.status_code)
+        self.assertEqual(resilience.limits.RETRIES + 1, attempt.call_count)
+
+    @patch('placeomat.providers.resilience.limits.BREAKER_FAILURES', 2)
+    @patch('placeomat.providers.resilience.limits.RETRIES', 0)
+    def test_breaker(self):
+        """ Test the circuit opens after failures, and closes again """
+        attempt = MagicMock(side_effect=requests.ConnectionError())
+        for _ in range(2):
+            self.assertRaises(requests.ConnectionError,
+                              resilience.call, 'test', 'search', attempt)
+
+        self.assertRaises(resilience.CircuitOpen,
+                          resilience.call, 'test', 'search', attempt)
+        self.assertEqual(2, attempt.call_count)
+
+        breaker = resilience.get_breaker('test')
+        breaker.opened_at -= breaker.reset
+        attempt = MagicMock(return_value=_response(200))
+        resilience.call('test', 'search', attempt)
+        self.assertIsNone(breaker.opened_at)
+
+    @patch('placeomat.providers.resilience.limits.LATENCY_MIN_SAMPLES', 1)
+    @patch('placeomat.providers.resilience.limits.HEDGE_MIN_DELAY', 0.01)
+    def test_hedge(self):
+        """ Test a slow attempt gets a hedged second attempt """
+        resilience.get_latency('test', 'search').add(0.01)
+        delays = [0.5, 0]
+
+        def attempt():
+            time.sleep(delays.pop(0))
+            return _response(200)
+
+        start = time.monotonic()
+        resilience.call('test', 'search', attempt)
+
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    @patch('placeomat.providers.resilience.limits.LATENCY_MIN_SAMPLES', 1)
+    @patch('placeomat.providers.resilience.limits.HEDGE_MIN_DELAY', 0.01)
+    def test_hedge_rate_limited(self):
+        """ Test waiting for a turn is not timed, nor hedged """
+        resilience.get_latency('test', 'search').add(0.01)
+        scheduler = ratelimit.Scheduler(rate=5, burst=1)
+        scheduler.acquire()
+        attempt = MagicMock(side_effect=lambda: time.sleep(0.05) or
+                            _response(200))
+
+        # the attempt waits ~0.2s for a token, then takes longer than the
+        # p95, but the bucket is empty, so there is no second attempt
+        resilience.call('test', 'search', attempt, scheduler=scheduler)
+
+        self.assertEqual(1, attempt.call_count)
+        latency = resilience.get_latency('test', 'search')
+        self.assertLess(max(latency._samples), 0.15)
+
+    @patch('placeomat.providers.resilience.limits.LATENCY_MIN_SAMPLES', 1)
+    def test_hedge_queued(self):
+        """ Test waiting in the hedge pool does not count towards hedging """
+        resilience.get_latency('test', 'search').add(0.1)
+        attempt = MagicMock(side_effect=lambda: time.sleep(0.02) or
+                            _response(200))
+
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(time.sleep, 0.2)
+        with patch.object(resilience, '_HEDGE_EXECUTOR', pool):
+            resilience.call('test', 'search', attempt)
+        pool.shutdown()
+
+        self.assertEqual(1, attempt.call_count)
+
+    @patch('placeomat.providers.resilience.limits.LATENCY_MIN_SAMPLES', 1)
+    @patch('placeomat.providers.resilience.limits.HEDGE_MIN_DELAY', 0.01)
+    def test_hedge_slots(self):
+        """ Test slow attempts are not hedged when no hedge slot is free """
+        resilience.get_latency('test', 'search').add(0.01)
+        attempt = MagicMock(side_effect=lambda: time.sleep(0.1) or
+                            _response(200))
+
+        with patch.object(resilience, '_HEDGE_SLOTS',
+                          threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            resilience.call('test', 'search', attempt)
+
+        self.assertEqual(1, attempt.call_count)
@@ -0,0 +1,48 @@
+import threading
+import time
+import unittest
+
+from placeomat.providers import singleflight
+
+
+class TestGroup(unittest.TestCase):
+    def setUp(self):
+        self.group = singleflight.Group()
+        self.calls = 0
+
+    def _slow(self, value):
+        self.calls += 1
+        time.sleep(0.1)
+        return value
+
+    def _run(self, key, results):
+        results.append(self.group.do(key, self._slow, key))
+
+    def test_coalesced(self):
+        """ Test concurrent calls for the same key share one call """
+        results = []
+        threads = [threading.Thread(target=self._run, args=('a', results))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, self.calls)
+        self.assertEqual(['a'] * 5, results)
+        self.assertEqual(0, self.group.in_flight())
+
+    def test_sequential(self):
+        """ Test calls which do not overlap are not coalesced """
+        self.group.do('a', self._slow, 'a')
+        self.group.do('a', self._slow, 'a')
+
+        self.assertEqual(2, self.calls)
+
+    def test_error_shared(self):
+        """ Test an exception is raised to the caller, and forgotten """
+        def fail():
+            raise ValueError('nope')
+
+        self.assertRaises(ValueError, self.group.do, 'a', fail)
+        self.assertEqual('a', self.group.do('a', self._slow, 'a'))
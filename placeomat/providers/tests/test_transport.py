@@ -0,0 +1,14 @@
+import unittest
+
+from placeomat.providers import transport
+
+
+class TestSessions(unittest.TestCase):
+    def test_session_per_host(self):
+        """ Test sessions are shared per host, and only per host """
+        search = transport.get_session('https://example.com/search')
+        details = transport.get_session('https://example.com/details')
+        other = transport.get_session('https://example.org/search')
+
+        self.assertIs(search, details)
+        self.assertIsNot(search, other)
@@ -0,0 +1,127 @@
+import functools
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import urlparse
+
+from placeomat import metrics, recorder
+from placeomat.config import limits
+from placeomat.providers import ratelimit, resilience
+
+# status code of a response which says we are sending too many requests
+TOO_MANY_REQUESTS = 429
+
+# one session per upstream host, shared by every provider instance and
+# every thread in the process, so connections are kept alive and reused
+# instead of paying a TCP and TLS handshake for every request.
+#
+# providers do not rely on cookies, which is the part of a session that
+# is not safe to share between threads.
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _new_session():
+    """
+    Make a session with a connection pool sized from the limits config
+
+    :return: session
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1,
+                          pool_maxsize=limits.POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url):
+    """
+    Get the shared session for the host of the given URL, making it
+    if this is the first request to that host.
+
+    :param str url: URL which will be requested
+    :return: session for the host
+    :rtype: requests.Session
+    """
+    host = urlparse(url).netloc
+    session = _SESSIONS.get(host, None)
+    if session is None:
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(host, None)
+            if session is None:
+                logging.debug('Opening connection pool for %s', host)
+                session = _SESSIONS[host] = _new_session()
+
+    return session
+
+
+def get(url, params=None, headers=None, timeout=None,
+        scheduler=None, kind=ratelimit.SEARCH, provider=None, retry_if=None):
+    """
+    Make a GET request over the pooled session for the URL's host. With a
+    scheduler, the request first waits for its turn, and the scheduler
+    backs off when the host says there are too many requests. With a
+    provider, the request goes through the provider's circuit breaker,
+    and is hedged and retried, see resilience.call.
+
+    :param str url: URL to request
+    :param dict params: query parameters
+    :param dict headers: extra request headers
+    :param timeout: read timeout in seconds, defaults to READ_TIMEOUT
+    :param Scheduler scheduler: rate limit of the provider and API key
+    :param str kind: kind of request, for the scheduler
+    :param str provider: provider the request goes to
+    :param retry_if: function telling if a response is worth a retry,
+    defaults to server errors
+    :return: response
+    :rtype: requests.Response
+    """
+    if timeout is None:
+        timeout = limits.READ_TIMEOUT
+
+    attempt = functools.partial(_attempt, url, params, headers, timeout,
+                                scheduler, kind, provider)
+    if provider is None:
+        resilience.admit(scheduler, kind, url)
+        return attempt()
+
+    return resilience.call(provider, kind, attempt,
+                           retry_if or resilience.server_error, scheduler)
+
+
+def _attempt(url, params, headers, timeout, scheduler, kind, provider):
+    """
+    Make one attempt of a request, once it has its turn in the scheduler,
+    see get
+    """
+    provider = provider or ''
+    start = time.perf_counter()
+    with metrics.UPSTREAM_IN_FLIGHT.track(provider, kind), \
+            metrics.UPSTREAM_LATENCY.time(provider, kind):
+        try:
+            response = get_session(url).get(
+                url, params=params, headers=headers,
+                timeout=(limits.CONNECT_TIMEOUT, timeout))
+        except requests.RequestException:
+            metrics.UPSTREAM_RESPONSES.inc(provider, kind, 'error')
+            raise
+
+    metrics.UPSTREAM_RESPONSES.inc(provider, kind, str(response.status_code))
+
+    record = recorder.get_recorder()
+    if record:
+        record.upstream(url, params, response.status_code, response.content,
+                        time.perf_counter() - start)
+
+    if scheduler:
+        if response.status_code == TOO_MANY_REQUESTS:
+            scheduler.backoff()
+        else:
+            scheduler.recover()
+
+    return response
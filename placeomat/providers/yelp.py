@@ -1,11 +1,24 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from placeomat.providers import provider
+from placeomat import metrics
+from placeomat.config import limits
+from placeomat.providers import aio, provider, ratelimit
+from placeomat.providers.place import Place
 from placeomat.yelp import status as ystatus
 from placeomat.yelp import validation
 
 
+# pages of searches are fetched on this pool, shared by all searches
+_PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=limits.PAGE_WORKERS)
+
+
 class Provider(provider.Provider):
+    PAGE_SIZE = validation.PAGE_SIZE
+    MAX_PAGES = validation.MAX_PAGES
+    MAX_RADIUS = validation.MAX_RADIUS
+
     def __init__(self):
         self.name = 'Yelp'
         super(Provider, self).__init__(key_var='yelp')
@@ -24,7 +37,7 @@ class Provider(provider.Provider):
             # https://www.yelp.com/developers/documentation/v3/business_search
             if int(radius) > validation.MAX_RADIUS:
                 raise provider.ValidationException(
-                    'radius was %d, must be less than %d' % (
+                    'radius was %d, must be less than %d, or tile=1' % (
                         int(radius), validation.MAX_RADIUS))
 
         # require either location or lat/long
@@ -43,46 +56,158 @@ class Provider(provider.Provider):
         headers = {'Authorization': 'Bearer %s' % self.api_key}
         return headers
 
-    def response(self):
+    def response(self, enrich=True):
         """
         Once a query has been made, response can be called to parse the request
         response, and return the appropriately formatted dictionary.
 
+        :param bool enrich: unused, Yelp has no fields which cost extra
         :return: response dictionary
         :rtype: dict
         """
+        return self._parse(self._response)
 
-        code = self._response.status_code
+    def _parse(self, response):
+        """
+        Parse a search response of the Fusion API
+
+        :param response: response of the Fusion API
+        :return: response dictionary
+        :rtype: dict
+        """
+        code = response.status_code
 
         if code not in ystatus.VALID_CODES:
+            metrics.PROVIDER_STATUS.inc(self.key_var, ratelimit.SEARCH,
+                                        self._error_code(response))
             return self._make_response(
                 provider.Status.INVALID,
                 reason='Got response code %d' % code)
 
-        res = self._response.json()
+        with metrics.PARSE_TIME.time(self.key_var, 'decode'):
+            res = response.json()
         items = res.get('businesses', [])
+        metrics.PROVIDER_STATUS.inc(self.key_var, ratelimit.SEARCH,
+                                    ystatus.OK)
 
         if not items:
             return self._make_response(
                 provider.Status.VALID,
                 reason="No results found")
 
-        results = []
-        for item in items:
-            # TODO: could make this bit extensible
-            data = {
-                'ID': item['id'],
-                'Provider': self.name,
-                'Name': item['name'],
-                'Description': ', '.join(
-                    [c['title'] for c in item['categories']]),
-                'Location': (item['coordinates']['latitude'],
-                             item['coordinates']['longitude']),
-                'Address': ' '.join(item['location']['display_address']),
-                'More Details': item['url']
-            }
-            results += [data]
+        with metrics.PARSE_TIME.time(self.key_var, 'format'):
+            results = self._format_places(items)
 
         return self._make_response(
             provider.Status.VALID,
             results=results)
+
+    def _format_places(self, items):
+        # TODO: could make this bit extensible
+        name = self.name
+        return [Place(item['id'], name, item['name'],
+                      ', '.join([c['title'] for c in item['categories']]),
+                      (item['coordinates']['latitude'],
+                       item['coordinates']['longitude']),
+                      ' '.join(item['location']['display_address']),
+                      item['url'])
+                for item in items]
+
+    def _error_code(self, response):
+        """
+        Get the code of an error response, e.g. TOKEN_MISSING
+
+        :param response: response of the Fusion API
+        :return: the error code, or the response code if there is none
+        :rtype: str
+        """
+        try:
+            return response.json()['error']['code']
+        except (ValueError, KeyError, TypeError):
+            return str(response.status_code)
+
+    def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        """
+        Send the search, one request per page of offset and limit. The
+        offset of every page is known up front, so all pages are fetched
+        at the same time.
+        """
+        if pages == 1 and max_results is None:
+            return super(Provider, self)._fetch(params, enrich, pages,
+                                                max_results)
+
+        futures = [_PAGE_EXECUTOR.submit(self._request, page_params)
+                   for page_params in self._page_params(params, pages)]
+
+        # without the first page there is nothing to show, so its
+        # failure is the search's; later pages are left out if they fail
+        first = self._parse(futures[0].result())
+        responses = [first]
+        for future in futures[1:]:
+            if future.exception():
+                logging.info('Page of a %s search failed: %s',
+                             self.name, future.exception())
+                continue
+            responses.append(self._parse(future.result()))
+
+        return self._combine(responses, max_results)
+
+    def _page_params(self, params, pages):
+        size = self.PAGE_SIZE
+        return [dict(params, limit=size, offset=page * size)
+                for page in range(pages)]
+
+    def _combine(self, responses, max_results):
+        """
+        Combine the responses of the pages of a search
+
+        :param list responses: response dictionary of each page, in order
+        :param int max_results: number of results to keep, or None for all
+        :return: response dictionary
+        :rtype: dict
+        """
+        first = responses[0]
+        if first['status'] is not provider.Status.VALID:
+            return first
+
+        seen = set()
+        results = []
+        for res in responses:
+            if res['status'] is not provider.Status.VALID:
+                continue
+            for place in res['results']:
+                # results can move between pages while they are fetched
+                if place['ID'] not in seen:
+                    seen.add(place['ID'])
+                    results.append(place)
+
+        if not results:
+            return first
+        return self._keep(self._make_response(provider.Status.VALID,
+                                              results=results), max_results)
+
+
+class AsyncProvider(aio.AsyncProvider, Provider):
+    """ Yelp provider for the asyncio engine """
+
+    async def _fetch(self, params, enrich=True, pages=1, max_results=None):
+        if pages == 1 and max_results is None:
+            return await super(AsyncProvider, self)._fetch(
+                params, enrich, pages, max_results)
+
+        responses = await asyncio.gather(
+            *[self._request(page_params)
+              for page_params in self._page_params(params, pages)],
+            return_exceptions=True)
+
+        if isinstance(responses[0], BaseException):
+            raise responses[0]
+        parsed = []
+        for response in responses:
+            if isinstance(response, BaseException):
+                logging.info('Page of a %s search failed: %r',
+                             self.name, response)
+                continue
+            parsed.append(self._parse(response))
+
+        return self._combine(parsed, max_results)
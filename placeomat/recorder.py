@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from placeomat.config import record as record_config
+
+# files of a recording ("cassette"), each a line of JSON per request
+REQUESTS_FILE = 'requests.jsonl'
+UPSTREAM_FILE = 'upstream.jsonl'
+
+
+class Recorder(object):
+    """
+    Records the requests the service gets, and the responses of the
+    upstream APIs, into a directory, so the traffic can be replayed later
+    against another build, see bench/replay.py. Lines are written whole
+    under a lock, so threads do not mix them up.
+    """
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def _write(self, name, record):
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            f = self._files.get(name, None)
+            if f is None:
+                f = self._files[name] = open(
+                    os.path.join(self.path, name), 'a', encoding='utf-8')
+            f.write(line)
+            f.flush()
+
+    def request(self, path, args, accept, status, seconds):
+        """
+        Record a request to the service
+
+        :param str path: path of the request, e.g. /search/google
+        :param dict args: query parameters
+        :param str accept: Accept header, which picks JSON or NDJSON
+        :param int status: HTTP Status Code of the response
+        :param float seconds: seconds the response took
+        """
+        self._write(REQUESTS_FILE, {'at': time.time(), 'path': path,
+                                    'args': args, 'accept': accept,
+                                    'status': status, 'seconds': seconds})
+
+    def upstream(self, url, params, status, body, seconds):
+        """
+        Record a response of an upstream API
+
+        :param str url: URL which was requested
+        :param dict params: query parameters, API keys are left out
+        :param int status: HTTP Status Code of the response
+        :param bytes body: body of the response
+        :param float seconds: seconds the response took
+        """
+        params = {k: str(v) for k, v in (params or {}).items()
+                  if k not in record_config.REDACT_PARAMS}
+        self._write(UPSTREAM_FILE, {'at': time.time(),
+                                    'path': urlparse(url).path,
+                                    'params': params, 'status': status,
+                                    'body': body.decode('utf-8', 'replace'),
+                                    'seconds': seconds})
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+_RECORDER = None
+_RECORDER_LOCK = threading.Lock()
+
+
+def get_recorder():
+    """
+    Get the process wide recorder, making it on first use
+
+    :return: the recorder, or None if recording is turned off
+    :rtype: Recorder
+    """
+    global _RECORDER
+    if not record_config.RECORD_DIR:
+        return None
+
+    if _RECORDER is None:
+        with _RECORDER_LOCK:
+            if _RECORDER is None:
+                logging.info('Recording traffic into %s',
+                             record_config.RECORD_DIR)
+                _RECORDER = Recorder(record_config.RECORD_DIR)
+
+    return _RECORDER
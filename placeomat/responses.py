@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+
+from placeomat.config import responses as responses_config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# encodings we can compress with, in the order we prefer them
+ENCODINGS = (('br', 'gzip') if brotli is not None else ('gzip',))
+
+
+def etag(data, encoding=None):
+    """
+    Make a strong ETag for a body, from the hash of its content. Each
+    encoding of a body is a different representation of it, so it gets
+    its own ETag.
+
+    :param bytes data: body, before it is compressed
+    :param str encoding: content encoding the body is sent with, if any
+    :rtype: str
+    """
+    tag = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if encoding:
+        tag = '%s-%s' % (tag, encoding)
+    return '"%s"' % tag
+
+
+def not_modified(if_none_match, tag):
+    """
+    Check if the client already has the body, from its If-None-Match header
+
+    :param str if_none_match: the header, or None if it was not sent
+    :param str tag: ETag of the body
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == tag:
+            return True
+
+    return False
+
+
+def negotiate(accept_encoding):
+    """
+    Pick the encoding to compress a body with, from the Accept-Encoding
+    header of the client
+
+    :param str accept_encoding: the header, or None if it was not sent
+    :return: the encoding, or None to send the body as it is
+    :rtype: str
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+
+    return best
+
+
+def compress(data, encoding):
+    """
+    Compress a body with an encoding picked by negotiate
+
+    :param bytes data: body
+    :param str encoding: br or gzip
+    :rtype: bytes
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=responses_config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=responses_config.GZIP_LEVEL)
+
+
+def prepare(data, status, if_none_match=None, accept_encoding=None,
+            tagged=False):
+    """
+    Get a body ready to be sent. Bodies above the size threshold are
+    compressed if the client accepts it. Tagged bodies of successful
+    responses get an ETag, and are not sent again if the client has them.
+
+    :param bytes data: body
+    :param int status: HTTP Status Code
+    :param str if_none_match: If-None-Match header of the request
+    :param str accept_encoding: Accept-Encoding header of the request
+    :param bool tagged: give the body an ETag
+    :return: HTTP Status Code, body and headers of the response
+    :rtype: tuple
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+
+    encoding = None
+    if len(data) >= responses_config.COMPRESS_MIN_SIZE:
+        encoding = negotiate(accept_encoding)
+
+    if tagged and status == 200:
+        headers['ETag'] = etag(data, encoding)
+        if not_modified(if_none_match, headers['ETag']):
+            return 304, b'', headers
+
+    if encoding:
+        data = compress(data, encoding)
+        headers['Content-Encoding'] = encoding
+
+    return status, data, headers
@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+import time
+
+from placeomat.config import storage
+from placeomat.storage import sqlite
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS details (
+    provider TEXT NOT NULL,
+    place_id TEXT NOT NULL,
+    details TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (provider, place_id)
+);
+'''
+
+
+class DetailsStore(object):
+    """
+    Durable store of place details, keyed by provider and place ID. Details
+    older than the TTL are treated as missing, so they get looked up again.
+    """
+    def __init__(self, path, ttl, purge_every=storage.DETAILS_PURGE_EVERY):
+        self.ttl = ttl
+        self.db = sqlite.Database(path, SCHEMA)
+        self._purge_due = sqlite.Every(purge_every)
+
+    def get(self, provider, place_id):
+        """
+        Get the stored details of one place
+
+        :param str provider: provider of the place
+        :param str place_id: ID of the place at the provider
+        :return: details, or None if not stored or too old
+        :rtype: dict
+        """
+        return self.get_many(provider, [place_id]).get(place_id, None)
+
+    def get_many(self, provider, place_ids):
+        """
+        Get the stored details of many places in one go
+
+        :param str provider: provider of the places
+        :param list place_ids: IDs of the places at the provider
+        :return: details of each place that is stored and fresh enough
+        :rtype: dict
+        """
+        conn = self.db.connection()
+        oldest = time.time() - self.ttl
+        found = {}
+        for chunk in sqlite.chunks(set(place_ids)):
+            rows = conn.execute(
+                'SELECT place_id, details FROM details '
+                'WHERE provider = ? AND fetched_at >= ? '
+                'AND place_id IN (%s)' % ', '.join('?' * len(chunk)),
+                [provider, oldest] + chunk)
+            for place_id, details in rows:
+                found[place_id] = json.loads(details)
+
+        return found
+
+    def put(self, provider, place_id, details):
+        """
+        Store the details of one place
+
+        :param str provider: provider of the place
+        :param str place_id: ID of the place at the provider
+        :param dict details: details to store
+        """
+        self.put_many(provider, {place_id: details})
+
+    def put_many(self, provider, details):
+        """
+        Store the details of many places in one transaction, and every so
+        many writes, delete the details which are too old
+
+        :param str provider: provider of the places
+        :param dict details: details of each place ID
+        """
+        if not details:
+            return
+
+        now = time.time()
+        conn = self.db.connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO details '
+                '(provider, place_id, details, fetched_at) '
+                'VALUES (?, ?, ?, ?)',
+                [(provider, place_id, json.dumps(d), now)
+                 for place_id, d in details.items()])
+
+        if self._purge_due():
+            self.purge()
+
+    def purge(self):
+        """ Delete all details older than the TTL """
+        conn = self.db.connection()
+        with conn:
+            conn.execute('DELETE FROM details WHERE fetched_at < ?',
+                         (time.time() - self.ttl,))
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store():
+    """
+    Get the process wide details store, opening it on first use
+
+    :return: the details store, or None if it is turned off
+    :rtype: DetailsStore
+    """
+    global _STORE
+    if not storage.DETAILS_PATH:
+        return None
+
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                logging.info('Opening place details store %s',
+                             storage.DETAILS_PATH)
+                _STORE = DetailsStore(storage.DETAILS_PATH,
+                                      storage.DETAILS_TTL)
+                _STORE.purge()
+
+    return _STORE
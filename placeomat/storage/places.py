@@ -0,0 +1,311 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from placeomat import geo
+from placeomat.config import cache as cache_config
+from placeomat.config import storage
+from placeomat.providers.place import Place, encode
+from placeomat.storage import sqlite
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS places (
+    provider TEXT NOT NULL,
+    place_id TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    cell TEXT NOT NULL,
+    place TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (provider, place_id)
+);
+CREATE INDEX IF NOT EXISTS places_cell ON places (cell);
+
+CREATE TABLE IF NOT EXISTS coverage (
+    id INTEGER PRIMARY KEY,
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    radius REAL NOT NULL,
+    complete INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_query
+    ON coverage (provider, query, fetched_at);
+
+CREATE TABLE IF NOT EXISTS coverage_places (
+    coverage_id INTEGER NOT NULL,
+    place_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (coverage_id, place_id)
+);
+'''
+
+# parameters which describe the area of a search, the rest of the search
+# parameters (and the provider) say what is searched for
+AREA_PARAMS = ('location', 'radius')
+
+# parameters which do not change what a search returns
+CONTROL_PARAMS = (cache_config.BYPASS_PARAM,)
+
+
+class PlaceIndex(object):
+    """
+    Durable index of the places returned by upstream searches, bucketed by
+    geohash, plus the area and parameters of each search ("coverage").
+
+    A search can be answered locally if a fresh enough upstream search with
+    the same parameters covered its whole area, and either returned every
+    place in that area (fewer than a page of results of a provider which
+    bounds its results by the radius), or was for the same area to begin
+    with.
+    """
+    def __init__(self, path, page_sizes, max_age=cache_config.get_ttl,
+                 precision=storage.INDEX_PRECISION,
+                 purge_every=storage.INDEX_PURGE_EVERY):
+        self.max_age = max_age
+        self.page_sizes = page_sizes
+        self.precision = precision
+        self.db = sqlite.Database(path, SCHEMA)
+        self._purge_due = sqlite.Every(purge_every)
+
+    def record(self, provider, query, lat, lng, radius, places):
+        """
+        Record the places an upstream search returned, and every so many
+        searches, delete the searches which are too old
+
+        :param str provider: provider which was searched
+        :param str query: what was searched for, see query_key
+        :param float lat: latitude of the center of the search
+        :param float lng: longitude of the center of the search
+        :param float radius: radius of the search in meters
+        :param list places: places the search returned
+        """
+        now = time.time()
+        complete = len(places) < self.page_sizes.get(provider, 0)
+        located = [p for p in places if p.get('Location', None)]
+
+        conn = self.db.connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO places '
+                '(provider, place_id, lat, lng, cell, place, seen_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(provider, p['ID'], p['Location'][0], p['Location'][1],
+                  geo.geohash(p['Location'][0], p['Location'][1],
+                              self.precision),
+                  encode(p), now) for p in located])
+
+            coverage_id = conn.execute(
+                'INSERT INTO coverage '
+                '(provider, query, lat, lng, radius, complete, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (provider, query, lat, lng, radius, complete, now)).lastrowid
+
+            conn.executemany(
+                'INSERT OR IGNORE INTO coverage_places '
+                '(coverage_id, place_id, rank) VALUES (?, ?, ?)',
+                [(coverage_id, p['ID'], rank)
+                 for rank, p in enumerate(located)])
+
+        if self._purge_due():
+            self.purge()
+
+    def _covering(self, provider, query, lat, lng, radius):
+        """
+        Get the fresh searches which can answer a search for the area
+
+        :return: IDs of the covering searches
+        :rtype: list
+        """
+        rows = self.db.connection().execute(
+            'SELECT id, lat, lng, radius, complete FROM coverage '
+            'WHERE provider = ? AND query = ? AND fetched_at >= ?',
+            (provider, query, time.time() - self.max_age(provider)))
+
+        covering = []
+        for coverage_id, c_lat, c_lng, c_radius, complete in rows:
+            distance = geo.haversine(lat, lng, c_lat, c_lng)
+            if distance + radius > c_radius * 1.001:
+                continue
+
+            same_area = distance <= c_radius * 0.01 and \
+                abs(radius - c_radius) <= c_radius * 0.01
+            if complete or same_area:
+                covering.append(coverage_id)
+
+        return covering
+
+    def search(self, provider, query, lat, lng, radius):
+        """
+        Answer a search from the index, if fresh enough data covers it
+
+        :param str provider: provider to search
+        :param str query: what to search for, see query_key
+        :param float lat: latitude of the center of the search
+        :param float lng: longitude of the center of the search
+        :param float radius: radius of the search in meters
+        :return: the places in the area, or None if the index cannot answer
+        :rtype: list
+        """
+        covering = self._covering(provider, query, lat, lng, radius)
+        if not covering:
+            return None
+
+        cells = geo.geohash_cover(lat, lng, radius, self.precision)
+        cell_filter = ' OR '.join(['(p.cell >= ? AND p.cell < ?)'] * len(cells))
+        cell_args = [arg for cell in cells for arg in (cell, cell + '~')]
+
+        found = {}
+        for chunk in sqlite.chunks(covering, 200):
+            rows = self.db.connection().execute(
+                'SELECT p.place_id, p.lat, p.lng, p.place, cp.rank '
+                'FROM places p JOIN coverage_places cp '
+                'ON p.place_id = cp.place_id '
+                'WHERE p.provider = ? AND cp.coverage_id IN (%s) AND (%s)' % (
+                    ', '.join('?' * len(chunk)), cell_filter),
+                [provider] + chunk + cell_args)
+
+            for place_id, p_lat, p_lng, place, rank in rows:
+                if geo.haversine(lat, lng, p_lat, p_lng) > radius:
+                    continue
+                if place_id not in found or rank < found[place_id][0]:
+                    found[place_id] = (rank, place)
+
+        return [Place.from_dict(json.loads(p))
+                for _, p in sorted(found.values())]
+
+    def purge(self):
+        """
+        Delete searches older than the max age of their provider, and their
+        places
+        """
+        now = time.time()
+        conn = self.db.connection()
+        providers = [provider for provider, in conn.execute(
+            'SELECT provider FROM coverage UNION SELECT provider FROM places')]
+        with conn:
+            for provider in providers:
+                oldest = now - self.max_age(provider)
+                conn.execute(
+                    'DELETE FROM coverage_places WHERE coverage_id IN '
+                    '(SELECT id FROM coverage '
+                    'WHERE provider = ? AND fetched_at < ?)',
+                    (provider, oldest))
+                conn.execute(
+                    'DELETE FROM coverage '
+                    'WHERE provider = ? AND fetched_at < ?',
+                    (provider, oldest))
+                conn.execute(
+                    'DELETE FROM places WHERE provider = ? AND seen_at < ?',
+                    (provider, oldest))
+
+
+def query_key(query_args):
+    """
+    Describe what a search is for, leaving out the area it is for
+
+    :param dict query_args: query parameters of the search
+    :return: the key, or None if the search is not for an area, or
+    cannot be answered from stored places
+    :rtype: str
+    """
+    # opening hours change all the time, stored places cannot tell
+    if 'open' in query_args:
+        return None
+
+    rest = {k: v for k, v in query_args.items()
+            if k not in AREA_PARAMS and k not in CONTROL_PARAMS}
+    return json.dumps(sorted(rest.items()))
+
+
+def _area(query_args):
+    """
+    Get the area of a search
+
+    :param dict query_args: query parameters of the search
+    :return: latitude, longitude and radius, or None without an area
+    :rtype: tuple
+    """
+    location = geo.parse_location(query_args.get('location', None))
+    try:
+        radius = float(query_args['radius'])
+    except (KeyError, ValueError):
+        return None
+
+    if location is None:
+        return None
+
+    return location + (radius,)
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index():
+    """
+    Get the process wide place index, opening it on first use
+
+    :return: the place index, or None if it is turned off
+    :rtype: PlaceIndex
+    """
+    global _INDEX
+    if not storage.INDEX_PATH:
+        return None
+
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                logging.info('Opening place index %s', storage.INDEX_PATH)
+                _INDEX = PlaceIndex(storage.INDEX_PATH,
+                                    storage.INDEX_PAGE_SIZES)
+                _INDEX.purge()
+
+    return _INDEX
+
+
+def lookup(provider, query_args):
+    """
+    Try to answer a search from the place index
+
+    :param str provider: provider to search
+    :param dict query_args: query parameters of the search
+    :return: the places, or None if the search has to go upstream
+    :rtype: list
+    """
+    area = _area(query_args)
+    key = query_key(query_args)
+    index = get_index() if area and key else None
+    if index is None:
+        return None
+
+    # the index is an optimization, if it fails we go upstream
+    try:
+        return index.search(provider, key, *area)
+    except sqlite3.Error:
+        logging.exception('Place index lookup failed')
+        return None
+
+
+def record(provider, query_args, places):
+    """
+    Record the places an upstream search returned in the place index
+
+    :param str provider: provider which was searched
+    :param dict query_args: query parameters of the search
+    :param list places: places the search returned
+    """
+    area = _area(query_args)
+    key = query_key(query_args)
+    index = get_index() if area and key else None
+    if index is None:
+        return
+
+    try:
+        index.record(provider, key, area[0], area[1], area[2], places)
+    except sqlite3.Error:
+        logging.exception('Recording places in the place index failed')
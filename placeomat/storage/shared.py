@@ -0,0 +1,220 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from placeomat.config import storage
+from placeomat.providers.place import Place, encode
+from placeomat.storage import sqlite
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    reason TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_stored ON results (stored_at);
+
+-- running total of the size of all results, kept up to date by the
+-- triggers in the same transaction as the write, so the size of the cache
+-- does not need a scan. Files from before it are scanned once.
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage (id, bytes)
+    SELECT 0, (SELECT TOTAL(size) FROM results)
+    WHERE NOT EXISTS (SELECT 1 FROM usage);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results
+BEGIN
+    UPDATE usage SET bytes = bytes + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results
+BEGIN
+    UPDATE usage SET bytes = bytes + new.size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results
+BEGIN
+    UPDATE usage SET bytes = bytes - old.size;
+END;
+'''
+
+# once the cache is full, results are dropped until it is down to this
+# share of its size, so not every write has to drop some
+EVICT_TO = 0.9
+
+
+class SharedCache(object):
+    """
+    Search results in an SQLite file, shared by all server processes of a
+    host. Each process still keeps its own cache in memory in front of it,
+    this one is asked on a miss there.
+
+    A result is written in one transaction together with dropping the
+    oldest results if the cache got too large, so other processes see
+    either all of a result or none of it. Expiry uses the wall clock, since
+    processes do not share a monotonic one.
+    """
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.db = sqlite.Database(path, SCHEMA)
+
+    def get(self, key):
+        """
+        Get a search result
+
+        :param str key: key of the search
+        :return: places, reason and seconds until the result expires, or
+        None if the result is missing or expired
+        :rtype: tuple
+        """
+        conn = self.db.connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT results, reason, expires_at FROM results '
+            'WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+
+        results, reason, expires_at = row
+        return [Place.from_dict(p) for p in json.loads(results)], reason, \
+            expires_at - now
+
+    def put(self, key, places, reason, ttl):
+        """
+        Store a search result, dropping the oldest results if the cache
+        gets too large
+
+        :param str key: key of the search
+        :param list places: places the search returned
+        :param str reason: reason of the response, if any
+        :param float ttl: seconds until the result expires
+        """
+        results = encode(places)
+        now = time.time()
+        conn = self.db.connection()
+        with conn:
+            # an upsert rather than INSERT OR REPLACE, whose delete of the
+            # old row does not fire the delete trigger
+            conn.execute(
+                'INSERT INTO results '
+                '(key, results, reason, size, stored_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET results = excluded.results, '
+                'reason = excluded.reason, size = excluded.size, '
+                'stored_at = excluded.stored_at, '
+                'expires_at = excluded.expires_at',
+                (key, results, reason, len(results), now, now + ttl))
+            self._evict(conn, now)
+
+    @staticmethod
+    def _usage(conn):
+        total, = conn.execute('SELECT bytes FROM usage').fetchone()
+        return total
+
+    def _evict(self, conn, now):
+        if self._usage(conn) <= self.max_bytes:
+            return
+
+        conn.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+        total = self._usage(conn)
+
+        excess = total - self.max_bytes * EVICT_TO
+        dropped = []
+        for key, size in conn.execute(
+                'SELECT key, size FROM results ORDER BY stored_at'):
+            if excess <= 0:
+                break
+            dropped.append(key)
+            excess -= size
+
+        for chunk in sqlite.chunks(dropped):
+            conn.execute('DELETE FROM results WHERE key IN (%s)' %
+                         ', '.join('?' * len(chunk)), chunk)
+
+    def size(self):
+        """
+        Get the bytes of search results held
+
+        :rtype: int
+        """
+        return int(self._usage(self.db.connection()))
+
+
+def make_key(key):
+    """
+    Turn a search cache key into text which is the same in every process
+
+    :param tuple key: key of the search cache, see cache.make_key
+    :rtype: str
+    """
+    return json.dumps(key, separators=(',', ':'))
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    """
+    Get the process wide handle of the shared cache, opening it on first use
+
+    :return: the shared cache, or None if it is turned off
+    :rtype: SharedCache
+    """
+    global _CACHE
+    if not storage.SHARED_CACHE_PATH:
+        return None
+
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                logging.info('Opening shared search cache %s',
+                             storage.SHARED_CACHE_PATH)
+                _CACHE = SharedCache(storage.SHARED_CACHE_PATH,
+                                     storage.SHARED_CACHE_MAX_BYTES)
+
+    return _CACHE
+
+
+def lookup(key):
+    """
+    Look a search up in the shared cache
+
+    :param tuple key: key of the search cache
+    :return: places, reason and seconds until the result expires, or None
+    :rtype: tuple
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    # the cache is an optimization, if it fails we go upstream
+    try:
+        return cache.get(make_key(key))
+    except sqlite3.Error:
+        logging.exception('Shared cache lookup failed')
+        return None
+
+
+def remember(key, places, reason, ttl):
+    """
+    Store a search result in the shared cache
+
+    :param tuple key: key of the search cache
+    :param list places: places the search returned
+    :param str reason: reason of the response, if any
+    :param float ttl: seconds until the result expires
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+
+    try:
+        cache.put(make_key(key), places, reason, ttl)
+    except sqlite3.Error:
+        logging.exception('Storing a search in the shared cache failed')
@@ -0,0 +1,64 @@
+import itertools
+import sqlite3
+import threading
+
+# seconds a connection waits for another connection's write lock
+BUSY_TIMEOUT = 5.0
+
+
+class Database(object):
+    """
+    An SQLite database file with one connection per thread, since SQLite
+    connections should not be shared between threads. The database is put
+    into WAL mode, so readers do not block the writer, and the schema is
+    created when a thread first connects.
+    """
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        """
+        Get the connection of the calling thread, opening it if needed
+
+        :return: connection to the database
+        :rtype: sqlite3.Connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.schema)
+            self._local.conn = conn
+
+        return conn
+
+
+class Every(object):
+    """
+    Tells every n-th time it is called, e.g. to purge old rows every n
+    writes. Taking the next number of an itertools.count is atomic, so it
+    can be shared between threads.
+    """
+    def __init__(self, n):
+        self.n = n
+        self._count = itertools.count(1)
+
+    def __call__(self):
+        return self.n > 0 and next(self._count) % self.n == 0
+
+
+def chunks(items, size=500):
+    """
+    Split items into lists of at most size items, to stay below the
+    maximum number of parameters of an SQLite statement.
+
+    :param list items: items to split
+    :param int size: maximum size of a chunk
+    :return: generator of lists
+    :rtype: generator
+    """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
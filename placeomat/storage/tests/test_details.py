@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from placeomat.storage import details
+
+
+class TestDetailsStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'details.db')
+        self.store = details.DetailsStore(self.path, ttl=60)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_get_many(self):
+        """ Test only stored places of the provider are returned """
+        self.store.put_many('google', {'a': {'url': 'a'},
+                                       'b': {'url': 'b'}})
+        self.store.put('yelp', 'c', {'url': 'c'})
+
+        self.assertEqual({'a': {'url': 'a'}, 'b': {'url': 'b'}},
+                         self.store.get_many('google', ['a', 'b', 'c']))
+        self.assertIsNone(self.store.get('google', 'c'))
+
+    def test_expired(self):
+        """ Test details older than the TTL are treated as missing """
+        store = details.DetailsStore(self.path, ttl=-1)
+        store.put('google', 'a', {'url': 'a'})
+
+        self.assertIsNone(store.get('google', 'a'))
+
+    def test_reopen(self):
+        """ Test details survive reopening the store """
+        self.store.put('google', 'a', {'url': 'a'})
+        reopened = details.DetailsStore(self.path, ttl=60)
+
+        self.assertEqual({'url': 'a'}, reopened.get('google', 'a'))
+
+    def test_purge(self):
+        """ Test old details are deleted every so many writes """
+        store = details.DetailsStore(self.path, ttl=-1, purge_every=2)
+        store.put('google', 'a', {'url': 'a'})
+        count = 'SELECT COUNT(*) FROM details'
+        self.assertEqual(1, store.db.connection().execute(count).fetchone()[0])
+
+        store.put('google', 'b', {'url': 'b'})
+        self.assertEqual(0, store.db.connection().execute(count).fetchone()[0])
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from placeomat.config.cache import get_ttl
+from placeomat.storage import places
+
+NEAR = {'ID': 'near', 'Name': 'Near', 'Location': (52.5200, 13.4000)}
+FAR = {'ID': 'far', 'Name': 'Far', 'Location': (52.5300, 13.4000)}
+
+
+class TestPlaceIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.dir.name, 'index.db')
+        self.index = places.PlaceIndex(
+            path, page_sizes={'bounded': 20, 'yelp': 2},
+            max_age=lambda provider: 60)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_complete_area(self):
+        """ Test a complete search answers searches inside its area """
+        self.index.record('bounded', 'cafes', 52.52, 13.40, 2000,
+                          [NEAR, FAR])
+
+        self.assertEqual([NEAR['ID']], [p['ID'] for p in self.index.search(
+            'bounded', 'cafes', 52.52, 13.40, 500)])
+        self.assertIsNone(self.index.search(
+            'bounded', 'cafes', 52.55, 13.40, 500))
+        self.assertIsNone(self.index.search(
+            'bounded', 'bars', 52.52, 13.40, 500))
+        self.assertIsNone(self.index.search(
+            'yelp', 'cafes', 52.52, 13.40, 500))
+
+    def test_incomplete_area(self):
+        """ Test a full page of results only answers the same area """
+        self.index.record('yelp', 'cafes', 52.52, 13.40, 2000, [NEAR, FAR])
+
+        self.assertIsNone(self.index.search(
+            'yelp', 'cafes', 52.52, 13.40, 500))
+        self.assertEqual(['near', 'far'], [p['ID'] for p in self.index.search(
+            'yelp', 'cafes', 52.52, 13.40, 2000)])
+
+    def test_purge(self):
+        """ Test old searches are deleted every so many searches """
+        index = places.PlaceIndex(os.path.join(self.dir.name, 'old.db'),
+                                  page_sizes={}, max_age=lambda provider: -1,
+                                  purge_every=2)
+        count = 'SELECT COUNT(*) FROM coverage'
+        index.record('google', 'cafes', 52.52, 13.40, 2000, [NEAR])
+        self.assertEqual(1, index.db.connection().execute(count).fetchone()[0])
+
+        index.record('google', 'cafes', 52.52, 13.40, 2000, [NEAR])
+        self.assertEqual(0, index.db.connection().execute(count).fetchone()[0])
+
+    def test_unbounded_provider(self):
+        """ Test a Google search only answers its area, within the TTL """
+        index = places.PlaceIndex(os.path.join(self.dir.name, 'ttl.db'),
+                                  page_sizes={})
+        index.record('google', 'cafes', 52.52, 13.40, 2000, [NEAR])
+
+        self.assertIsNone(index.search('google', 'cafes', 52.52, 13.40, 500))
+        self.assertIsNotNone(
+            index.search('google', 'cafes', 52.52, 13.40, 2000))
+        with patch('placeomat.storage.places.time.time',
+                   return_value=time.time() + get_ttl('google') + 1):
+            self.assertIsNone(
+                index.search('google', 'cafes', 52.52, 13.40, 2000))
+
+    def test_query_key(self):
+        """ Test the key leaves out the area, and skips opening hours """
+        self.assertEqual(
+            places.query_key({'query': 'cafes'}),
+            places.query_key({'query': 'cafes', 'location': '1,2',
+                              'radius': '5', 'no_cache': '0'}))
+        self.assertIsNone(places.query_key({'query': 'cafes', 'open': '1'}))
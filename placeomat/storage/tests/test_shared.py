@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from placeomat.providers import cache, gmaps
+from placeomat.providers.place import Place
+from placeomat.providers.provider import Status
+from placeomat.storage import shared
+
+
+def _places(n, name='cafe'):
+    return [Place('p%d' % i, 'Google Maps', name, location=(52.5, 13.4))
+            for i in range(n)]
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'shared.db')
+        self.cache = shared.SharedCache(self.path, max_bytes=10000)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_other_process(self):
+        """ Test results are seen through another handle of the file """
+        key = shared.make_key(('google', (('query', 'cafes'),)))
+        self.cache.put(key, _places(2), None, 60)
+
+        places, reason, ttl = shared.SharedCache(self.path, 10000).get(key)
+        self.assertEqual(_places(2), places)
+        self.assertIsNone(reason)
+        self.assertGreater(ttl, 59)
+
+    def test_expired(self):
+        """ Test expired results are missing """
+        self.cache.put('a', _places(1), None, -1)
+
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_evict(self):
+        """ Test the oldest results are dropped once the cache is full """
+        for i in range(20):
+            self.cache.put('k%d' % i, _places(3, 'x' * 100), None, 60)
+
+        self.assertLessEqual(self.cache.size(), 10000)
+        self.assertIsNone(self.cache.get('k0'))
+        self.assertIsNotNone(self.cache.get('k19'))
+
+    def test_size(self):
+        """ Test the running size matches the results held """
+        self.cache.put('a', _places(2), None, 60)
+        self.cache.put('b', _places(1), None, 60)
+        self.cache.put('a', _places(1), None, 60)
+
+        conn = self.cache.db.connection()
+        total, = conn.execute('SELECT TOTAL(size) FROM results').fetchone()
+        self.assertEqual(int(total), self.cache.size())
+
+    def test_size_of_old_file(self):
+        """ Test the size of a file without a running total is counted """
+        self.cache.put('a', _places(2), None, 60)
+        size = self.cache.size()
+        with self.cache.db.connection() as conn:
+            conn.execute('DELETE FROM usage')
+
+        self.assertEqual(size, shared.SharedCache(self.path, 10000).size())
+
+    @patch('placeomat.providers.provider.keys')
+    def test_provider_lookup(self, mock_keys):
+        """ Test a search missing in memory is answered from the file """
+        provider = gmaps.Provider()
+        key = ('google', (('query', 'cafes'),))
+        with patch('placeomat.storage.shared.get_cache',
+                   return_value=self.cache):
+            shared.remember(key, _places(1), None, 60)
+            cache.SEARCH_CACHE.clear()
+            res = provider._shared_lookup(key)
+
+        self.assertEqual(Status.VALID, res['status'])
+        self.assertEqual(_places(1), res['results'])
+        self.assertIs(res, cache.SEARCH_CACHE.get(key))
+        cache.SEARCH_CACHE.clear()
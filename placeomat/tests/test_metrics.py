@@ -0,0 +1,62 @@
+import threading
+import unittest
+
+from placeomat import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        """ Test counters are rendered per label value """
+        counter = metrics.Counter('requests_total', 'Requests', ('code',),
+                                  registry=self.registry)
+        counter.inc('200')
+        counter.add(2, '500')
+
+        text = self.registry.render()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn('requests_total{code="200"} 1\n', text)
+        self.assertIn('requests_total{code="500"} 2\n', text)
+
+    def test_histogram(self):
+        """ Test histogram buckets are cumulative """
+        histogram = metrics.Histogram('latency_seconds', 'Latency', ('p',),
+                                      buckets=[0.1, 1],
+                                      registry=self.registry)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'google')
+
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{p="google",le="0.1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{p="google",le="1"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{p="google",le="+Inf"} 4\n',
+                      text)
+        self.assertIn('latency_seconds_count{p="google"} 4\n', text)
+        self.assertIn('latency_seconds_sum{p="google"} 3.65\n', text)
+
+    def test_threads(self):
+        """ Test no updates are lost when many threads update a metric """
+        gauge = metrics.Gauge('in_flight', 'In flight',
+                              registry=self.registry)
+
+        def work():
+            for _ in range(1000):
+                with gauge.track():
+                    pass
+                gauge.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({(): 8000}, gauge.values())
+
+    def test_collect(self):
+        """ Test collected values are read when rendering """
+        metrics.Gauge('entries', 'Entries', collect=lambda: {(): 3},
+                      registry=self.registry)
+        self.assertIn('entries 3\n', self.registry.render())
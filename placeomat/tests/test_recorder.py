@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+import unittest
+
+from placeomat import recorder
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.recorder = recorder.Recorder(self.dir.name)
+
+    def tearDown(self):
+        self.recorder.close()
+        self.dir.cleanup()
+
+    def _read(self, name):
+        with open(os.path.join(self.dir.name, name)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_upstream(self):
+        """ Test upstream responses are recorded without API keys """
+        self.recorder.upstream(
+            'https://maps.googleapis.com/maps/api/place/textsearch/json',
+            {'query': 'cafes', 'radius': 500, 'key': 'secret'}, 200,
+            b'{"status": "OK"}', 0.25)
+
+        record, = self._read(recorder.UPSTREAM_FILE)
+        self.assertEqual('/maps/api/place/textsearch/json', record['path'])
+        self.assertEqual({'query': 'cafes', 'radius': '500'},
+                         record['params'])
+        self.assertEqual('{"status": "OK"}', record['body'])
+        self.assertEqual(0.25, record['seconds'])
+
+    def test_requests(self):
+        """ Test requests are recorded in order """
+        self.recorder.request('/search', {'query': 'a'}, None, 200, 0.1)
+        self.recorder.request('/search/google/p1', {}, None, 400, 0.2)
+
+        records = self._read(recorder.REQUESTS_FILE)
+        self.assertEqual(['/search', '/search/google/p1'],
+                         [r['path'] for r in records])
+        self.assertEqual(400, records[1]['status'])
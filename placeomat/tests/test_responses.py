@@ -0,0 +1,48 @@
+import gzip
+import unittest
+from unittest.mock import patch
+
+from placeomat import responses
+
+
+class TestResponses(unittest.TestCase):
+    def test_negotiate(self):
+        """ Test the encoding is picked by the weights of the client """
+        with patch('placeomat.responses.ENCODINGS', ('br', 'gzip')):
+            self.assertEqual('br', responses.negotiate('gzip, deflate, br'))
+            self.assertEqual('gzip', responses.negotiate('br;q=0.5, gzip'))
+            self.assertEqual('gzip', responses.negotiate('br;q=0, *'))
+            self.assertIsNone(responses.negotiate('gzip;q=0, deflate'))
+            self.assertIsNone(responses.negotiate(None))
+
+    @patch('placeomat.responses.responses_config.COMPRESS_MIN_SIZE', 10)
+    def test_compress(self):
+        """ Test large bodies are compressed, small ones are not """
+        data = b'[' + b'{"Name":"cafe"},' * 50 + b'{}]'
+        status, body, headers = responses.prepare(data, 200, None, 'gzip')
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertEqual(data, gzip.decompress(body))
+
+        status, body, headers = responses.prepare(b'[]', 200, None, 'gzip')
+        self.assertEqual(b'[]', body)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_not_modified(self):
+        """ Test clients which have the body get a 304 """
+        data = b'[{"Name":"cafe"}]'
+        status, body, headers = responses.prepare(data, 200, tagged=True)
+        tag = headers['ETag']
+        self.assertEqual(200, status)
+        self.assertEqual(responses.etag(data), tag)
+
+        status, body, _ = responses.prepare(data, 200, '"x", W/%s' % tag,
+                                            tagged=True)
+        self.assertEqual((304, b''), (status, body))
+
+        status, body, _ = responses.prepare(data + b' ', 200, tag,
+                                            tagged=True)
+        self.assertEqual(200, status)
+
+        # failed responses are not tagged
+        _, _, headers = responses.prepare(data, 400, tagged=True)
+        self.assertNotIn('ETag', headers)
@@ -1 +1,6 @@
 MAX_RADIUS = 40000
+
+# most results per page, and offset + limit can be at most 1000
+# https://www.yelp.com/developers/documentation/v3/business_search
+PAGE_SIZE = 50
+MAX_PAGES = 20